@@ -8,6 +8,8 @@ from typing import (
     overload,
 )
 
+from views import ListView
+
 
 @dataclass
 class Node:
@@ -153,6 +155,10 @@ class DoublyLinkedList:
 
         self.head, self.tail = self.tail, self.head
 
+    def view(self) -> ListView:
+        '''Return a lazy view over the list items.'''
+        return ListView(self)
+
     def is_empty(self) -> bool:
         '''Return True if the list is empty.'''
         return self.head is None
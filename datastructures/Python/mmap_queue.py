@@ -0,0 +1,277 @@
+import mmap
+import os
+import pickle
+import struct
+import zlib
+from typing import (
+    Any,
+    Iterator,
+    Optional,
+    Protocol,
+    Tuple,
+)
+
+
+class Serializer(Protocol):
+    def dumps(self, obj: Any) -> bytes: ...
+
+    def loads(self, data: bytes) -> Any: ...
+
+
+# Record header: payload length plus one and crc32 of the payload. Zero marks free space,
+# so an empty payload is still a record.
+HEADER = struct.Struct('<II')
+# Checkpoint: head segment, head offset, tail segment, tail offset, number of items.
+CHECKPOINT = struct.Struct('<QQQQQ')
+
+CHECKPOINT_FILE = 'checkpoint'
+SEGMENT_SUFFIX = '.seg'
+
+
+class MmapQueue:
+    '''
+    Persistent FIFO queue stored in segmented memory-mapped files.
+
+    Items are serialized into length-prefixed records appended to the tail segment.
+    Positions of head and tail are checkpointed every `sync_every` operations
+    (and on `sync()`/`close()`), consumed segments are removed on checkpoint.
+    Records written after the last checkpoint are recovered on open by scanning
+    from the checkpointed tail, so the queue delivers items at least once.
+    '''
+
+    def __init__(
+        self,
+        path: str,
+        segment_size: int = 16 * 1024 * 1024,
+        sync_every: int = 1000,
+        serializer: Serializer = pickle,
+    ) -> None:
+        if segment_size <= HEADER.size:
+            raise ValueError('Segment size is too small')
+        self.path = path
+        self.segment_size = segment_size
+        self.sync_every = sync_every
+        self.serializer = serializer
+
+        self._maps: dict[int, mmap.mmap] = {}
+        self._dirty: set[int] = set()
+        self._pending = 0
+        self._closed = False
+
+        os.makedirs(path, exist_ok=True)
+        self._recover()
+
+    def is_empty(self) -> bool:
+        '''Check if the queue is empty'''
+        return self._count == 0
+
+    def enqueue(self, item: Any) -> None:
+        '''Add an element to the end of the queue'''
+        payload = self.serializer.dumps(item)
+        needed = HEADER.size + len(payload)
+
+        segment, offset = self._tail
+        buffer = self._segment(segment)
+        if offset + needed > len(buffer):
+            segment, offset = segment + 1, 0
+            buffer = self._create_segment(segment, max(self.segment_size, needed))
+
+        start = offset + HEADER.size
+        buffer[start:start + len(payload)] = payload
+        HEADER.pack_into(buffer, offset, len(payload) + 1, zlib.crc32(payload))
+
+        self._tail = (segment, offset + needed)
+        self._count += 1
+        self._dirty.add(segment)
+        self._tick()
+
+    def dequeue(self) -> Any:
+        '''Remove and return the element from the front of the queue'''
+        if self.is_empty():
+            raise IndexError('Dequeue from an empty queue')
+        segment, offset, payload = self._read(self._head)
+        self._head = (segment, offset + HEADER.size + len(payload))
+        self._count -= 1
+        self._tick()
+        return self.serializer.loads(payload)
+
+    def front(self) -> Any:
+        '''Return the element at the front of the queue without removing it'''
+        if self.is_empty():
+            raise IndexError('Front from an empty queue')
+        _, _, payload = self._read(self._head)
+        return self.serializer.loads(payload)
+
+    def size(self) -> int:
+        '''Return the number of elements in the queue'''
+        return self._count
+
+    def sync(self) -> None:
+        '''Flush written segments, persist the checkpoint and drop consumed segments'''
+        for segment in self._dirty:
+            if segment in self._maps:
+                self._maps[segment].flush()
+        self._dirty.clear()
+        self._write_checkpoint()
+        self._pending = 0
+        self._compact()
+
+    def close(self) -> None:
+        '''Persist the state and release all mapped segments'''
+        if self._closed:
+            return
+        self.sync()
+        for buffer in self._maps.values():
+            buffer.close()
+        self._maps.clear()
+        self._closed = True
+
+    def _tick(self) -> None:
+        '''Count an operation and checkpoint once `sync_every` operations are pending'''
+        self._pending += 1
+        if self._pending >= self.sync_every:
+            self.sync()
+
+    def _read(self, position: Tuple[int, int]) -> Tuple[int, int, bytes]:
+        '''Return segment, offset and payload of the first record at or after the position, checking its crc32'''
+        segment, offset = position
+        while (segment, offset) != self._tail:
+            buffer = self._segment(segment)
+            if offset + HEADER.size <= len(buffer):
+                length, crc = HEADER.unpack_from(buffer, offset)
+                if length:
+                    start = offset + HEADER.size
+                    payload = buffer[start:start + length - 1]
+                    if len(payload) != length - 1 or zlib.crc32(payload) != crc:
+                        raise ValueError(f'Corrupted record in segment {segment} at offset {offset}')
+                    return segment, offset, payload
+            segment, offset = segment + 1, 0
+        raise IndexError('Read past the tail of the queue')
+
+    def _segment_path(self, segment: int) -> str:
+        return os.path.join(self.path, f'{segment:016d}{SEGMENT_SUFFIX}')
+
+    def _segment(self, segment: int) -> mmap.mmap:
+        '''Return the mapped segment, mapping it on first access.'''
+        buffer = self._maps.get(segment)
+        if buffer is None:
+            with open(self._segment_path(segment), 'r+b') as file:
+                buffer = mmap.mmap(file.fileno(), 0)
+            self._maps[segment] = buffer
+        return buffer
+
+    def _create_segment(self, segment: int, size: int) -> mmap.mmap:
+        '''Create a zero-filled segment file of the given size and map it.'''
+        with open(self._segment_path(segment), 'w+b') as file:
+            file.truncate(size)
+        return self._segment(segment)
+
+    def _existing_segments(self) -> list[int]:
+        return sorted(
+            int(name[:-len(SEGMENT_SUFFIX)])
+            for name in os.listdir(self.path)
+            if name.endswith(SEGMENT_SUFFIX)
+        )
+
+    def _write_checkpoint(self) -> None:
+        '''Atomically replace the checkpoint file.'''
+        data = CHECKPOINT.pack(*self._head, *self._tail, self._count)
+        temp_path = os.path.join(self.path, CHECKPOINT_FILE + '.tmp')
+        fd = os.open(temp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+        try:
+            os.write(fd, data)
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+        os.replace(temp_path, os.path.join(self.path, CHECKPOINT_FILE))
+
+    def _read_checkpoint(self) -> Optional[Tuple[int, int, int, int, int]]:
+        try:
+            with open(os.path.join(self.path, CHECKPOINT_FILE), 'rb') as file:
+                data = file.read()
+        except FileNotFoundError:
+            return None
+        if len(data) != CHECKPOINT.size:
+            return None
+        return CHECKPOINT.unpack(data)
+
+    def _compact(self) -> None:
+        '''Remove segments that lie entirely before the checkpointed head.'''
+        for segment in self._existing_segments():
+            if segment >= self._head[0]:
+                break
+            buffer = self._maps.pop(segment, None)
+            if buffer is not None:
+                buffer.close()
+            os.remove(self._segment_path(segment))
+
+    def _recover(self) -> None:
+        '''Restore head and tail from the checkpoint and replay records written after it.'''
+        segments = self._existing_segments()
+        checkpoint = self._read_checkpoint()
+        if checkpoint is None:
+            first = segments[0] if segments else 0
+            checkpoint = (first, 0, first, 0, 0)
+        head_segment, head_offset, segment, offset, count = checkpoint
+
+        if segment not in segments:
+            self._create_segment(segment, self.segment_size)
+            segments.append(segment)
+
+        while True:
+            buffer = self._segment(segment)
+            if offset + HEADER.size <= len(buffer):
+                length, crc = HEADER.unpack_from(buffer, offset)
+                start = offset + HEADER.size
+                end = start + length - 1
+                if length and end <= len(buffer) and zlib.crc32(buffer[start:end]) == crc:
+                    offset = end
+                    count += 1
+                    continue
+            if segment + 1 not in segments:
+                break
+            segment, offset = segment + 1, 0
+
+        # Wipe a torn record left behind the recovered tail and anything after it.
+        buffer = self._segment(segment)
+        buffer[offset:] = bytes(len(buffer) - offset)
+        for stale in segments:
+            if stale > segment:
+                os.remove(self._segment_path(stale))
+
+        self._head = (head_segment, head_offset)
+        self._tail = (segment, offset)
+        self._count = count
+        self._write_checkpoint()
+
+    def __enter__(self) -> 'MmapQueue':
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.close()
+
+    def __len__(self) -> int:
+        '''Enable len() to return the size of the queue'''
+        return self.size()
+
+    def __str__(self) -> str:
+        '''Return a string representation of the queue'''
+        return f'MmapQueue({list(self)})'
+
+    def __repr__(self) -> str:
+        '''Return a more detailed string representation for developers'''
+        return f'MmapQueue(path={self.path!r}, size={self._count})'
+
+    def __iter__(self) -> Iterator[Any]:
+        '''Make the queue iterable (support for for-loop)'''
+        position = self._head
+        for _ in range(self._count):
+            segment, offset, payload = self._read(position)
+            position = (segment, offset + HEADER.size + len(payload))
+            yield self.serializer.loads(payload)
+
+    def __eq__(self, other) -> bool:
+        '''Check if two queues are equal by comparing their elements'''
+        if isinstance(other, MmapQueue):
+            return list(self) == list(other)
+        return False
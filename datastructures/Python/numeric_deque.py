@@ -0,0 +1,231 @@
+import math
+from array import array
+from collections import deque
+from typing import (
+    Any,
+    Iterable,
+    Iterator,
+    Union,
+)
+
+
+class NumericDeque:
+    '''
+    Bounded deque of floats stored unboxed in an `array('d')` ring buffer.
+
+    Appending to a full deque evicts the oldest sample, so the deque is a
+    sliding window over a stream. A sample with sequence number `seq` always
+    lives in slot `seq % capacity`. Sum is maintained on every mutation and
+    min/max are tracked with monotonic deques of sample sequence numbers.
+    '''
+
+    def __init__(self, capacity: int, iterable: Iterable[float] = ()) -> None:
+        if capacity <= 0:
+            raise ValueError('Capacity must be positive')
+        self.capacity = capacity
+        self._buffer = array('d', bytes(8 * capacity))
+        self._view = memoryview(self._buffer)
+        self._head = 0
+        self._size = 0
+        self._seq = 0
+        self._sum = 0.0
+        self._evictions = 0
+        self._min: deque[int] = deque()
+        self._max: deque[int] = deque()
+        self._tracked = True
+        self.extend(iterable)
+
+    def append(self, value: float) -> None:
+        ''' Adding a sample to the right end, evicting the oldest one if full '''
+        if self._size == self.capacity:
+            self.popleft()
+        value = float(value)
+        self._buffer[(self._head + self._size) % self.capacity] = value
+        self._size += 1
+        self._sum += value
+        if self._tracked:
+            self._track(self._seq, value)
+        self._seq += 1
+
+    def extend(self, values: Union[Iterable[float], Any]) -> None:
+        ''' Adding samples from a buffer of doubles (or any iterable) with bulk copies '''
+        data = self._as_view(values)
+        count = len(data)
+        if not count:
+            return
+        if count >= self.capacity:
+            self.clear()
+            self._seq += count - self.capacity
+            self._head = self._seq % self.capacity
+            data = data[count - self.capacity:]
+            count = self.capacity
+        else:
+            overflow = self._size + count - self.capacity
+            if overflow > 0:
+                self._drop_left(overflow)
+
+        tail = (self._head + self._size) % self.capacity
+        first = min(count, self.capacity - tail)
+        self._view[tail:tail + first] = data[:first]
+        self._view[:count - first] = data[first:]
+
+        self._size += count
+        self._seq += count
+        self._sum += math.fsum(data)
+        self._tracked = False
+
+    def popleft(self) -> float:
+        ''' Removing and returning the oldest sample '''
+        if not self._size:
+            raise IndexError('Pop from an empty deque')
+        value = self._buffer[self._head]
+        oldest = self._seq - self._size
+        if self._min and self._min[0] == oldest:
+            self._min.popleft()
+        if self._max and self._max[0] == oldest:
+            self._max.popleft()
+        self._head = (self._head + 1) % self.capacity
+        self._size -= 1
+        self._subtract(value)
+        return value
+
+    def pop(self) -> float:
+        ''' Removing and returning the newest sample '''
+        if not self._size:
+            raise IndexError('Pop from an empty deque')
+        self._seq -= 1
+        self._size -= 1
+        value = self._buffer[(self._head + self._size) % self.capacity]
+        # Samples dropped from the monotonic deques by this one may be extremes again.
+        self._tracked = False
+        self._subtract(value)
+        return value
+
+    def clear(self) -> None:
+        ''' Removing all samples '''
+        self._seq += self._size
+        self._head = self._seq % self.capacity
+        self._size = 0
+        self._sum = 0.0
+        self._evictions = 0
+        self._min.clear()
+        self._max.clear()
+        self._tracked = True
+
+    def sum(self) -> float:
+        ''' Sum of the samples in the window '''
+        return self._sum if self._size else 0.0
+
+    def mean(self) -> float:
+        ''' Mean of the samples in the window '''
+        if not self._size:
+            raise IndexError('Mean of an empty deque')
+        return self._sum / self._size
+
+    def min(self) -> float:
+        ''' Smallest sample in the window '''
+        if not self._size:
+            raise IndexError('Min of an empty deque')
+        self._ensure_tracked()
+        return self._buffer[self._min[0] % self.capacity]
+
+    def max(self) -> float:
+        ''' Largest sample in the window '''
+        if not self._size:
+            raise IndexError('Max of an empty deque')
+        self._ensure_tracked()
+        return self._buffer[self._max[0] % self.capacity]
+
+    def segments(self) -> tuple[memoryview, ...]:
+        ''' Contents from oldest to newest as at most two zero-copy memoryview slices '''
+        if not self._size:
+            return ()
+        end = self._head + self._size
+        if end <= self.capacity:
+            return (self._view[self._head:end],)
+        return (self._view[self._head:], self._view[:end - self.capacity])
+
+    def _as_view(self, values: Union[Iterable[float], Any]) -> memoryview:
+        '''Helper method to expose the values as a flat memoryview of doubles.'''
+        try:
+            data = memoryview(values)
+        except TypeError:
+            return memoryview(array('d', values))
+        if data.format != 'd' or data.ndim != 1 or not data.c_contiguous:
+            return memoryview(array('d', data.tolist()))
+        return data
+
+    def _track(self, seq: int, value: float) -> None:
+        '''Helper method to push a sample into the monotonic min/max deques.'''
+        buffer, capacity = self._buffer, self.capacity
+        while self._min and buffer[self._min[-1] % capacity] >= value:
+            self._min.pop()
+        self._min.append(seq)
+        while self._max and buffer[self._max[-1] % capacity] <= value:
+            self._max.pop()
+        self._max.append(seq)
+
+    def _ensure_tracked(self) -> None:
+        '''Helper method to rebuild min/max tracking after bulk operations.'''
+        if self._tracked:
+            return
+        self._min.clear()
+        self._max.clear()
+        oldest = self._seq - self._size
+        for offset in range(self._size):
+            self._track(oldest + offset, self._buffer[(self._head + offset) % self.capacity])
+        self._tracked = True
+
+    def _drop_left(self, count: int) -> None:
+        '''Helper method to evict the `count` oldest samples at once.'''
+        dropped = self._view[self._head:self._head + count]
+        removed = math.fsum(dropped)
+        if len(dropped) < count:
+            removed += math.fsum(self._view[:count - len(dropped)])
+        self._head = (self._head + count) % self.capacity
+        self._size -= count
+        oldest = self._seq - self._size
+        while self._min and self._min[0] < oldest:
+            self._min.popleft()
+        while self._max and self._max[0] < oldest:
+            self._max.popleft()
+        self._subtract(removed, count)
+
+    def _subtract(self, value: float, count: int = 1) -> None:
+        '''Helper method to remove values from the running sum, recomputing it exactly once per window.'''
+        self._sum -= value
+        self._evictions += count
+        if self._evictions >= self.capacity:
+            self._evictions = 0
+            self._sum = math.fsum(math.fsum(segment) for segment in self.segments())
+
+    def __getitem__(self, index: int) -> float:
+        ''' Get sample by index (deque[index]), 0 is the oldest one '''
+        if index < 0:
+            index += self._size
+        if not 0 <= index < self._size:
+            raise IndexError('Index out of range')
+        return self._buffer[(self._head + index) % self.capacity]
+
+    def __iter__(self) -> Iterator[float]:
+        ''' Iterator from the oldest to the newest sample (for item in deque). '''
+        for segment in self.segments():
+            yield from segment
+
+    def __len__(self) -> int:
+        ''' Return the number of samples in the deque (len(deque)). '''
+        return self._size
+
+    def __eq__(self, other) -> bool:
+        ''' Check if two deques hold the same samples '''
+        if isinstance(other, NumericDeque):
+            return list(self) == list(other)
+        return False
+
+    def __repr__(self) -> str:
+        ''' String representation of the deque (repr(deque)). '''
+        return f'NumericDeque({list(self)}, capacity={self.capacity})'
+
+    def __str__(self) -> str:
+        ''' String representation for print (print(deque)). '''
+        return str(list(self))
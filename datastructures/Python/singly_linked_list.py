@@ -8,6 +8,11 @@ from typing import (
     overload,
 )
 
+from views import ListView
+
+
+_MISSING = object()
+
 
 @dataclass
 class Node:
@@ -50,9 +55,9 @@ class SinglyLinkedList:
     def extend(self, iterable: Iterable[Any]) -> None:
         ''' Append elements from an iterable to the end of the list. '''
         iterator = iter(iterable)
-        first_item = next(iterator, None)
+        first_item = next(iterator, _MISSING)
 
-        if first_item is None:
+        if first_item is _MISSING:
             return
         
         if not self.head:
@@ -146,6 +151,10 @@ class SinglyLinkedList:
 
         self.head = previous
 
+    def view(self) -> ListView:
+        ''' Return a lazy view over the list items. '''
+        return ListView(self)
+
     def is_empty(self) -> bool:
         ''' Return True if the list is empty. '''
         return self.head is None
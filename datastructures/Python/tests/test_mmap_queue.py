@@ -0,0 +1,175 @@
+import json
+import os
+
+import pytest
+from mmap_queue import HEADER, MmapQueue
+
+
+class JSONSerializer:
+    @staticmethod
+    def dumps(obj):
+        return json.dumps(obj).encode()
+
+    @staticmethod
+    def loads(data):
+        return json.loads(data)
+
+
+@pytest.fixture
+def queue(tmp_path):
+    q = MmapQueue(str(tmp_path / 'queue'), segment_size=64, sync_every=4)
+    yield q
+    q.close()
+
+
+def segment_files(path):
+    return sorted(name for name in os.listdir(path) if name.endswith('.seg'))
+
+
+@pytest.mark.parametrize("values", [
+    [1],
+    [1, 2, 3],
+    ['a', {'b': 1}, (2, 3), None],
+])
+def test_enqueue_dequeue(queue, values):
+    for value in values:
+        queue.enqueue(value)
+    assert len(queue) == len(values)
+    assert [queue.dequeue() for _ in values] == values
+    assert queue.is_empty()
+
+
+def test_front(queue):
+    queue.enqueue(1)
+    queue.enqueue(2)
+    assert queue.front() == 1
+    assert queue.size() == 2
+
+
+def test_empty_queue_raises(queue):
+    with pytest.raises(IndexError):
+        queue.dequeue()
+    with pytest.raises(IndexError):
+        queue.front()
+
+
+def test_iter(queue):
+    for value in range(20):
+        queue.enqueue(value)
+    queue.dequeue()
+    assert list(queue) == list(range(1, 20))
+    assert len(queue) == 19
+
+
+def test_large_record(queue):
+    value = 'x' * 1000
+    queue.enqueue(1)
+    queue.enqueue(value)
+    queue.enqueue(2)
+    assert list(queue) == [1, value, 2]
+
+
+def test_reopen(tmp_path):
+    path = str(tmp_path / 'queue')
+    with MmapQueue(path, segment_size=64) as q:
+        for value in range(10):
+            q.enqueue(value)
+        q.dequeue()
+
+    with MmapQueue(path, segment_size=64) as q:
+        assert list(q) == list(range(1, 10))
+
+
+def test_recover_records_after_checkpoint(tmp_path):
+    path = str(tmp_path / 'queue')
+    q = MmapQueue(path, segment_size=64, sync_every=1000)
+    for value in range(10):
+        q.enqueue(value)
+    # Simulate a crash: segments were written, the checkpoint was not updated.
+    for buffer in q._maps.values():
+        buffer.flush()
+
+    with MmapQueue(path, segment_size=64) as recovered:
+        assert list(recovered) == list(range(10))
+
+
+def test_corrupted_record_raises(tmp_path):
+    path = str(tmp_path / 'queue')
+    with MmapQueue(path, segment_size=64) as q:
+        for value in range(3):
+            q.enqueue(value)
+    with open(os.path.join(path, segment_files(path)[0]), 'r+b') as file:
+        file.seek(HEADER.size)
+        byte = file.read(1)
+        file.seek(HEADER.size)
+        file.write(bytes([byte[0] ^ 0xFF]))
+
+    with MmapQueue(path, segment_size=64) as q:
+        with pytest.raises(ValueError):
+            q.dequeue()
+
+
+def test_recover_stops_at_corrupted_record(tmp_path):
+    path = str(tmp_path / 'queue')
+    q = MmapQueue(path, segment_size=64, sync_every=1000)
+    for value in range(3):
+        q.enqueue(value)
+    record_size = q._tail[1] // 3
+    for buffer in q._maps.values():
+        buffer[record_size + HEADER.size] ^= 0xFF
+        buffer.flush()
+
+    with MmapQueue(path, segment_size=64) as recovered:
+        assert list(recovered) == [0]
+
+
+def test_compacts_consumed_segments(queue):
+    for value in range(50):
+        queue.enqueue(value)
+    assert len(segment_files(queue.path)) > 1
+
+    for _ in range(50):
+        queue.dequeue()
+    queue.sync()
+    assert len(segment_files(queue.path)) == 1
+
+
+def test_custom_serializer(tmp_path):
+    with MmapQueue(str(tmp_path / 'queue'), serializer=JSONSerializer) as q:
+        q.enqueue({'a': [1, 2]})
+        assert q.dequeue() == {'a': [1, 2]}
+
+
+class BytesSerializer:
+    @staticmethod
+    def dumps(obj):
+        return obj
+
+    @staticmethod
+    def loads(data):
+        return bytes(data)
+
+
+def test_empty_payload(tmp_path):
+    path = str(tmp_path / 'queue')
+    q = MmapQueue(path, segment_size=64, sync_every=1000, serializer=BytesSerializer)
+    q.enqueue(b'')
+    q.enqueue(b'x')
+    assert q.size() == 2
+    assert list(q) == [b'', b'x']
+    for buffer in q._maps.values():
+        buffer.flush()
+
+    with MmapQueue(path, segment_size=64, serializer=BytesSerializer) as recovered:
+        assert recovered.size() == 2
+        assert recovered.dequeue() == b''
+        assert recovered.dequeue() == b'x'
+
+
+def test_eq(tmp_path):
+    with MmapQueue(str(tmp_path / 'a')) as q1, MmapQueue(str(tmp_path / 'b')) as q2:
+        q1.enqueue(1)
+        q2.enqueue(1)
+        assert q1 == q2
+        q2.enqueue(2)
+        assert q1 != q2
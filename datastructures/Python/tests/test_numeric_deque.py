@@ -0,0 +1,116 @@
+import random
+from array import array
+
+import pytest
+from numeric_deque import NumericDeque
+
+
+@pytest.fixture
+def filled_deque():
+    return NumericDeque(4, [1.0, 2.0, 3.0])
+
+
+def test_append(filled_deque):
+    filled_deque.append(4)
+    assert list(filled_deque) == [1.0, 2.0, 3.0, 4.0]
+
+
+def test_append_evicts_oldest(filled_deque):
+    filled_deque.append(4)
+    filled_deque.append(5)
+    assert list(filled_deque) == [2.0, 3.0, 4.0, 5.0]
+    assert len(filled_deque) == 4
+
+
+@pytest.mark.parametrize("values, expected", [
+    ([4.0], [1.0, 2.0, 3.0, 4.0]),
+    (array('d', [4.0, 5.0]), [2.0, 3.0, 4.0, 5.0]),
+    (memoryview(array('d', [4.0, 5.0, 6.0, 7.0, 8.0])), [5.0, 6.0, 7.0, 8.0]),
+    ((x for x in [9, 10]), [2.0, 3.0, 9.0, 10.0]),
+    ([], [1.0, 2.0, 3.0]),
+])
+def test_extend(filled_deque, values, expected):
+    filled_deque.extend(values)
+    assert list(filled_deque) == expected
+
+
+def test_pop_popleft(filled_deque):
+    assert filled_deque.popleft() == 1.0
+    assert filled_deque.pop() == 3.0
+    assert list(filled_deque) == [2.0]
+
+
+def test_pop_empty():
+    deque = NumericDeque(2)
+    with pytest.raises(IndexError):
+        deque.pop()
+    with pytest.raises(IndexError):
+        deque.popleft()
+    with pytest.raises(IndexError):
+        deque.mean()
+
+
+def test_getitem(filled_deque):
+    assert filled_deque[0] == 1.0
+    assert filled_deque[-1] == 3.0
+    with pytest.raises(IndexError):
+        filled_deque[3]
+
+
+def test_segments(filled_deque):
+    assert [seg.tolist() for seg in filled_deque.segments()] == [[1.0, 2.0, 3.0]]
+    filled_deque.extend([4.0, 5.0, 6.0])
+    segments = filled_deque.segments()
+    assert len(segments) == 2
+    assert [x for seg in segments for x in seg.tolist()] == [3.0, 4.0, 5.0, 6.0]
+    assert all(seg.obj is filled_deque._buffer for seg in segments)
+
+
+def test_extend_while_segments_exported(filled_deque):
+    segments = filled_deque.segments()
+    filled_deque.extend([7.0, 8.0])
+    assert segments[0].tolist() == [8.0, 2.0, 3.0]
+    assert list(filled_deque) == [2.0, 3.0, 7.0, 8.0]
+
+
+def test_rolling_stats(filled_deque):
+    assert filled_deque.sum() == 6.0
+    assert filled_deque.mean() == 2.0
+    assert filled_deque.min() == 1.0
+    assert filled_deque.max() == 3.0
+
+    filled_deque.extend([0.5, 10.0])
+    assert filled_deque.min() == 0.5
+    assert filled_deque.max() == 10.0
+    assert filled_deque.sum() == 15.5
+
+
+def test_rolling_stats_match_window():
+    rng = random.Random(0)
+    deque = NumericDeque(16)
+    window = []
+    for step in range(2000):
+        action = rng.random()
+        if action < 0.7:
+            value = rng.uniform(-100, 100)
+            deque.append(value)
+            window = (window + [value])[-16:]
+        elif action < 0.8 and window:
+            assert deque.pop() == window.pop()
+        elif action < 0.9 and window:
+            assert deque.popleft() == window.pop(0)
+        else:
+            values = [rng.uniform(-100, 100) for _ in range(rng.randint(1, 20))]
+            deque.extend(array('d', values))
+            window = (window + values)[-16:]
+
+        assert list(deque) == window
+        if window:
+            assert deque.min() == min(window)
+            assert deque.max() == max(window)
+            assert deque.sum() == pytest.approx(sum(window))
+
+
+def test_eq():
+    assert NumericDeque(3, [1, 2]) == NumericDeque(5, [1.0, 2.0])
+    assert NumericDeque(3, [1, 2]) != NumericDeque(3, [2, 1])
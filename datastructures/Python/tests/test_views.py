@@ -0,0 +1,94 @@
+import pytest
+from singly_linked_list import SinglyLinkedList
+from doubly_linked_list import DoublyLinkedList
+
+
+@pytest.fixture(params=[SinglyLinkedList, DoublyLinkedList])
+def filled_list(request):
+    lst = request.param()
+    lst.extend([1, 2, 3, 4, 5])
+    return lst
+
+
+def test_view_iter(filled_list):
+    assert list(filled_list.view()) == [1, 2, 3, 4, 5]
+
+
+def test_map_filter(filled_list):
+    view = filled_list.view().map(lambda x: x * 10).filter(lambda x: x > 20)
+    assert list(view) == [30, 40, 50]
+
+
+@pytest.mark.parametrize("skip, take, expected", [
+    (0, 2, [1, 2]),
+    (1, 3, [2, 3, 4]),
+    (4, 10, [5]),
+    (10, 1, []),
+])
+def test_skip_take(filled_list, skip, take, expected):
+    assert list(filled_list.view().skip(skip).take(take)) == expected
+
+
+@pytest.mark.parametrize("size, expected", [
+    (1, [(1,), (2,), (3,), (4,), (5,)]),
+    (3, [(1, 2, 3), (2, 3, 4), (3, 4, 5)]),
+    (6, []),
+])
+def test_window(filled_list, size, expected):
+    assert list(filled_list.view().window(size)) == expected
+
+
+@pytest.mark.parametrize("size, expected", [
+    (2, [(1, 2), (3, 4), (5,)]),
+    (5, [(1, 2, 3, 4, 5)]),
+])
+def test_chunked(filled_list, size, expected):
+    assert list(filled_list.view().chunked(size)) == expected
+
+
+@pytest.mark.parametrize("method", ['window', 'chunked'])
+def test_invalid_size(filled_list, method):
+    with pytest.raises(ValueError):
+        getattr(filled_list.view(), method)(0)
+
+
+def test_view_is_lazy(filled_list):
+    seen = []
+    view = filled_list.view().map(lambda x: seen.append(x) or x).take(2)
+    assert seen == []
+    assert list(view) == [1, 2]
+    assert seen == [1, 2]
+
+
+def test_view_is_reiterable(filled_list):
+    view = filled_list.view().filter(lambda x: x % 2)
+    assert list(view) == list(view) == [1, 3, 5]
+
+
+def test_view_reflects_source(filled_list):
+    view = filled_list.view()
+    filled_list.append(6)
+    assert list(view) == [1, 2, 3, 4, 5, 6]
+
+
+def test_chain(filled_list):
+    assert list(filled_list.view().take(2).chain([7, 8])) == [1, 2, 7, 8]
+
+
+def test_collect(filled_list):
+    collected = filled_list.view().skip(3).collect()
+    assert type(collected) is type(filled_list)
+    assert list(collected) == [4, 5]
+    assert list(filled_list) == [1, 2, 3, 4, 5]
+
+
+@pytest.mark.parametrize("list_type", [list, SinglyLinkedList, DoublyLinkedList])
+def test_collect_into(filled_list, list_type):
+    collected = filled_list.view().map(str).collect(list_type)
+    assert isinstance(collected, list_type)
+    assert list(collected) == ['1', '2', '3', '4', '5']
+
+
+def test_collect_first_none(filled_list):
+    collected = filled_list.view().map(lambda x: None if x == 1 else x).collect()
+    assert list(collected) == [None, 2, 3, 4, 5]
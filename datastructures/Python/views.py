@@ -0,0 +1,87 @@
+from collections import deque
+from itertools import chain, islice
+from typing import (
+    Any,
+    Callable,
+    Iterable,
+    Iterator,
+    Optional,
+    Tuple,
+)
+
+
+class ListView:
+    '''
+    Lazy, re-iterable view over a linked list.
+
+    Every step only wraps the previous one, items are pulled from the
+    underlying nodes one at a time when the view is iterated or collected.
+    '''
+
+    def __init__(self, source: Iterable[Any], iterate: Optional[Callable[[], Iterator[Any]]] = None) -> None:
+        self.source = source
+        self._iterate = iterate if iterate is not None else source.__iter__
+
+    def _chain(self, step: Callable[[Iterator[Any]], Iterator[Any]]) -> 'ListView':
+        '''Return a new view applying the step on top of this one.'''
+        return ListView(self.source, lambda: step(self._iterate()))
+
+    def map(self, func: Callable[[Any], Any]) -> 'ListView':
+        ''' Apply the function to every item. '''
+        return self._chain(lambda items: map(func, items))
+
+    def filter(self, predicate: Callable[[Any], bool]) -> 'ListView':
+        ''' Keep only items matching the predicate. '''
+        return self._chain(lambda items: filter(predicate, items))
+
+    def take(self, count: int) -> 'ListView':
+        ''' Keep the first `count` items. '''
+        if count < 0:
+            raise ValueError('Count cannot be negative')
+        return self._chain(lambda items: islice(items, count))
+
+    def skip(self, count: int) -> 'ListView':
+        ''' Skip the first `count` items. '''
+        if count < 0:
+            raise ValueError('Count cannot be negative')
+        return self._chain(lambda items: islice(items, count, None))
+
+    def window(self, size: int) -> 'ListView':
+        ''' Sliding windows of `size` consecutive items as tuples. '''
+        if size <= 0:
+            raise ValueError('Size must be positive')
+
+        def step(items: Iterator[Any]) -> Iterator[Tuple[Any, ...]]:
+            window = deque(islice(items, size - 1), maxlen=size)
+            for item in items:
+                window.append(item)
+                yield tuple(window)
+        return self._chain(step)
+
+    def chunked(self, size: int) -> 'ListView':
+        ''' Consecutive chunks of `size` items as tuples, the last one may be shorter. '''
+        if size <= 0:
+            raise ValueError('Size must be positive')
+
+        def step(items: Iterator[Any]) -> Iterator[Tuple[Any, ...]]:
+            while chunk := tuple(islice(items, size)):
+                yield chunk
+        return self._chain(step)
+
+    def chain(self, *others: Iterable[Any]) -> 'ListView':
+        ''' Continue with the items of other iterables (lazy list1 + list2). '''
+        return self._chain(lambda items: chain(items, *others))
+
+    def collect(self, list_type: Optional[type] = None) -> Any:
+        ''' Materialize the view into a new list of `list_type` (the source type by default) in one pass. '''
+        result = (list_type or type(self.source))()
+        result.extend(self)
+        return result
+
+    def __iter__(self) -> Iterator[Any]:
+        ''' Iterator (for item in view). '''
+        return iter(self._iterate())
+
+    def __repr__(self) -> str:
+        ''' String representation of the view (repr(view)). '''
+        return f'ListView({type(self.source).__name__})'
@@ -15,10 +15,30 @@ class _DataBase(BaseSettings):
     NAME: str
     USER: str
     PASSWORD: str
+    ECHO: bool = False
+    POOL_SIZE: int = 10
+    MAX_OVERFLOW: int = 20
+    POOL_TIMEOUT: int = 30
+    POOL_RECYCLE: int = 1800
+    POOL_PRE_PING: bool = True
+    STATEMENT_CACHE_SIZE: int = 500
+    PGBOUNCER: bool = False
+    REPLICA_HOSTS: str = ''
 
     @property
     def URL(self) -> str:
-        return f'postgresql+asyncpg://{self.USER}:{self.PASSWORD}@{self.HOST}:{self.PORT}/{self.NAME}'
+        return self.url_for(self.HOST, self.PORT)
+
+    @property
+    def REPLICA_URLS(self) -> list[str]:
+        urls = []
+        for replica in filter(None, (host.strip() for host in self.REPLICA_HOSTS.split(','))):
+            host, _, port = replica.partition(':')
+            urls.append(self.url_for(host, int(port or self.PORT)))
+        return urls
+
+    def url_for(self, host: str, port: int) -> str:
+        return f'postgresql+asyncpg://{self.USER}:{self.PASSWORD}@{host}:{port}/{self.NAME}'
     
     model_config = SettingsConfigDict(
         env_file=os.path.join(ROOT_DIR, '.env', '.db'),
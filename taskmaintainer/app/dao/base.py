@@ -1,37 +1,139 @@
-from typing import Union, Sequence, Type
+from typing import Any, AsyncIterator, Optional, Union, Sequence, Type
 
 from sqlalchemy import update as sqlalchemy_update 
 from sqlalchemy import delete as sqlalchemy_delete
+from sqlalchemy import insert as sqlalchemy_insert
+from sqlalchemy import func
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.engine import Row
 from sqlalchemy.future import select
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from db.database import Base
-from db.sessions import connection
+from db.sessions import connection, async_session_maker
 
 
 class BaseDAO:
     model: Type[Base]
 
+    @classmethod
+    def _select(cls, columns: Sequence[str] = ()):
+        if columns:
+            return select(*(getattr(cls.model, column) for column in columns))
+        return select(cls.model)
+
     @classmethod
     @connection
     async def find_one_or_none(cls, *, session: AsyncSession, **filter_by) -> Union[Type[Base], None]:
         query = select(cls.model).filter_by(**filter_by)
         result = await session.execute(query)
         return result.scalar_one_or_none()
-    
+
     @classmethod
     @connection
-    async def find_all(cls, *, session: AsyncSession, **filter_by) -> Sequence[Type[Base]]:
-        query = select(cls.model).filter_by(**filter_by)
+    async def find_all(cls, *, session: AsyncSession, columns: Sequence[str] = (), **filter_by) -> Sequence[Union[Base, Row]]:
+        """
+        Возвращает все записи, подходящие под фильтр.
+
+        :param columns: Имена колонок: если заданы, вместо сущностей возвращаются
+            легковесные строки-кортежи только с этими колонками.
+        :param filter_by: Условия равенства.
+        :return: Список сущностей или строк.
+        """
+        query = cls._select(columns).filter_by(**filter_by)
         result = await session.execute(query)
+        if columns:
+            return result.all()
         return result.scalars().all()
-    
+
+    @classmethod
+    async def iter_all(cls, batch_size: int = 1000, columns: Sequence[str] = (), **filter_by) -> AsyncIterator[Union[Base, Row]]:
+        """
+        Потоково перебирает записи через серверный курсор, подгружая их пачками
+        по `batch_size`. Использует отдельную сессию, поэтому внутри цикла можно
+        вызывать другие методы DAO.
+
+        :param batch_size: Размер пачки, читаемой из курсора.
+        :param columns: Имена колонок для выборки строк вместо сущностей.
+        :param filter_by: Условия равенства.
+        :return: Асинхронный итератор сущностей или строк.
+        """
+        query = cls._select(columns).filter_by(**filter_by).execution_options(yield_per=batch_size)
+        async with async_session_maker() as session:
+            result = await session.stream(query)
+            if not columns:
+                result = result.scalars()
+            async for item in result:
+                yield item
+
+    @classmethod
+    @connection
+    async def count(cls, *, session: AsyncSession, **filter_by) -> int:
+        query = select(func.count()).select_from(cls.model).filter_by(**filter_by)
+        result = await session.execute(query)
+        return result.scalar_one()
+
+    @classmethod
+    @connection
+    async def exists(cls, *, session: AsyncSession, **filter_by) -> bool:
+        query = select(cls.model.id).filter_by(**filter_by).limit(1)
+        result = await session.execute(query)
+        return result.first() is not None
+
     @classmethod
     @connection(commit=True)
     async def add(cls, *, session: AsyncSession, **data) -> None:
         new_instance = cls.model(**data)
         session.add(new_instance)
-    
+
+    @classmethod
+    @connection(commit=True)
+    async def add_many(cls, rows: Sequence[dict], *, session: AsyncSession) -> Sequence[int]:
+        """
+        Вставляет записи пачкой (многострочный INSERT ... RETURNING).
+
+        :param rows: Данные записей.
+        :return: ID созданных записей.
+        """
+        if not rows:
+            return []
+        result = await session.scalars(sqlalchemy_insert(cls.model).returning(cls.model.id), list(rows))
+        return result.all()
+
+    @classmethod
+    @connection(commit=True)
+    async def upsert_many(
+        cls,
+        rows: Sequence[dict],
+        index_elements: Sequence[str],
+        update_columns: Optional[Sequence[str]] = None,
+        *,
+        session: AsyncSession,
+    ) -> None:
+        """
+        Вставляет записи пачкой, а при конфликте по `index_elements` обновляет существующие
+        (INSERT ... ON CONFLICT DO UPDATE).
+
+        :param rows: Данные записей.
+        :param index_elements: Колонки уникального индекса, по которому определяется конфликт.
+        :param update_columns: Колонки, обновляемые при конфликте (по умолчанию все переданные,
+            кроме `index_elements`). Пустой список означает ON CONFLICT DO NOTHING.
+        """
+        if not rows:
+            return
+        if update_columns is None:
+            update_columns = [key for key in rows[0] if key not in index_elements]
+
+        query = postgresql_insert(cls.model)
+        if update_columns:
+            set_: dict[str, Any] = {column: query.excluded[column] for column in update_columns}
+            if 'updated_at' in cls.model.__table__.c and 'updated_at' not in set_:
+                set_['updated_at'] = func.now()
+            query = query.on_conflict_do_update(index_elements=index_elements, set_=set_)
+        else:
+            query = query.on_conflict_do_nothing(index_elements=index_elements)
+        await session.execute(query, list(rows))
+
     @classmethod
     @connection(commit=True)
     async def delete(cls, *, session: AsyncSession, **delete_by) -> None:
@@ -40,7 +142,7 @@ class BaseDAO:
         if conditions:
             query = sqlalchemy_delete(cls.model).where(*conditions)
             await session.execute(query)
-    
+
     @classmethod
     @connection(commit=True)
     async def update(cls, *, session: AsyncSession, filter_by: dict, update_data: dict) -> None:
@@ -52,3 +154,14 @@ class BaseDAO:
                 .values(**update_data)
             )
             await session.execute(query)
+
+    @classmethod
+    @connection(commit=True)
+    async def update_many(cls, rows: Sequence[dict], *, session: AsyncSession) -> None:
+        """
+        Обновляет записи пачкой по первичному ключу (executemany UPDATE).
+
+        :param rows: Данные записей, каждая должна содержать `id`.
+        """
+        if rows:
+            await session.execute(sqlalchemy_update(cls.model), list(rows))
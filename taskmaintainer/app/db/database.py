@@ -2,14 +2,16 @@ from datetime import datetime
 from typing import Annotated
 
 from sqlalchemy import Integer, func
-from sqlalchemy.ext.asyncio import create_async_engine, AsyncAttrs
+from sqlalchemy.ext.asyncio import AsyncAttrs
 from sqlalchemy.orm import DeclarativeBase, Mapped,  declared_attr, mapped_column
 
 from core.settings import settings
+from .engine import create_engine
 
 
 DATABASE_URL = settings.DATABASE.URL
-engine = create_async_engine(DATABASE_URL, echo=True)
+engine = create_engine(settings.DATABASE, DATABASE_URL)
+replica_engines = [create_engine(settings.DATABASE, url) for url in settings.DATABASE.REPLICA_URLS]
 
 
 id = Annotated[int, mapped_column(Integer, primary_key=True, autoincrement=True)]
@@ -0,0 +1,37 @@
+from uuid import uuid4
+
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
+
+from core.settings import _DataBase
+
+
+def engine_options(db: _DataBase) -> dict:
+    """
+    Собирает параметры движка из настроек базы данных.
+
+    За PgBouncer в режиме transaction подготовленные выражения не переживают
+    транзакцию, поэтому их кеш отключается, а имена делаются уникальными.
+
+    :param db: Настройки базы данных (`settings.DATABASE`).
+    :return: Именованные аргументы для `create_async_engine`.
+    """
+    connect_args = {'prepared_statement_cache_size': db.STATEMENT_CACHE_SIZE}
+    if db.PGBOUNCER:
+        connect_args = {
+            'prepared_statement_cache_size': 0,
+            'statement_cache_size': 0,
+            'prepared_statement_name_func': lambda: f'__asyncpg_{uuid4()}__',
+        }
+    return {
+        'echo': db.ECHO,
+        'pool_size': db.POOL_SIZE,
+        'max_overflow': db.MAX_OVERFLOW,
+        'pool_timeout': db.POOL_TIMEOUT,
+        'pool_recycle': db.POOL_RECYCLE,
+        'pool_pre_ping': db.POOL_PRE_PING,
+        'connect_args': connect_args,
+    }
+
+
+def create_engine(db: _DataBase, url: str) -> AsyncEngine:
+    return create_async_engine(url, **engine_options(db))
@@ -1,19 +1,80 @@
+import random
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
 from functools import wraps
+from typing import AsyncIterator, Optional
 
-from sqlalchemy.ext.asyncio import async_sessionmaker
+from sqlalchemy import Select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+from sqlalchemy.orm import Session
 
-from db.database import engine
+from db.database import engine, replica_engines
 
 
-async_session_maker = async_sessionmaker(engine, expire_on_commit=False)
+USE_PRIMARY = 'use_primary'
+REPLICA = 'replica'
+
+
+class RoutingSession(Session):
+    """
+    Сессия, которая отправляет чтение на реплики, а запись - на основную базу.
+
+    SELECT без FOR UPDATE идет на реплику, выбранную один раз на сессию. После
+    первой записи сессия работает только с основной базой, чтобы видеть свои
+    изменения. Без реплик все идет в основную базу.
+    """
+
+    def get_bind(self, mapper=None, clause=None, **kwargs):
+        if not replica_engines or self.info.get(USE_PRIMARY):
+            return engine.sync_engine
+        if self._flushing or not isinstance(clause, Select) or clause._for_update_arg is not None:
+            self.info[USE_PRIMARY] = True
+            return engine.sync_engine
+        replica = self.info.get(REPLICA)
+        if replica is None:
+            replica = self.info[REPLICA] = random.choice(replica_engines)
+        return replica.sync_engine
+
+
+async_session_maker = async_sessionmaker(engine, expire_on_commit=False, sync_session_class=RoutingSession)
+
+current_session: ContextVar[Optional[AsyncSession]] = ContextVar('current_session', default=None)
+
+
+@asynccontextmanager
+async def session_scope() -> AsyncIterator[AsyncSession]:
+    """
+    Единица работы: одна сессия и одна транзакция на весь блок.
+
+    Все методы DAO внутри блока используют эту сессию, изменения фиксируются
+    при выходе из блока или откатываются в случае ошибки. Вложенный
+    `session_scope` переиспользует уже открытую сессию.
+    """
+    session = current_session.get()
+    if session is not None:
+        yield session
+        return
+
+    async with async_session_maker() as session:
+        token = current_session.set(session)
+        try:
+            yield session
+            await session.commit()
+        except Exception as e:
+            await session.rollback()
+            raise e
+        finally:
+            current_session.reset(token)
+
 
 def connection(func=None, commit: bool = False):
     """
     Декоратор для управления подключением к базе данных.
 
-    Создает асинхронную сессию, выполняет переданную функцию,
-    а затем фиксирует изменения (если commit=True) или откатывает
-    транзакцию в случае ошибки.
+    Если в контексте открыта сессия (`session_scope`), выполняет функцию в ней
+    и только отправляет изменения в базу (flush). Иначе создает асинхронную сессию,
+    выполняет переданную функцию, а затем фиксирует изменения (если commit=True)
+    или откатывает транзакцию в случае ошибки.
     
     :param commit: Флаг, указывающий, нужно ли фиксировать изменения в базе данных.
     """
@@ -22,6 +83,13 @@ def connection(func=None, commit: bool = False):
 
     @wraps(func)
     async def wrapper(*args, **kwargs):
+        session = current_session.get()
+        if session is not None:
+            result = await func(*args, session=session, **kwargs)
+            if commit:
+                await session.flush()
+            return result
+
         async with async_session_maker() as session:
             try:
                 result = await func(*args, session=session, **kwargs)
@@ -33,4 +101,4 @@ def connection(func=None, commit: bool = False):
                 raise e 
             finally:
                 await session.close()
-    return wrapper
\ No newline at end of file
+    return wrapper
@@ -0,0 +1,130 @@
+import asyncio
+import logging
+from typing import Any
+from uuid import uuid4
+
+from core.redis import Redis
+from core.settings import settings
+from .codec import Frame
+from .connections import ConnectionManager, manager
+
+
+logger = logging.getLogger(__name__)
+
+
+class LocalBroker:
+    """
+    Брокер в пределах одного процесса: сообщения сразу уходят в локальные соединения.
+    Подходит для разработки и тестов с одним воркером без Redis.
+    """
+
+    def __init__(self, manager: ConnectionManager):
+        self.manager = manager
+
+    async def start(self) -> None:
+        pass
+
+    async def stop(self) -> None:
+        pass
+
+    async def publish(self, user_id: int, message: Any) -> None:
+        await self.manager.send(user_id, message)
+
+    async def user_connected(self, user_id: int) -> None:
+        pass
+
+    async def user_disconnected(self, user_id: int) -> None:
+        pass
+
+
+class RedisBroker:
+    """
+    Брокер сообщений между воркерами через Redis pub/sub.
+
+    Сообщение пользователю публикуется в его канал `<prefix>:user:<id>`. Каждый воркер
+    держит одно pub/sub-подключение и подписан только на каналы пользователей,
+    подключенных к нему, полученные сообщения передаются в локальные соединения.
+    """
+
+    def __init__(self, manager: ConnectionManager, prefix: str):
+        self.manager = manager
+        self.prefix = prefix
+        self.worker_id = uuid4().hex
+        self.redis = None
+        self.pubsub = None
+        self._tasks: list[asyncio.Task] = []
+
+    def user_channel(self, user_id: int) -> str:
+        return f'{self.prefix}:user:{user_id}'
+
+    async def start(self) -> None:
+        self.redis = Redis()
+        self.pubsub = self.redis.pubsub(ignore_subscribe_messages=True)
+        await self.pubsub.subscribe(f'{self.prefix}:worker:{self.worker_id}')
+        self._tasks = [asyncio.create_task(self._read_loop())]
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        if self.pubsub is not None:
+            await self.pubsub.aclose()
+            self.pubsub = None
+
+    async def publish(self, user_id: int, message: Any) -> None:
+        """
+        Публикует сообщение в канал пользователя.
+
+        :param user_id: ID получателя.
+        :param message: Сообщение или кадр: кадр, опубликованный нескольким
+            пользователям, кодируется в JSON один раз.
+        """
+        await self.redis.publish(self.user_channel(user_id), Frame.wrap(message).json)
+
+    async def user_connected(self, user_id: int) -> None:
+        """
+        Подписывает воркер на канал пользователя при первом локальном соединении.
+
+        :param user_id: ID пользователя, открывшего соединение.
+        """
+        if len(self.manager.connections.get(user_id, ())) == 1:
+            await self.pubsub.subscribe(self.user_channel(user_id))
+
+    async def user_disconnected(self, user_id: int) -> None:
+        """
+        Отписывает воркер от канала пользователя, если у него не осталось локальных соединений.
+
+        :param user_id: ID пользователя, закрывшего соединение.
+        """
+        if self.manager.is_connected(user_id):
+            return
+        await self.pubsub.unsubscribe(self.user_channel(user_id))
+
+    async def _read_loop(self) -> None:
+        channel_prefix = f'{self.prefix}:user:'
+        while True:
+            try:
+                message = await self.pubsub.get_message(ignore_subscribe_messages=True, timeout=1.0)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception('Ошибка чтения pub/sub брокера')
+                await asyncio.sleep(1)
+                continue
+            if message is None or message['type'] != 'message':
+                continue
+            channel = message['channel'].decode()
+            if not channel.startswith(channel_prefix):
+                continue
+            user_id = int(channel[len(channel_prefix):])
+            await self.manager.send(user_id, Frame(json=message['data']))
+
+
+def create_broker(manager: ConnectionManager) -> LocalBroker | RedisBroker:
+    if settings.CHAT.BROKER == 'local':
+        return LocalBroker(manager)
+    return RedisBroker(manager, prefix=settings.CHAT.CHANNEL_PREFIX)
+
+
+broker = create_broker(manager)
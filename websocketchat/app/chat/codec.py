@@ -0,0 +1,117 @@
+from typing import Any, Dict, Iterable, Optional, Tuple, Union
+
+import orjson
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+
+class JSONCodec:
+    """
+    JSON в текстовых кадрах (формат по умолчанию, его понимает chat.js).
+    """
+
+    name = 'json'
+    subprotocol = 'chat.json'
+    binary = False
+
+    def dumps(self, payload: Any) -> str:
+        return orjson.dumps(payload).decode()
+
+    def loads(self, data: Union[str, bytes]) -> Any:
+        return orjson.loads(data)
+
+
+class MsgpackCodec:
+    """
+    MessagePack в бинарных кадрах: компактнее JSON для числовых полей.
+    Доступен, если установлен пакет msgpack.
+    """
+
+    name = 'msgpack'
+    subprotocol = 'chat.msgpack'
+    binary = True
+
+    def dumps(self, payload: Any) -> bytes:
+        return msgpack.packb(payload, use_bin_type=True)
+
+    def loads(self, data: Union[str, bytes]) -> Any:
+        if isinstance(data, str):
+            raise ValueError('Text frame in msgpack connection')
+        try:
+            return msgpack.unpackb(data, raw=False)
+        except msgpack.UnpackException as e:
+            raise ValueError(str(e)) from e
+
+
+json_codec = JSONCodec()
+CODECS: Dict[str, Union[JSONCodec, MsgpackCodec]] = {json_codec.subprotocol: json_codec}
+if msgpack is not None:
+    CODECS[MsgpackCodec.subprotocol] = MsgpackCodec()
+
+
+def negotiate(subprotocols: Iterable[str]) -> Tuple[Union[JSONCodec, MsgpackCodec], Optional[str]]:
+    """
+    Выбирает формат кадров по подпротоколам, предложенным клиентом
+    (`new WebSocket(url, ['chat.msgpack', 'chat.json'])`), в порядке предпочтения клиента.
+
+    :param subprotocols: Подпротоколы из заголовка Sec-WebSocket-Protocol.
+    :return: Кодек и подпротокол для ответа (None, если клиент их не предлагал).
+    """
+    for subprotocol in subprotocols:
+        codec = CODECS.get(subprotocol)
+        if codec is not None:
+            return codec, subprotocol
+    return json_codec, None
+
+
+class Frame:
+    """
+    Исходящее сообщение, которое кодируется не больше одного раза на формат,
+    сколько бы соединений его ни получало.
+
+    Кадр можно создать из уже закодированного JSON (например, полученного
+    из Redis): соединения с JSON получат эти же байты без разбора.
+    """
+
+    __slots__ = ('_payload', '_json', '_encoded')
+
+    def __init__(self, payload: Any = None, *, json: Optional[bytes] = None):
+        self._payload = payload
+        self._json = json
+        self._encoded: Dict[str, Union[str, bytes]] = {}
+
+    @classmethod
+    def wrap(cls, message: Any) -> 'Frame':
+        return message if isinstance(message, Frame) else cls(message)
+
+    @property
+    def payload(self) -> Any:
+        if self._payload is None:
+            self._payload = orjson.loads(self._json)
+        return self._payload
+
+    @property
+    def json(self) -> bytes:
+        """
+        :return: Сообщение в JSON (UTF-8).
+        """
+        if self._json is None:
+            self._json = orjson.dumps(self._payload)
+        return self._json
+
+    def encode(self, codec: Union[JSONCodec, MsgpackCodec]) -> Union[str, bytes]:
+        """
+        :param codec: Кодек соединения.
+        :return: Данные кадра: строка для текстовых кодеков, байты для бинарных.
+        """
+        encoded = self._encoded.get(codec.name)
+        if encoded is None:
+            if codec is json_codec:
+                encoded = self.json.decode()
+            else:
+                encoded = codec.dumps(self.payload)
+            self._encoded[codec.name] = encoded
+        return encoded
@@ -0,0 +1,218 @@
+import asyncio
+import time
+from collections import defaultdict
+from typing import Any, Awaitable, Callable, Dict, Iterable, Optional, Set, Union
+
+from fastapi import WebSocket, WebSocketDisconnect, status
+
+from core.metrics import Gauge, registry
+from .codec import Frame, JSONCodec, MsgpackCodec, json_codec, negotiate
+
+
+FrameHandler = Callable[['Connection', dict], Awaitable[None]]
+
+
+class Connection:
+    """
+    Одно websocket-соединение пользователя.
+
+    Исходящие сообщения складываются в ограниченную очередь и отправляются
+    отдельной задачей, поэтому медленный клиент не задерживает остальных.
+    Формат кадров (`codec`) согласуется при подключении.
+    """
+
+    def __init__(
+        self,
+        websocket: WebSocket,
+        user_id: int,
+        queue_size: int,
+        max_dropped: int,
+        send_timeout: float,
+        codec: Union[JSONCodec, MsgpackCodec] = json_codec,
+    ):
+        self.websocket = websocket
+        self.user_id = user_id
+        self.codec = codec
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self.max_dropped = max_dropped
+        self.send_timeout = send_timeout
+        self.dropped = 0
+        self.closing = False
+        self.last_seen = time.monotonic()
+        self._sender: Optional[asyncio.Task] = None
+        self._closer: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        self._sender = asyncio.create_task(self._send_loop())
+
+    async def stop(self) -> None:
+        if self._sender:
+            self._sender.cancel()
+            await asyncio.gather(self._sender, return_exceptions=True)
+            self._sender = None
+        if self._closer:
+            await asyncio.gather(self._closer, return_exceptions=True)
+            self._closer = None
+
+    def put(self, message: Frame) -> None:
+        """
+        Ставит сообщение в очередь отправки.
+
+        Если клиент не успевает читать и очередь заполнена, самое старое сообщение
+        отбрасывается. После `max_dropped` отброшенных подряд соединение закрывается:
+        клиент переподключится и загрузит историю заново.
+
+        :param message: Кадр для отправки.
+        """
+        if self.queue.full():
+            self.queue.get_nowait()
+            self.dropped += 1
+            if self.dropped >= self.max_dropped and not self.closing:
+                # Флаг ставится сразу: следующие put до запуска задачи не должны закрывать соединение повторно.
+                self.closing = True
+                self._closer = asyncio.create_task(self.close(status.WS_1013_TRY_AGAIN_LATER))
+        self.queue.put_nowait(message)
+
+    async def close(self, code: int = status.WS_1000_NORMAL_CLOSURE) -> None:
+        self.closing = True
+        try:
+            await self.websocket.close(code=code)
+        except RuntimeError:
+            pass
+
+    async def _send_loop(self) -> None:
+        while True:
+            message = await self.queue.get()
+            data = message.encode(self.codec)
+            try:
+                if self.codec.binary:
+                    await asyncio.wait_for(self.websocket.send_bytes(data), timeout=self.send_timeout)
+                else:
+                    await asyncio.wait_for(self.websocket.send_text(data), timeout=self.send_timeout)
+            except (WebSocketDisconnect, RuntimeError):
+                return
+            except asyncio.TimeoutError:
+                await self.close(status.WS_1013_TRY_AGAIN_LATER)
+                return
+            if self.queue.empty():
+                self.dropped = 0
+
+
+class ConnectionManager:
+    """
+    Реестр websocket-соединений воркера: у пользователя может быть несколько
+    открытых вкладок и устройств одновременно.
+    """
+
+    def __init__(self, queue_size: int = 100, max_dropped: int = 50, send_timeout: float = 5.0):
+        self.queue_size = queue_size
+        self.max_dropped = max_dropped
+        self.send_timeout = send_timeout
+        self.connections: Dict[int, Set[Connection]] = defaultdict(set)
+        self.handlers: Dict[str, FrameHandler] = {}
+
+    def on(self, frame_type: str) -> Callable[[FrameHandler], FrameHandler]:
+        """
+        Регистрирует обработчик входящих кадров с полем `type`.
+
+        :param frame_type: Тип кадра.
+        :return: Декоратор обработчика.
+        """
+        def decorator(handler: FrameHandler) -> FrameHandler:
+            self.handlers[frame_type] = handler
+            return handler
+        return decorator
+
+    async def connect(self, websocket: WebSocket, user_id: int) -> Connection:
+        codec, subprotocol = negotiate(websocket.scope.get('subprotocols', ()))
+        await websocket.accept(subprotocol=subprotocol)
+        connection = Connection(websocket, user_id, self.queue_size, self.max_dropped, self.send_timeout, codec)
+        connection.start()
+        self.connections[user_id].add(connection)
+        return connection
+
+    async def disconnect(self, connection: Connection) -> None:
+        connections = self.connections.get(connection.user_id)
+        if connections is not None:
+            connections.discard(connection)
+            if not connections:
+                del self.connections[connection.user_id]
+        await connection.stop()
+
+    def is_connected(self, user_id: int) -> bool:
+        return user_id in self.connections
+
+    async def listen(self, connection: Connection) -> None:
+        """
+        Читает кадры клиента до отключения и передает их зарегистрированным обработчикам.
+
+        :param connection: Соединение, из которого читаются кадры.
+        """
+        try:
+            while True:
+                message = await connection.websocket.receive()
+                if message['type'] == 'websocket.disconnect':
+                    break
+                connection.last_seen = time.monotonic()
+                data = message.get('text')
+                if data is None:
+                    data = message.get('bytes')
+                try:
+                    frame = connection.codec.loads(data)
+                except (TypeError, ValueError):
+                    continue
+                if not isinstance(frame, dict):
+                    continue
+                handler = self.handlers.get(frame.get('type'))
+                if handler is not None:
+                    await handler(connection, frame)
+        except WebSocketDisconnect:
+            pass
+
+    async def send(self, user_id: int, message: Any) -> bool:
+        """
+        Ставит сообщение в очереди всех соединений пользователя на этом воркере.
+
+        :param user_id: ID пользователя.
+        :param message: Сообщение или уже готовый кадр.
+        :return: True, если у пользователя есть хотя бы одно соединение.
+        """
+        connections = self.connections.get(user_id)
+        if not connections:
+            return False
+        frame = Frame.wrap(message)
+        for connection in connections:
+            connection.put(frame)
+        return True
+
+    async def broadcast(self, user_ids: Iterable[int], message: Any) -> Dict[int, bool]:
+        """
+        Рассылает сообщение нескольким пользователям.
+
+        :param user_ids: ID пользователей.
+        :param message: Сообщение.
+        :return: Для каждого пользователя признак, было ли сообщение доставлено в соединение.
+        """
+        user_ids = list(dict.fromkeys(user_ids))
+        # Один кадр на всю рассылку: сообщение кодируется один раз на формат.
+        frame = Frame.wrap(message)
+        results = await asyncio.gather(*(self.send(user_id, frame) for user_id in user_ids))
+        return dict(zip(user_ids, results))
+
+
+manager = ConnectionManager()
+
+
+@registry.collector
+async def _collect_connections() -> list:
+    connections = Gauge('websocket_connections', 'Открытые websocket-соединения воркера')
+    connections.set(sum(len(user_connections) for user_connections in manager.connections.values()))
+    users = Gauge('websocket_users', 'Пользователи с открытыми соединениями на воркере')
+    users.set(len(manager.connections))
+    queued = Gauge('websocket_queued_messages', 'Сообщения в очередях отправки соединений')
+    queued.set(sum(
+        connection.queue.qsize()
+        for user_connections in manager.connections.values()
+        for connection in user_connections
+    ))
+    return [connections, users, queued]
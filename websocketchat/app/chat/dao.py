@@ -1,22 +1,399 @@
-from sqlalchemy import select, and_, or_
+from datetime import datetime, timedelta
+from typing import AsyncIterator, Iterable, Optional, Sequence, Tuple, Union
+
+from sqlalchemy import and_, case, insert, literal_column, select, func, or_, text, tuple_, union
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.engine import Row, RowMapping
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from db.sessions import connection
+from core.settings import settings
+from db.sessions import connection, async_session_maker
 from dao.base import BaseDAO
-from .models import Message
+from .models import Message, MessageArchive, Conversation, UnreadCounter, PREVIEW_LENGTH, SEARCH_CONFIGS
+from .utils import get_conversation_id, encode_search_cursor, decode_search_cursor
+
+
+# Пересчет непрочитанных строки `unread_counters` в ON CONFLICT DO UPDATE: нужен, когда
+# сообщения сохраняются после отметки о прочтении более поздних (write-behind, несколько воркеров).
+_UNREAD_RECOUNT = literal_column(
+    '(SELECT count(*) FROM messages'
+    ' WHERE messages.conversation_id = unread_counters.conversation_id'
+    ' AND messages.recipient_id = unread_counters.user_id'
+    ' AND messages.sender_id <> messages.recipient_id'
+    ' AND messages.id > coalesce(unread_counters.last_read_message_id, 0))'
+)
+
+
+class UnreadCountersDAO(BaseDAO):
+    model: UnreadCounter = UnreadCounter
+
+    @classmethod
+    async def apply(cls, session: AsyncSession, messages: Iterable[Message]) -> None:
+        """
+        Обновляет счетчики непрочитанных в текущей транзакции: получателю
+        прибавляются его новые сообщения, а отправитель считается дочитавшим
+        переписку до своего сообщения.
+
+        ID сообщений выделяются при отправке, а сохраняются сообщения пачками,
+        поэтому пачка может содержать сообщения, которые получатель уже отметил
+        прочитанными. Тогда вместо прибавления счетчик пересчитывается по
+        `last_read_message_id`.
+
+        :param session: Сессия, в которой сохранены сообщения.
+        :param messages: Сохраненные сообщения (с заполненным ID).
+        """
+        # (user_id, conversation_id) -> [непрочитанные, прочитано до ID]
+        counters: dict[tuple[int, int], list] = {}
+        resets: set[tuple[int, int]] = set()
+        for message in sorted(messages, key=lambda message: message.id):
+            if message.sender_id == message.recipient_id:
+                continue
+            # Новая строка получателя считается прочитанной до первого сообщения пачки.
+            counters.setdefault((message.recipient_id, message.conversation_id), [0, message.id - 1])[0] += 1
+            counters[(message.sender_id, message.conversation_id)] = [0, message.id]
+            resets.add((message.sender_id, message.conversation_id))
+        if not counters:
+            return
+
+        # Строки блокируются в одном порядке во всех транзакциях, чтобы не было взаимных блокировок.
+        keys = sorted(counters)
+        for batch in ([key for key in keys if key not in resets], [key for key in keys if key in resets]):
+            if not batch:
+                continue
+            query = pg_insert(cls.model).values([
+                {
+                    'user_id': user_id,
+                    'conversation_id': conversation_id,
+                    'unread_count': counters[(user_id, conversation_id)][0],
+                    'last_read_message_id': counters[(user_id, conversation_id)][1],
+                }
+                for user_id, conversation_id in batch
+            ])
+            in_order = func.coalesce(cls.model.last_read_message_id, 0) <= query.excluded.last_read_message_id
+            if batch[0] in resets:
+                set_ = {
+                    'unread_count': case((in_order, query.excluded.unread_count), else_=_UNREAD_RECOUNT),
+                    'last_read_message_id': func.greatest(cls.model.last_read_message_id, query.excluded.last_read_message_id),
+                }
+            else:
+                set_ = {
+                    'unread_count': case((in_order, cls.model.unread_count + query.excluded.unread_count), else_=_UNREAD_RECOUNT),
+                }
+            query = query.on_conflict_do_update(
+                index_elements=[cls.model.user_id, cls.model.conversation_id],
+                set_={**set_, 'updated_at': func.now()},
+            )
+            await session.execute(query)
+
+    @classmethod
+    @connection(commit=True)
+    async def mark_read(cls, user_id: int, peer_id: int, message_id: int, *, session: AsyncSession) -> int:
+        """
+        Отмечает переписку прочитанной до сообщения `message_id` включительно.
+
+        ID берется из кадра, полученного клиентом, а не из `conversations`: там
+        последнее сообщение появляется только после сохранения пачки.
+        Более ранняя отметка, пришедшая позже, счетчик не меняет.
+
+        :param user_id: ID читающего пользователя.
+        :param peer_id: ID собеседника.
+        :param message_id: ID последнего прочитанного сообщения.
+        :return: Сколько сообщений осталось непрочитанными.
+        """
+        conversation_id = get_conversation_id(user_id, peer_id)
+        unread = await session.scalar(
+            select(func.count())
+            .select_from(Message)
+            .filter(
+                Message.conversation_id == conversation_id,
+                Message.recipient_id == user_id,
+                Message.sender_id != Message.recipient_id,
+                Message.id > message_id,
+            )
+        )
+        query = pg_insert(cls.model).values(
+            user_id=user_id,
+            conversation_id=conversation_id,
+            unread_count=unread,
+            last_read_message_id=message_id,
+        )
+        in_order = func.coalesce(cls.model.last_read_message_id, 0) <= query.excluded.last_read_message_id
+        query = query.on_conflict_do_update(
+            index_elements=[cls.model.user_id, cls.model.conversation_id],
+            set_={
+                'unread_count': case((in_order, query.excluded.unread_count), else_=cls.model.unread_count),
+                'last_read_message_id': func.greatest(cls.model.last_read_message_id, query.excluded.last_read_message_id),
+                'updated_at': func.now(),
+            },
+        ).returning(cls.model.unread_count)
+        return await session.scalar(query)
+
+
+class ConversationsDAO(BaseDAO):
+    model: Conversation = Conversation
+
+    @classmethod
+    async def touch(cls, session: AsyncSession, messages: Iterable[Message]) -> None:
+        """
+        Обновляет денормализованное последнее сообщение переписок в текущей транзакции.
+
+        :param session: Сессия, в которой сохранены сообщения.
+        :param messages: Сохраненные сообщения (с заполненным ID).
+        """
+        latest: dict[int, Message] = {}
+        for message in messages:
+            current = latest.get(message.conversation_id)
+            if current is None or current.id < message.id:
+                latest[message.conversation_id] = message
+        if not latest:
+            return
+
+        query = pg_insert(cls.model).values([
+            {
+                'id': conversation_id,
+                'user_low_id': min(message.sender_id, message.recipient_id),
+                'user_high_id': max(message.sender_id, message.recipient_id),
+                'last_message_id': message.id,
+                'last_message_preview': message.content[:PREVIEW_LENGTH],
+                'last_message_at': func.now(),
+            }
+            for conversation_id, message in latest.items()
+        ])
+        query = query.on_conflict_do_update(
+            index_elements=[cls.model.id],
+            set_={
+                'last_message_id': query.excluded.last_message_id,
+                'last_message_preview': query.excluded.last_message_preview,
+                'last_message_at': query.excluded.last_message_at,
+                'updated_at': func.now(),
+            },
+            where=cls.model.last_message_id < query.excluded.last_message_id,
+        )
+        await session.execute(query)
+
+    @classmethod
+    @connection
+    async def get_user_conversations(cls, user_id: int, limit: int = 100, *, session: AsyncSession) -> Sequence[Row]:
+        """
+        Возвращает переписки пользователя, начиная с самой свежей, вместе
+        с числом непрочитанных им сообщений.
+
+        :param user_id: ID пользователя.
+        :param limit: Максимальное количество переписок.
+        :return: Строки (переписка, число непрочитанных).
+        """
+        query = (
+            select(cls.model, func.coalesce(UnreadCounter.unread_count, 0).label('unread_count'))
+            .outerjoin(UnreadCounter, and_(
+                UnreadCounter.conversation_id == cls.model.id,
+                UnreadCounter.user_id == user_id,
+            ))
+            .filter(or_(cls.model.user_low_id == user_id, cls.model.user_high_id == user_id))
+            .order_by(cls.model.last_message_id.desc())
+            .limit(limit)
+        )
+        result = await session.execute(query)
+        return result.all()
 
 
 class MessagesDAO(BaseDAO):
     model: Message = Message
 
+    @classmethod
+    @connection
+    async def next_id(cls, *, session: AsyncSession) -> int:
+        """
+        Выделяет ID сообщения до сохранения: сообщение рассылается сразу, а пишется
+        в базу пачкой позже, и клиенты отмечают прочтение по этому ID.
+
+        :return: Следующее значение `messages_id_seq`.
+        """
+        return await session.scalar(text("SELECT nextval('messages_id_seq')"))
+
+    @classmethod
+    @connection(commit=True)
+    async def add(cls, *, session: AsyncSession, **data) -> Message:
+        message = cls.model(**data)
+        session.add(message)
+        await session.flush()
+        await ConversationsDAO.touch(session, [message])
+        await UnreadCountersDAO.apply(session, [message])
+        return message
+
     @classmethod
     @connection(commit=True)
-    async def get_messages_between_users(cls, user_id_1: int, user_id_2: int,  *, session: AsyncSession):
-        query = select(cls.model).filter(
-            or_(
-                and_(cls.model.sender_id == user_id_1, cls.model.recipient_id == user_id_2),
-                and_(cls.model.sender_id == user_id_2, cls.model.recipient_id == user_id_1)
+    async def add_many(cls, rows: Sequence[dict], *, session: AsyncSession) -> Sequence[Message]:
+        """
+        Сохраняет пачку сообщений многострочным INSERT ... RETURNING в одной транзакции.
+
+        :param rows: Данные сообщений.
+        :return: Сохраненные сообщения.
+        """
+        result = await session.scalars(insert(cls.model).returning(cls.model), list(rows))
+        messages = result.all()
+        await ConversationsDAO.touch(session, messages)
+        await UnreadCountersDAO.apply(session, messages)
+        return messages
+
+    @classmethod
+    @connection
+    async def get_messages_between_users(
+        cls, 
+        user_id_1: int, 
+        user_id_2: int, 
+        before_id: Optional[int] = None, 
+        before_created_at: Optional[datetime] = None,
+        limit: int = 50, 
+        *, 
+        session: AsyncSession,
+    ) -> Sequence[Union[Message, MessageArchive]]:
+        """
+        Возвращает страницу переписки двух пользователей: не более `limit` сообщений
+        с ID меньше `before_id` (или последние сообщения), упорядоченных по возрастанию ID.
+
+        `messages` секционирована по месяцам, поэтому страница читается по частям,
+        каждая из которых затрагивает только нужные секции: сначала за последние
+        `CHAT.RECENT_HISTORY_DAYS` дней (или до `before_created_at`, если клиент
+        передал время последнего сообщения), затем более старые секции, затем
+        `messages_archive`.
+
+        :param user_id_1: ID первого пользователя.
+        :param user_id_2: ID второго пользователя.
+        :param before_id: ID сообщения, старше которого нужно вернуть страницу.
+        :param before_created_at: Время этого сообщения: ограничивает чтение секциями до него.
+        :param limit: Размер страницы.
+        :return: Список сообщений.
+        """
+        conversation_id = get_conversation_id(user_id_1, user_id_2)
+        page: list = []
+
+        async def read(model, *filters) -> None:
+            nonlocal before_id
+            query = select(model).filter(model.conversation_id == conversation_id, *filters)
+            if before_id is not None:
+                query = query.filter(model.id < before_id)
+            query = query.order_by(model.id.desc()).limit(limit - len(page))
+            result = await session.execute(query)
+            page.extend(result.scalars().all())
+            if page:
+                before_id = page[-1].id
+
+        if before_created_at is not None:
+            await read(cls.model, cls.model.created_at <= before_created_at)
+        else:
+            recent_since = func.now() - timedelta(days=settings.CHAT.RECENT_HISTORY_DAYS)
+            await read(cls.model, cls.model.created_at >= recent_since)
+            if len(page) < limit:
+                await read(cls.model, cls.model.created_at < recent_since)
+        if len(page) < limit:
+            await read(MessageArchive)
+        return page[::-1]
+
+    @classmethod
+    async def stream_messages_between_users(
+        cls, 
+        user_id_1: int, 
+        user_id_2: int, 
+        chunk_size: int = 1000,
+    ) -> AsyncIterator[Sequence[RowMapping]]:
+        """
+        Потоково выгружает всю переписку двух пользователей частями по `chunk_size` строк,
+        не загружая историю в память целиком.
+
+        :param user_id_1: ID первого пользователя.
+        :param user_id_2: ID второго пользователя.
+        :param chunk_size: Количество строк в одной части.
+        :return: Асинхронный итератор частей выгрузки.
+        """
+        conversation_id = get_conversation_id(user_id_1, user_id_2)
+        async with async_session_maker() as session:
+            # Архив содержит самые старые сообщения, поэтому выгружается первым.
+            for model in (MessageArchive, cls.model):
+                query = (
+                    select(
+                        model.id, 
+                        model.sender_id, 
+                        model.recipient_id, 
+                        model.content, 
+                        model.created_at,
+                    )
+                    .filter(model.conversation_id == conversation_id)
+                    .order_by(model.id)
+                    .execution_options(yield_per=chunk_size)
+                )
+                result = await session.stream(query)
+                async for partition in result.mappings().partitions(chunk_size):
+                    yield partition
+
+    @classmethod
+    @connection
+    async def search(
+        cls,
+        user_id: int,
+        query: str,
+        limit: int = 20,
+        cursor: Optional[str] = None,
+        with_user_id: Optional[int] = None,
+        *,
+        session: AsyncSession,
+    ) -> Tuple[Sequence[RowMapping], Optional[str]]:
+        """
+        Полнотекстовый поиск по переписке пользователя.
+
+        Запрос разбирается `websearch_to_tsquery` (поддерживаются кавычки, `or`
+        и `-слово`) для русского и английского словарей и сопоставляется
+        с предвычисленной колонкой `search_vector`. Поиск идет только по
+        перепискам пользователя через GIN-индексы (conversation_id, search_vector)
+        `messages` и `messages_archive`: каждая таблица отдает лучшие `limit + 1`
+        совпадений, которые затем объединяются. Результаты упорядочены по рангу,
+        страницы - по курсору (ранг, ID).
+
+        :param user_id: ID пользователя, в переписках которого идет поиск.
+        :param query: Поисковая строка.
+        :param limit: Размер страницы.
+        :param cursor: Курсор из предыдущей страницы.
+        :param with_user_id: Искать только в переписке с этим пользователем.
+        :return: Найденные сообщения с рангом и курсор следующей страницы (или None).
+        :raises ValueError: Если курсор поврежден.
+        """
+        ts_query = func.websearch_to_tsquery(SEARCH_CONFIGS[0], query)
+        for config in SEARCH_CONFIGS[1:]:
+            ts_query = ts_query.op('||')(func.websearch_to_tsquery(config, query))
+        last = decode_search_cursor(cursor) if cursor is not None else None
+
+        if with_user_id is not None:
+            conversations = [get_conversation_id(user_id, with_user_id)]
+        else:
+            conversations = select(Conversation.id).filter(
+                or_(Conversation.user_low_id == user_id, Conversation.user_high_id == user_id)
+            ).scalar_subquery()
+
+        def matches(model):
+            rank = func.ts_rank_cd(model.search_vector, ts_query)
+            statement = (
+                select(
+                    model.id,
+                    model.sender_id,
+                    model.recipient_id,
+                    model.content,
+                    model.created_at,
+                    rank.label('rank'),
+                )
+                .filter(model.conversation_id.in_(conversations))
+                .filter(model.search_vector.op('@@')(ts_query))
             )
-        ).order_by(cls.model.id)
-        result = await session.execute(query)
-        return result.scalars().all()
\ No newline at end of file
+            if last is not None:
+                statement = statement.filter(tuple_(rank, model.id) < tuple_(*last))
+            return statement.order_by(rank.desc(), model.id.desc()).limit(limit + 1)
+
+        # UNION, а не UNION ALL: пока секция переносится в архив, ее сообщения есть в обеих таблицах.
+        found = union(matches(cls.model), matches(MessageArchive)).subquery()
+        statement = select(found).order_by(found.c.rank.desc(), found.c.id.desc()).limit(limit + 1)
+
+        result = await session.execute(statement)
+        rows = result.mappings().all()
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = encode_search_cursor(rows[-1]['rank'], rows[-1]['id'])
+        return rows, next_cursor
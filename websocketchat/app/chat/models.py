@@ -1,12 +1,95 @@
-from sqlalchemy import ForeignKey, Integer, Text
+from datetime import datetime
+from typing import Optional
+
+from sqlalchemy import BigInteger, Computed, ForeignKey, Index, Integer, String, Text, UniqueConstraint, func
+from sqlalchemy.dialects.postgresql import TSVECTOR
+from sqlalchemy.engine.default import DefaultExecutionContext
 from sqlalchemy.orm import Mapped, mapped_column
 
 from db.database import Base
+from .utils import get_conversation_id
+
+
+PREVIEW_LENGTH = 100
+SEARCH_CONFIGS = ('russian', 'english')
+SEARCH_VECTOR_SQL = ' || '.join(f"to_tsvector('{config}'::regconfig, content)" for config in SEARCH_CONFIGS)
+
+
+def _conversation_id_default(context: DefaultExecutionContext) -> int:
+    params = context.get_current_parameters()
+    return get_conversation_id(params['sender_id'], params['recipient_id'])
 
 
 class Message(Base):
+    """
+    Сообщение. Таблица секционирована по месяцам `created_at`
+    (секции `messages_yYYYYmMM`), поэтому `created_at` входит в первичный ключ.
+    Секции создает и переносит в архив `chat.partitions`.
+    """
+    created_at: Mapped[datetime] = mapped_column(server_default=func.now(), primary_key=True)
     sender_id: Mapped[int] = mapped_column(Integer, ForeignKey('users.id'))
     recipient_id: Mapped[int] = mapped_column(Integer, ForeignKey('users.id'))
+    conversation_id: Mapped[int] = mapped_column(BigInteger, default=_conversation_id_default)
+    content: Mapped[str] = mapped_column(Text)
+    search_vector: Mapped[Optional[str]] = mapped_column(TSVECTOR, Computed(SEARCH_VECTOR_SQL, persisted=True), deferred=True)
+
+    __table_args__ = {'postgresql_partition_by': 'RANGE (created_at)'}
+
+Index('ix_messages_conversation_id_id', Message.conversation_id, Message.id.desc())
+Index('ix_messages_conversation_id_search_vector', Message.conversation_id, Message.search_vector, postgresql_using='gin')
+
+
+class MessageArchive(Base):
+    """
+    Сообщения из секций старше `CHAT.ARCHIVE_AFTER_MONTHS`. Содержимое сжимается
+    lz4; `search_vector` и GIN-индекс те же, что у `messages`, поэтому поиск
+    находит и архивные сообщения.
+    """
+    __tablename__ = 'messages_archive'
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=False)
+    sender_id: Mapped[int] = mapped_column(Integer)
+    recipient_id: Mapped[int] = mapped_column(Integer)
+    conversation_id: Mapped[int] = mapped_column(BigInteger)
     content: Mapped[str] = mapped_column(Text)
+    search_vector: Mapped[Optional[str]] = mapped_column(TSVECTOR, Computed(SEARCH_VECTOR_SQL, persisted=True), deferred=True)
+
+Index('ix_messages_archive_conversation_id_id', MessageArchive.conversation_id, MessageArchive.id.desc())
+Index(
+    'ix_messages_archive_conversation_id_search_vector',
+    MessageArchive.conversation_id,
+    MessageArchive.search_vector,
+    postgresql_using='gin',
+)
+
+
+class Conversation(Base):
+    id: Mapped[int] = mapped_column(BigInteger, primary_key=True, autoincrement=False)
+    user_low_id: Mapped[int] = mapped_column(Integer, ForeignKey('users.id'))
+    user_high_id: Mapped[int] = mapped_column(Integer, ForeignKey('users.id'))
+    last_message_id: Mapped[Optional[int]] = mapped_column(Integer)
+    last_message_preview: Mapped[Optional[str]] = mapped_column(String(PREVIEW_LENGTH))
+    last_message_at: Mapped[Optional[datetime]]
+
+    __table_args__ = (
+        Index('ix_conversations_user_low_id', 'user_low_id', 'last_message_id'),
+        Index('ix_conversations_user_high_id', 'user_high_id', 'last_message_id'),
+    )
+
+
+class UnreadCounter(Base):
+    """
+    Состояние переписки для одного из ее участников: сколько сообщений он еще
+    не прочитал и до какого сообщения дочитал. Обновляется в транзакции
+    сохранения сообщений и кадром `read` из websocket.
+    """
+    __tablename__ = 'unread_counters'
+
+    user_id: Mapped[int] = mapped_column(Integer, ForeignKey('users.id'))
+    conversation_id: Mapped[int] = mapped_column(BigInteger)
+    unread_count: Mapped[int] = mapped_column(Integer, default=0, server_default='0')
+    last_read_message_id: Mapped[Optional[int]] = mapped_column(Integer)
 
-    
\ No newline at end of file
+    __table_args__ = (
+        UniqueConstraint('user_id', 'conversation_id', name='uq_unread_counters_user_id_conversation_id'),
+    )
@@ -0,0 +1,203 @@
+import logging
+from datetime import date, datetime, timezone
+from typing import Sequence
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from db.sessions import connection
+
+
+PARENT_TABLE = 'messages'
+ARCHIVE_TABLE = 'messages_archive'
+ARCHIVE_COLUMNS = 'id, sender_id, recipient_id, conversation_id, content, created_at, updated_at'
+PARTITION_PATTERN = f'^{PARENT_TABLE}_y[0-9]{{4}}m[0-9]{{2}}$'
+# Сколько DETACH ждет блокировку `messages`, прежде чем отступить до следующего запуска.
+DETACH_LOCK_TIMEOUT = '5s'
+
+logger = logging.getLogger(__name__)
+
+
+def month_start(value: date) -> date:
+    return date(value.year, value.month, 1)
+
+
+def add_months(value: date, months: int) -> date:
+    month = value.year * 12 + value.month - 1 + months
+    return date(month // 12, month % 12 + 1, 1)
+
+
+def partition_name(month: date) -> str:
+    """
+    :param month: Первое число месяца.
+    :return: Имя секции `messages` за этот месяц.
+    """
+    return f'{PARENT_TABLE}_y{month.year:04d}m{month.month:02d}'
+
+
+def partition_month(name: str) -> date:
+    return date(int(name[-7:-3]), int(name[-2:]), 1)
+
+
+@connection
+async def list_partitions(*, session: AsyncSession) -> Sequence[str]:
+    """
+    :return: Имена месячных секций `messages` по возрастанию (без секции по умолчанию).
+    """
+    result = await session.execute(text(
+        'SELECT child.relname FROM pg_inherits '
+        'JOIN pg_class parent ON parent.oid = pg_inherits.inhparent '
+        'JOIN pg_class child ON child.oid = pg_inherits.inhrelid '
+        'WHERE parent.relname = :parent AND child.relname ~ :pattern '
+        'ORDER BY child.relname'
+    ), {'parent': PARENT_TABLE, 'pattern': PARTITION_PATTERN})
+    return result.scalars().all()
+
+
+@connection
+async def list_detached_partitions(*, session: AsyncSession) -> Sequence[str]:
+    """
+    :return: Имена месячных секций, отсоединенных от `messages`, но еще не удаленных
+        (архивация прервалась между отсоединением и удалением).
+    """
+    result = await session.execute(text(
+        "SELECT relname FROM pg_class WHERE relkind = 'r' AND NOT relispartition AND relname ~ :pattern "
+        'ORDER BY relname'
+    ), {'pattern': PARTITION_PATTERN})
+    return result.scalars().all()
+
+
+@connection(commit=True)
+async def create_partition(month: date, *, session: AsyncSession) -> bool:
+    """
+    Создает секцию месяца, если ее еще нет.
+
+    Секции создаются заранее, чтобы новые сообщения не попадали в секцию
+    по умолчанию: если в ней окажутся строки за месяц, секцию этого месяца
+    уже нельзя будет создать без переноса строк.
+
+    :param month: Первое число месяца.
+    :return: Была ли секция создана.
+    """
+    name = partition_name(month)
+    exists = await session.scalar(text('SELECT to_regclass(:name) IS NOT NULL'), {'name': name})
+    if exists:
+        return False
+    await session.execute(text(
+        f'CREATE TABLE {name} PARTITION OF {PARENT_TABLE} '
+        f"FOR VALUES FROM ('{month.isoformat()}') TO ('{add_months(month, 1).isoformat()}')"
+    ))
+    return True
+
+
+@connection(commit=True)
+async def copy_partition(name: str, *, session: AsyncSession) -> int:
+    """
+    Копирует сообщения секции в `messages_archive` (повторное копирование безопасно).
+
+    :param name: Имя секции.
+    :return: Количество скопированных сообщений.
+    """
+    result = await session.execute(text(
+        f'INSERT INTO {ARCHIVE_TABLE} ({ARCHIVE_COLUMNS}) '
+        f'SELECT {ARCHIVE_COLUMNS} FROM {name} ON CONFLICT (id) DO NOTHING'
+    ))
+    return result.rowcount
+
+
+@connection(commit=True)
+async def detach_partition(name: str, *, session: AsyncSession) -> None:
+    """
+    Отсоединяет секцию от `messages` короткой транзакцией.
+
+    DETACH берет на `messages` ACCESS EXCLUSIVE, поэтому в транзакции больше
+    ничего нет, а ожидание блокировки ограничено `DETACH_LOCK_TIMEOUT`.
+    DETACH ... CONCURRENTLY недоступен: у `messages` есть секция по умолчанию.
+
+    :param name: Имя секции.
+    """
+    await session.execute(text(f"SET LOCAL lock_timeout = '{DETACH_LOCK_TIMEOUT}'"))
+    await session.execute(text(f'ALTER TABLE {PARENT_TABLE} DETACH PARTITION {name}'))
+
+
+async def archive_partition(name: str) -> int:
+    """
+    Переносит секцию в `messages_archive` и удаляет ее.
+
+    Копирование идет отдельной транзакцией до отсоединения и не блокирует
+    `messages`. Сообщения, записанные в секцию между копированием и
+    отсоединением, докопируются перед удалением. Пока секция не отсоединена,
+    ее сообщения есть и в архиве: история и поиск читают обе таблицы без повторов.
+
+    :param name: Имя секции.
+    :return: Количество перенесенных сообщений.
+    """
+    copied = await copy_partition(name)
+    await detach_partition(name)
+    return copied + await drop_detached_partition(name)
+
+
+@connection(commit=True)
+async def drop_detached_partition(name: str, *, session: AsyncSession) -> int:
+    """
+    Докопирует в архив оставшиеся сообщения отсоединенной секции и удаляет ее.
+
+    :param name: Имя секции.
+    :return: Количество докопированных сообщений.
+    """
+    result = await session.execute(text(
+        f'INSERT INTO {ARCHIVE_TABLE} ({ARCHIVE_COLUMNS}) '
+        f'SELECT {ARCHIVE_COLUMNS} FROM {name} ON CONFLICT (id) DO NOTHING'
+    ))
+    await session.execute(text(f'DROP TABLE {name}'))
+    return result.rowcount
+
+
+async def archive_partitions(today: date, after_months: int) -> dict[str, int]:
+    """
+    Переносит в архив секции месяцев, закончившихся больше `after_months` месяцев назад.
+
+    :param today: Текущая дата.
+    :param after_months: Сколько месяцев сообщения хранятся в `messages`.
+    :return: Количество перенесенных сообщений по секциям.
+    """
+    cutoff = add_months(month_start(today), -after_months)
+    archived = {}
+    for name in await list_detached_partitions():
+        archived[name] = await drop_detached_partition(name)
+    for name in await list_partitions():
+        if partition_month(name) < cutoff:
+            archived[name] = await archive_partition(name)
+    return archived
+
+
+async def maintain_partitions(months_ahead: int, archive_after_months: int) -> dict:
+    """
+    Создает будущие секции и переносит старые в архив.
+
+    Шаги выполняются независимо: если секцию месяца создать нельзя (например,
+    в секции по умолчанию уже есть строки за этот месяц), остальные секции
+    создаются и архивация выполняется, а ошибка попадает в результат.
+
+    :param months_ahead: На сколько месяцев вперед нужны секции.
+    :param archive_after_months: Сколько месяцев сообщения хранятся в `messages`.
+    :return: Созданные и перенесенные в архив секции и ошибки по секциям.
+    """
+    # Границы секций считаются в UTC: в этом часовом поясе работает база и заполняет created_at.
+    today = datetime.now(timezone.utc).date()
+    result = {'created': [], 'archived': {}, 'errors': {}}
+    # Каждая секция создается своей транзакцией: ошибка одного месяца не мешает остальным.
+    for offset in range(months_ahead + 1):
+        month = add_months(month_start(today), offset)
+        try:
+            if await create_partition(month):
+                result['created'].append(partition_name(month))
+        except Exception as e:
+            logger.exception('Не удалось создать секцию %s', partition_name(month))
+            result['errors'][partition_name(month)] = str(e)
+    try:
+        result['archived'] = await archive_partitions(today, archive_after_months)
+    except Exception as e:
+        logger.exception('Не удалось перенести секции в архив')
+        result['errors']['archive'] = str(e)
+    return result
@@ -0,0 +1,325 @@
+import asyncio
+import logging
+import time
+from typing import Dict, Iterable, Optional
+from uuid import uuid4
+
+from fastapi import status
+
+from core.redis import Redis
+from core.settings import settings
+from .connections import Connection, ConnectionManager, manager
+
+
+logger = logging.getLogger(__name__)
+
+class LocalPresence:
+    """
+    Присутствие пользователей в пределах одного процесса.
+
+    Раз в `heartbeat_interval` секунд всем соединениям отправляется кадр `ping`,
+    клиент отвечает `pong` (подойдет и любой другой кадр). Соединения, от
+    которых ничего не приходило дольше `pong_timeout` секунд, закрываются.
+    Переходы пользователей в онлайн и офлайн копятся и раз в `batch_interval`
+    секунд рассылаются в соединения одним кадром `presence`.
+    """
+
+    def __init__(self, manager: ConnectionManager, heartbeat_interval: float, pong_timeout: float, batch_interval: float):
+        self.manager = manager
+        self.heartbeat_interval = heartbeat_interval
+        self.pong_timeout = pong_timeout
+        self.batch_interval = batch_interval
+        self.seen: Dict[int, float] = {}
+        self._changes: Dict[int, bool] = {}
+        self._tasks: list[asyncio.Task] = []
+        self._closing: set[asyncio.Task] = set()
+        manager.on('pong')(self._on_pong)
+
+    async def start(self) -> None:
+        self._tasks = [
+            asyncio.create_task(self._heartbeat_loop()),
+            asyncio.create_task(self._flush_loop()),
+        ]
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        if self._closing:
+            await asyncio.gather(*self._closing, return_exceptions=True)
+
+    async def is_online(self, user_id: int) -> bool:
+        return self.manager.is_connected(user_id)
+
+    async def online(self, user_ids: Iterable[int]) -> Dict[int, bool]:
+        return {user_id: self.manager.is_connected(user_id) for user_id in user_ids}
+
+    async def last_seen(self, user_ids: Iterable[int]) -> Dict[int, Optional[float]]:
+        """
+        Возвращает время последней активности пользователей (unix time).
+
+        :param user_ids: ID пользователей.
+        :return: Время для каждого пользователя или None, если он не появлялся.
+        """
+        return {user_id: self.seen.get(user_id) for user_id in user_ids}
+
+    async def user_connected(self, user_id: int) -> None:
+        if len(self.manager.connections.get(user_id, ())) == 1:
+            self.seen[user_id] = time.time()
+            self.changed(user_id, True)
+
+    async def user_disconnected(self, user_id: int) -> None:
+        if not self.manager.is_connected(user_id):
+            self.seen[user_id] = time.time()
+            self.changed(user_id, False)
+
+    def changed(self, user_id: int, online: bool) -> None:
+        self._changes[user_id] = online
+
+    async def touch(self, user_ids: list[int]) -> None:
+        now = time.time()
+        for user_id in user_ids:
+            self.seen[user_id] = now
+
+    async def _on_pong(self, connection: Connection, frame: dict) -> None:
+        # Время последнего кадра обновляет сам ConnectionManager.listen.
+        pass
+
+    async def _heartbeat_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.heartbeat_interval)
+            deadline = time.monotonic() - self.pong_timeout
+            for connections in list(self.manager.connections.values()):
+                for connection in list(connections):
+                    if connection.last_seen < deadline and not connection.closing:
+                        connection.closing = True
+                        task = asyncio.create_task(connection.close(status.WS_1001_GOING_AWAY))
+                        self._closing.add(task)
+                        task.add_done_callback(self._closing.discard)
+            user_ids = list(self.manager.connections)
+            if user_ids:
+                await self.manager.broadcast(user_ids, {'type': 'ping'})
+            try:
+                await self.touch(user_ids)
+            except Exception:
+                logger.exception('Не удалось обновить присутствие')
+
+    async def _flush_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.batch_interval)
+            if not self._changes or not self.manager.connections:
+                self._changes.clear()
+                continue
+            changes, self._changes = self._changes, {}
+            frame = {
+                'type': 'presence',
+                'online': [user_id for user_id, online in changes.items() if online],
+                'offline': [user_id for user_id, online in changes.items() if not online],
+            }
+            await self.manager.broadcast(list(self.manager.connections), frame)
+
+
+class RedisPresence(LocalPresence):
+    """
+    Присутствие пользователей всех воркеров в Redis.
+
+    Онлайн-статус хранится в хеше `<prefix>:presence:<id>`: поле на воркер,
+    значение - время, до которого поле действительно. Heartbeat продлевает поля
+    и TTL хеша, пока у пользователя есть живые соединения.
+
+    Каждый воркер продлевает и свою запись в sorted set `<prefix>:presence:workers`
+    и ведет множество своих пользователей `<prefix>:presence:worker:<id>`. Записи
+    упавшего воркера перестают продлеваться: первый живой воркер, заметивший
+    это на heartbeat, удаляет его поля из хешей и публикует офлайн тех
+    пользователей, у которых не осталось других воркеров. Время последней
+    активности хранится в sorted set `<prefix>:last_seen`, записи старше
+    `retention` секунд удаляются.
+    Переходы в онлайн и офлайн публикуются в канал `<prefix>:presence`,
+    откуда их собирают все воркеры.
+    """
+
+    def __init__(
+        self,
+        manager: ConnectionManager,
+        prefix: str,
+        ttl: int,
+        retention: int,
+        heartbeat_interval: float,
+        pong_timeout: float,
+        batch_interval: float,
+    ):
+        super().__init__(manager, heartbeat_interval, pong_timeout, batch_interval)
+        self.prefix = prefix
+        self.ttl = ttl
+        self.retention = retention
+        self.worker_id = uuid4().hex
+        self.channel = f'{prefix}:presence'
+        self.redis = None
+        self.pubsub = None
+
+    @property
+    def last_seen_key(self) -> str:
+        return f'{self.prefix}:last_seen'
+
+    @property
+    def workers_key(self) -> str:
+        return f'{self.prefix}:presence:workers'
+
+    def presence_key(self, user_id: int) -> str:
+        return f'{self.prefix}:presence:{user_id}'
+
+    def worker_users_key(self, worker_id: str) -> str:
+        return f'{self.prefix}:presence:worker:{worker_id}'
+
+    async def start(self) -> None:
+        self.redis = Redis()
+        self.pubsub = self.redis.pubsub(ignore_subscribe_messages=True)
+        await self.pubsub.subscribe(self.channel)
+        await super().start()
+        self._tasks.append(asyncio.create_task(self._listen()))
+
+    async def stop(self) -> None:
+        await super().stop()
+        if self.pubsub is not None:
+            await self.pubsub.aclose()
+            self.pubsub = None
+
+    async def is_online(self, user_id: int) -> bool:
+        """
+        Проверяет, есть ли у пользователя живое соединение на любом воркере.
+
+        Подходит и для задач Celery: нужен только Redis.
+
+        :param user_id: ID пользователя.
+        :return: True, если пользователь онлайн.
+        """
+        if self.manager.is_connected(user_id):
+            return True
+        redis = self.redis or Redis()
+        return _alive(await redis.hvals(self.presence_key(user_id)), time.time())
+
+    async def online(self, user_ids: Iterable[int]) -> Dict[int, bool]:
+        user_ids = list(user_ids)
+        redis = self.redis or Redis()
+        async with redis.pipeline(transaction=False) as pipe:
+            for user_id in user_ids:
+                pipe.hvals(self.presence_key(user_id))
+            results = await pipe.execute()
+        now = time.time()
+        return {user_id: _alive(values, now) for user_id, values in zip(user_ids, results)}
+
+    async def last_seen(self, user_ids: Iterable[int]) -> Dict[int, Optional[float]]:
+        user_ids = list(user_ids)
+        if not user_ids:
+            return {}
+        redis = self.redis or Redis()
+        scores = await redis.zmscore(self.last_seen_key, user_ids)
+        return dict(zip(user_ids, scores))
+
+    async def user_connected(self, user_id: int) -> None:
+        if len(self.manager.connections.get(user_id, ())) != 1:
+            return
+        key = self.presence_key(user_id)
+        now = time.time()
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.hset(key, self.worker_id, int(now) + self.ttl)
+            pipe.expire(key, self.ttl)
+            pipe.hvals(key)
+            pipe.zadd(self.last_seen_key, {user_id: now})
+            pipe.sadd(self.worker_users_key(self.worker_id), user_id)
+            _, _, values, _, _ = await pipe.execute()
+        if sum(int(value) > now for value in values) == 1:
+            await self.redis.publish(self.channel, f'{user_id}:1')
+
+    async def user_disconnected(self, user_id: int) -> None:
+        if self.manager.is_connected(user_id):
+            return
+        key = self.presence_key(user_id)
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.hdel(key, self.worker_id)
+            pipe.hvals(key)
+            pipe.zadd(self.last_seen_key, {user_id: time.time()})
+            pipe.srem(self.worker_users_key(self.worker_id), user_id)
+            _, values, _, _ = await pipe.execute()
+        if not _alive(values, time.time()):
+            await self.redis.publish(self.channel, f'{user_id}:0')
+
+    async def touch(self, user_ids: list[int]) -> None:
+        now = time.time()
+        async with self.redis.pipeline(transaction=False) as pipe:
+            for user_id in user_ids:
+                key = self.presence_key(user_id)
+                pipe.hset(key, self.worker_id, int(now) + self.ttl)
+                pipe.expire(key, self.ttl)
+            if user_ids:
+                pipe.zadd(self.last_seen_key, dict.fromkeys(user_ids, now))
+            pipe.zremrangebyscore(self.last_seen_key, '-inf', now - self.retention)
+            pipe.zadd(self.workers_key, {self.worker_id: now + self.ttl})
+            await pipe.execute()
+        await self._reap_workers(now)
+
+    async def _reap_workers(self, now: float) -> None:
+        """
+        Удаляет поля воркеров, не продлевавших регистрацию дольше TTL,
+        и публикует офлайн их пользователей.
+        """
+        for worker_id in await self.redis.zrangebyscore(self.workers_key, '-inf', now):
+            # Чистит тот воркер, которому удалось снять регистрацию.
+            if not await self.redis.zrem(self.workers_key, worker_id):
+                continue
+            worker_id = worker_id.decode()
+            users_key = self.worker_users_key(worker_id)
+            user_ids = [int(user_id) for user_id in await self.redis.smembers(users_key)]
+            async with self.redis.pipeline(transaction=False) as pipe:
+                for user_id in user_ids:
+                    pipe.hdel(self.presence_key(user_id), worker_id)
+                    pipe.hvals(self.presence_key(user_id))
+                pipe.delete(users_key)
+                results = await pipe.execute()
+            for user_id, values in zip(user_ids, results[1::2]):
+                if not _alive(values, now) and not self.manager.is_connected(user_id):
+                    await self.redis.publish(self.channel, f'{user_id}:0')
+
+    async def _listen(self) -> None:
+        while True:
+            try:
+                message = await self.pubsub.get_message(ignore_subscribe_messages=True, timeout=1.0)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception('Ошибка чтения канала присутствия')
+                await asyncio.sleep(1)
+                continue
+            if message is None or message['type'] != 'message':
+                continue
+            user_id, online = message['data'].decode().split(':')
+            self.changed(int(user_id), online == '1')
+
+
+def _alive(values: Iterable[bytes], now: float) -> bool:
+    """
+    :param values: Значения полей хеша присутствия (время, до которого поле действительно).
+    :return: Есть ли у пользователя хотя бы один живой воркер.
+    """
+    return any(int(value) > now for value in values)
+
+
+def create_presence(manager: ConnectionManager) -> LocalPresence | RedisPresence:
+    options = {
+        'heartbeat_interval': settings.CHAT.HEARTBEAT_INTERVAL,
+        'pong_timeout': settings.CHAT.PONG_TIMEOUT,
+        'batch_interval': settings.CHAT.PRESENCE_BATCH_INTERVAL_MS / 1000,
+    }
+    if settings.CHAT.BROKER == 'local':
+        return LocalPresence(manager, **options)
+    return RedisPresence(
+        manager,
+        prefix=settings.CHAT.CHANNEL_PREFIX,
+        ttl=settings.CHAT.PRESENCE_TTL,
+        retention=settings.CHAT.LAST_SEEN_RETENTION_DAYS * 24 * 60 * 60,
+        **options,
+    )
+
+
+presence = create_presence(manager)
@@ -1,68 +1,184 @@
 import asyncio
-from typing import List, Dict, Literal
+from datetime import datetime, timezone
+from typing import List, Optional
 
-from fastapi import APIRouter, WebSocket, WebSocketDisconnect, Request, Depends
-from fastapi.responses import HTMLResponse
+import orjson
+from fastapi import APIRouter, WebSocket, Request, Depends, HTTPException, Query, status
+from fastapi.responses import HTMLResponse, StreamingResponse
 
 from core.jinja2 import templates
 from users.models import User
-from users.dao import UsersDAO
-from users.dependencies import get_current_user
-from services.tasks import send_telegram_notification_task
-from main_bot import notify_user
-from .dao import MessagesDAO
-from .schemas import MessageRead, MessageCreate
+from users.dependencies import get_current_user, ACCESS_TOKEN_COOKIE
+from users.tokens import token_verifier
+from users.directory import user_directory
+from services.telegram_notification import enqueue_telegram_notification
+from .broker import broker
+from .codec import Frame
+from .connections import manager
+from .dao import MessagesDAO, ConversationsDAO, UnreadCountersDAO
+from .presence import presence
+from .schemas import MessageRead, MessageCreate, MessageSearchPage, ConversationRead, PresenceRead
+from .writer import message_writer
 
 
 router = APIRouter(prefix='/chat', tags=['Chat'])
-active_connections: Dict[int, WebSocket] = {}
 
 
-async def notify_user(user_id: int, message: dict) -> bool:
-    if user_id in active_connections:
-        websocket = active_connections[user_id]
-        await websocket.send_json(message)
-        return True
-    return False
-
 @router.get('/', response_class=HTMLResponse, summary='Chat Page')
 async def chat(request: Request, user: User = Depends(get_current_user)):
-    users = await UsersDAO.find_all()
-    return templates.TemplateResponse('chat.html', {'request': request, 'user': user, 'users': users})
+    return templates.TemplateResponse('chat.html', {
+        'request': request,
+        'user': user,
+        'users': user_directory.users.values(),
+        'users_version': user_directory.version,
+    })
 
 @router.post('/messages', response_model=MessageCreate)
 async def send_message(message: MessageCreate, current_user: User = Depends(get_current_user)):
-    await MessagesDAO.add(
-        sender_id=current_user.id,
-        content=message.content,
-        recipient_id=message.recipient_id,
-    )
-
     message_data = {
+        'id': await MessagesDAO.next_id(),
         'sender_id': current_user.id,
         'recipient_id': message.recipient_id,
         'content': message.content,
     }
 
-    is_notified = await notify_user(message.recipient_id, message_data)
-    if not is_notified:
-        send_telegram_notification_task.delay(message.recipient_id, current_user.username)
-    await notify_user(current_user.id, message_data)
+    is_online = await presence.is_online(message.recipient_id)
+    # Кадр уходит и во все соединения отправителя: его остальные вкладки покажут сообщение.
+    frame = Frame({**message_data, 'client_id': message.client_id} if message.client_id else message_data)
+    await asyncio.gather(*(
+        broker.publish(user_id, frame)
+        for user_id in {message.recipient_id, current_user.id}
+    ))
+    if not is_online:
+        await enqueue_telegram_notification(message.recipient_id, current_user.username)
+    await message_writer.write(dict(message_data))
 
-    return {'recipient_id': message.recipient_id, 'content': message.content, 'status': 'ok', 'msg': 'Message saved!'}
+    return {
+        'recipient_id': message.recipient_id,
+        'content': message.content,
+        'client_id': message.client_id,
+        'status': 'ok',
+        'msg': 'Message saved!',
+    }
 
 @router.get('/messages/{user_id}', response_model=List[MessageRead])
-async def messages(user_id: int, current_user: User = Depends(get_current_user)):
-    return await MessagesDAO.get_messages_between_users(user_id_1=user_id, user_id_2=current_user.id) or []
+async def messages(
+    user_id: int, 
+    before_id: Optional[int] = Query(None, gt=0, description='ID сообщения, старше которого нужна страница'),
+    before_created_at: Optional[datetime] = Query(None, description='Время сообщения before_id: страница читается только из более старых секций'),
+    limit: int = Query(50, gt=0, le=200, description='Размер страницы'),
+    current_user: User = Depends(get_current_user),
+):
+    return await MessagesDAO.get_messages_between_users(
+        user_id_1=user_id, 
+        user_id_2=current_user.id, 
+        before_id=before_id, 
+        before_created_at=before_created_at,
+        limit=limit,
+    ) or []
+
+@router.get('/search', response_model=MessageSearchPage, summary='Поиск по сообщениям')
+async def search_messages(
+    q: str = Query(..., min_length=1, max_length=200, description='Поисковый запрос'),
+    user_id: Optional[int] = Query(None, description='Искать только в переписке с этим пользователем'),
+    cursor: Optional[str] = Query(None, description='Курсор следующей страницы'),
+    limit: int = Query(20, gt=0, le=100, description='Размер страницы'),
+    current_user: User = Depends(get_current_user),
+):
+    try:
+        items, next_cursor = await MessagesDAO.search(
+            user_id=current_user.id,
+            query=q,
+            limit=limit,
+            cursor=cursor,
+            with_user_id=user_id,
+        )
+    except ValueError:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail='Invalid cursor')
+    return {'items': items, 'next_cursor': next_cursor}
+
+@router.get('/conversations', response_model=List[ConversationRead])
+async def conversations(current_user: User = Depends(get_current_user)):
+    user_conversations = await ConversationsDAO.get_user_conversations(user_id=current_user.id)
+    return [
+        {
+            'id': conversation.id,
+            'user_id': conversation.user_high_id if conversation.user_low_id == current_user.id else conversation.user_low_id,
+            'last_message_id': conversation.last_message_id,
+            'last_message_preview': conversation.last_message_preview,
+            'last_message_at': conversation.last_message_at,
+            'unread_count': unread_count,
+        }
+        for conversation, unread_count in user_conversations
+    ]
+
+@router.get('/presence', response_model=List[PresenceRead])
+async def get_presence(
+    user_id: List[int] = Query(..., max_length=500, description='ID пользователей'),
+    current_user: User = Depends(get_current_user),
+):
+    user_ids = list(dict.fromkeys(user_id))
+    online = await presence.online(user_ids)
+    last_seen = await presence.last_seen(user_ids)
+    return [
+        {
+            'user_id': uid,
+            'online': online[uid],
+            'last_seen': datetime.fromtimestamp(last_seen[uid], timezone.utc) if last_seen.get(uid) else None,
+        }
+        for uid in user_ids
+    ]
+
+@router.get('/messages/{user_id}/export', summary='Выгрузка переписки в NDJSON')
+async def export_messages(user_id: int, current_user: User = Depends(get_current_user)):
+    async def ndjson():
+        async for chunk in MessagesDAO.stream_messages_between_users(user_id_1=user_id, user_id_2=current_user.id):
+            yield b''.join(orjson.dumps(dict(row)) + b'\n' for row in chunk)
+    return StreamingResponse(ndjson(), media_type='application/x-ndjson')
+
+
+
+@manager.on('read')
+async def mark_read(connection, frame: dict) -> None:
+    """
+    Кадр `{"type": "read", "user_id": <собеседник>, "message_id": <ID последнего показанного сообщения>}`:
+    отмечает переписку прочитанной и рассылает новый счетчик во все соединения читателя.
+    """
+    peer_id = frame.get('user_id')
+    message_id = frame.get('message_id')
+    if type(peer_id) is not int or type(message_id) is not int:
+        return
+    unread_count = await UnreadCountersDAO.mark_read(connection.user_id, peer_id, message_id)
+    await broker.publish(connection.user_id, {'type': 'unread', 'user_id': peer_id, 'count': unread_count})
 
 
 @router.websocket('/ws/{user_id}')
 async def websocket_user_connect(websocket: WebSocket, user_id: int):
-    await websocket.accept()
-    
-    active_connections[user_id] = websocket
+    token = websocket.cookies.get(ACCESS_TOKEN_COOKIE)
+    try:
+        token_user_id = await token_verifier.verify(token) if token else None
+    except HTTPException:
+        token_user_id = None
+    if token_user_id != user_id:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+
+    connection = None
+    subscribed = announced = False
     try:
-        while True:
-            await asyncio.sleep(1)
-    except WebSocketDisconnect:
-        active_connections.pop(user_id, None)
\ No newline at end of file
+        connection = await manager.connect(websocket, user_id)
+        await broker.user_connected(user_id)
+        subscribed = True
+        await presence.user_connected(user_id)
+        announced = True
+        await manager.listen(connection)
+    finally:
+        # Откатываются только выполненные шаги: при ошибке Redis соединение не остается в реестре.
+        if connection is not None:
+            await manager.disconnect(connection)
+        try:
+            if subscribed:
+                await broker.user_disconnected(user_id)
+        finally:
+            if announced:
+                await presence.user_disconnected(user_id)
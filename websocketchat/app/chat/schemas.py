@@ -1,3 +1,6 @@
+from datetime import datetime
+from typing import List, Optional
+
 from pydantic import BaseModel, Field
 
 
@@ -6,8 +9,34 @@ class MessageRead(BaseModel):
     sender_id: int = Field(..., description="ID отправителя")
     recipient_id: int = Field(..., description="ID получателя")
     content: str = Field(..., description="Содержимое сообщения")
+    created_at: datetime = Field(..., description="Время отправки")
+
+
+class MessageSearchResult(MessageRead):
+    rank: float = Field(..., description="Релевантность")
+
+
+class MessageSearchPage(BaseModel):
+    items: List[MessageSearchResult] = Field(..., description="Найденные сообщения")
+    next_cursor: Optional[str] = Field(None, description="Курсор следующей страницы")
 
 
 class MessageCreate(BaseModel):
     recipient_id: int = Field(..., description="ID получателя")
     content: str = Field(..., description="Содержимое сообщения")
+    client_id: Optional[str] = Field(None, max_length=64, description="ID сообщения на клиенте: по нему отправившая вкладка узнает свое сообщение")
+
+
+class ConversationRead(BaseModel):
+    id: int = Field(..., description="ID переписки")
+    user_id: int = Field(..., description="ID собеседника")
+    last_message_id: Optional[int] = Field(None, description="ID последнего сообщения")
+    last_message_preview: Optional[str] = Field(None, description="Начало последнего сообщения")
+    last_message_at: Optional[datetime] = Field(None, description="Время последнего сообщения")
+    unread_count: int = Field(0, description="Количество непрочитанных сообщений")
+
+
+class PresenceRead(BaseModel):
+    user_id: int = Field(..., description="ID пользователя")
+    online: bool = Field(..., description="Есть ли у пользователя открытое соединение")
+    last_seen: Optional[datetime] = Field(None, description="Время последней активности")
\ No newline at end of file
@@ -1,3 +1,42 @@
+import base64
+
+
+def get_conversation_id(user_id_1: int, user_id_2: int) -> int:
+    """
+    Вычисляет ID переписки двух пользователей, не зависящий от порядка аргументов:
+    меньший ID занимает старшие 32 бита, больший - младшие.
+
+    :param user_id_1: ID первого пользователя.
+    :param user_id_2: ID второго пользователя.
+    :return: ID переписки.
+    """
+    low, high = sorted((user_id_1, user_id_2))
+    return (low << 32) | high
+
+def encode_search_cursor(rank: float, message_id: int) -> str:
+    """
+    Кодирует позицию в результатах поиска: ранг и ID последнего сообщения страницы.
+
+    :param rank: Ранг сообщения.
+    :param message_id: ID сообщения.
+    :return: Непрозрачная строка курсора.
+    """
+    return base64.urlsafe_b64encode(f'{rank!r}:{message_id}'.encode()).decode().rstrip('=')
+
+def decode_search_cursor(cursor: str) -> tuple[float, int]:
+    """
+    Разбирает курсор, созданный `encode_search_cursor`.
+
+    :param cursor: Строка курсора.
+    :return: Ранг и ID сообщения.
+    :raises ValueError: Если курсор поврежден.
+    """
+    try:
+        rank, _, message_id = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode().partition(':')
+        return float(rank), int(message_id)
+    except (UnicodeDecodeError, ValueError) as e:
+        raise ValueError('Invalid cursor') from e
+
 async def prepare_message(sender_id: int, recipient_id: int, content: str, *args, **kwargs) -> dict:
     """
     Подготавливает сообщение для отправки.
@@ -0,0 +1,193 @@
+import asyncio
+import logging
+from typing import Iterable, Optional
+
+import orjson
+
+from core.metrics import Gauge, registry
+from core.redis import Redis
+from core.settings import settings
+from .dao import MessagesDAO
+
+
+logger = logging.getLogger(__name__)
+
+DEAD_LETTER_KEY = 'chat:messages:dead'
+
+WRITE_FAILURES = registry.counter(
+    'message_writer_failures', 'Сообщения, не сохраненные write-behind буфером', ('stage',)
+)
+
+
+class MessageWriter:
+    """
+    Write-behind буфер сохранения сообщений.
+
+    Сообщения складываются в ограниченную очередь и сохраняются пачками по
+    `batch_size` штук или раз в `flush_interval` секунд одной транзакцией.
+    Пока идет сохранение пачки, очередь наполняется; когда она заполнена,
+    `write` ждет освобождения места (backpressure). При остановке очередь
+    дописывается до конца.
+
+    Если пачку не удалось сохранить за `retries` попыток, сообщения сохраняются
+    по одному, чтобы одна плохая строка не теряла остальные. Не сохраненные и так
+    сообщения попадают в список Redis `DEAD_LETTER_KEY`: он разбирается при
+    запуске и не чаще раза в `dead_letter_interval` секунд после успешной записи.
+    """
+
+    def __init__(
+        self,
+        enabled: bool,
+        batch_size: int,
+        flush_interval: float,
+        buffer_size: int,
+        retries: int = 3,
+        dead_letter_interval: float = 60,
+    ):
+        self.enabled = enabled
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.retries = retries
+        self.dead_letter_interval = dead_letter_interval
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=buffer_size)
+        self._task: Optional[asyncio.Task] = None
+        self._dead_letters_retried_at = 0.0
+
+    async def start(self) -> None:
+        if self.enabled:
+            await self.retry_dead_letters()
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        await self.queue.join()
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+
+    async def write(self, data: dict) -> None:
+        """
+        Ставит сообщение в очередь на сохранение.
+
+        :param data: Поля сообщения (id, sender_id, recipient_id, content).
+        """
+        if self._task is None:
+            await MessagesDAO.add(**data)
+            return
+        await self.queue.put(data)
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self.queue.get()]
+            deadline = loop.time() + self.flush_interval
+            while len(batch) < self.batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            try:
+                saved = await self._flush(batch)
+            finally:
+                for _ in batch:
+                    self.queue.task_done()
+            if saved and loop.time() - self._dead_letters_retried_at >= self.dead_letter_interval:
+                await self.retry_dead_letters()
+
+    async def _flush(self, batch: list[dict]) -> bool:
+        """
+        :return: Сохранена ли пачка целиком.
+        """
+        for attempt in range(1, self.retries + 1):
+            try:
+                await MessagesDAO.add_many(batch)
+                return True
+            except Exception:
+                logger.exception('Ошибка сохранения пачки сообщений, попытка %s', attempt)
+                if attempt < self.retries:
+                    await asyncio.sleep(0.1 * 2 ** attempt)
+        WRITE_FAILURES.inc(len(batch), stage='batch')
+        failed = await self._save_each(batch)
+        await self._dead_letter(failed)
+        return not failed
+
+    async def _save_each(self, rows: Iterable[dict]) -> list[dict]:
+        """
+        Сохраняет сообщения по одному.
+
+        :return: Сообщения, которые сохранить не удалось.
+        """
+        failed = []
+        for row in rows:
+            try:
+                await MessagesDAO.add(**row)
+            except Exception:
+                logger.exception('Ошибка сохранения сообщения')
+                failed.append(row)
+        if failed:
+            WRITE_FAILURES.inc(len(failed), stage='row')
+        return failed
+
+    async def _dead_letter(self, rows: list[dict]) -> None:
+        if not rows:
+            return
+        try:
+            await Redis().rpush(DEAD_LETTER_KEY, *(orjson.dumps(row) for row in rows))
+        except Exception:
+            logger.exception('Сообщения потеряны: не удалось записать их в список повторов')
+            WRITE_FAILURES.inc(len(rows), stage='lost')
+
+    async def retry_dead_letters(self) -> int:
+        """
+        Повторяет сохранение сообщений из `DEAD_LETTER_KEY`. Снова не сохраненные
+        сообщения возвращаются в конец списка.
+
+        :return: Количество сохраненных сообщений.
+        """
+        self._dead_letters_retried_at = asyncio.get_running_loop().time()
+        try:
+            total = await Redis().llen(DEAD_LETTER_KEY)
+        except Exception:
+            logger.exception('Ошибка чтения списка повторов')
+            return 0
+        saved = 0
+        while total > 0:
+            try:
+                items = await Redis().lpop(DEAD_LETTER_KEY, min(total, self.batch_size)) or []
+            except Exception:
+                logger.exception('Ошибка чтения списка повторов')
+                break
+            if not items:
+                break
+            total -= len(items)
+            rows = [orjson.loads(item) for item in items]
+            failed = await self._save_each(rows)
+            await self._dead_letter(failed)
+            saved += len(rows) - len(failed)
+            if failed:
+                break
+        return saved
+
+
+message_writer = MessageWriter(
+    enabled=settings.CHAT.WRITE_BEHIND,
+    batch_size=settings.CHAT.WRITE_BATCH_SIZE,
+    flush_interval=settings.CHAT.WRITE_FLUSH_INTERVAL_MS / 1000,
+    buffer_size=settings.CHAT.WRITE_BUFFER_SIZE,
+)
+
+
+@registry.collector
+async def _collect_writer() -> list:
+    queued = Gauge('message_writer_queued', 'Сообщения в очереди write-behind')
+    queued.set(message_writer.queue.qsize())
+    dead = Gauge('message_writer_dead_letters', 'Сообщения, ожидающие повторного сохранения')
+    try:
+        dead.set(await Redis().llen(DEAD_LETTER_KEY))
+    except Exception:
+        logger.exception('Ошибка чтения размера списка повторов')
+    return [queued, dead]
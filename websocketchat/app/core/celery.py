@@ -2,6 +2,7 @@ import os
 
 from celery import Celery
 
+from .metrics import instrument_celery
 from .settings import settings
 
 
@@ -16,6 +17,14 @@ app.conf.update(
     result_serializer=settings.CELERY.RESULT_SERIALIZER,
     task_serializer=settings.CELERY.TASK_SERIALIZER,
     broker_connection_retry_on_startup=settings.CELERY.BROKER_CONNECTION_RETRY_ON_STARTUP,
+    beat_schedule={
+        'maintain-message-partitions': {
+            'task': 'services.tasks.maintain_message_partitions_task',
+            'schedule': 6 * 60 * 60,
+        },
+    },
 )
 
+instrument_celery()
+
 app.autodiscover_tasks(['services'])
\ No newline at end of file
@@ -1,13 +1,20 @@
-from smtplib import SMTP
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
+import logging
+import quopri
+import threading
+import time
+from smtplib import SMTP, SMTPException, SMTPRecipientsRefused, SMTPResponseException, SMTPServerDisconnected
+from email import policy
+from email.message import EmailMessage
+from email.utils import formatdate, make_msgid, parseaddr
 from datetime import datetime, timedelta, timezone
 from jose import jwt, JWTError
-from typing import Optional
+from typing import Iterable, Optional
 
 from .settings import settings
 
 
+logger = logging.getLogger(__name__)
+
 SECRET_KEY = settings.SECRET_KEY
 ALGORITHM = 'HS256'
 ACCESS_TOKEN_EXPIRE_DAYS = 5
@@ -41,51 +48,169 @@ def verify_confirmation_token(token: str) -> Optional[str]:
     except JWTError:
         return None
 
+class EmailTemplate:
+    """
+    Шаблон письма в виде простого текста.
+
+    Заголовки (From, Subject с кодированием RFC 2047, MIME) собираются один раз,
+    для каждого письма подставляются только получатель, Date, Message-ID и тело,
+    закодированное quoted-printable.
+    """
+
+    def __init__(self, from_email: str, subject: str, body: str):
+        msg = EmailMessage(policy=policy.SMTP)
+        msg['From'] = from_email
+        msg['Subject'] = subject
+        msg.set_content('', charset='utf-8', cte='quoted-printable')
+        self.headers = msg.as_bytes().split(b'\r\n\r\n', 1)[0] + b'\r\n'
+        self.body = body
+        self.domain = parseaddr(from_email)[1].rpartition('@')[2] or None
+
+    def render(self, to_email: str, **fields) -> bytes:
+        """
+        :param to_email: Адрес получателя.
+        :param fields: Значения полей `{name}` тела письма.
+        :return: Письмо, готовое к отправке.
+        """
+        text = self.body.format(**fields).replace('\r\n', '\n').replace('\n', '\r\n')
+        return b''.join((
+            self.headers,
+            b'Date: ', formatdate(localtime=True).encode(), b'\r\n',
+            b'Message-ID: ', make_msgid(domain=self.domain).encode(), b'\r\n',
+            b'To: ', to_email.encode(), b'\r\n\r\n',
+            quopri.encodestring(text.encode('utf-8')).replace(b'\r\n', b'\n').replace(b'\n', b'\r\n'),
+        ))
+
+
 class SMTPClient:
-    def __init__(self, host, port, user, password, use_tls=True):
+    """
+    Пул аутентифицированных SMTP-сессий процесса.
+
+    Соединение (с STARTTLS и авторизацией) открывается при первой отправке
+    и возвращается в пул, так что следующие письма уходят без нового рукопожатия.
+    Соединение, простоявшее дольше `max_idle` секунд или отправившее
+    `max_messages` писем, закрывается. Если сервер успел закрыть соединение,
+    письмо повторяется через новое.
+    """
+
+    def __init__(
+        self,
+        host,
+        port,
+        user,
+        password,
+        use_tls=True,
+        pool_size: int = 2,
+        max_idle: float = 30,
+        max_messages: int = 100,
+    ):
         self.host = host
         self.port = port
         self.user = user
         self.password = password
         self.use_tls = use_tls
+        self.pool_size = pool_size
+        self.max_idle = max_idle
+        self.max_messages = max_messages
         self.from_email = settings.SMTP.DEFAULT_FROM_EMAIL
+        self._idle: list[tuple[SMTP, float, int]] = []
+        self._lock = threading.Lock()
+        self._templates: dict[str, EmailTemplate] = {}
 
-    def connect(self):
-        self.server = SMTP(self.host, self.port)
-        self.server.set_debuglevel(1)
+    def connect(self) -> SMTP:
+        server = SMTP(self.host, self.port, timeout=30)
         if self.use_tls:
-            self.server.starttls()
-        self.server.login(self.user, self.password)
+            server.starttls()
+        if self.user:
+            server.login(self.user, self.password)
+        return server
 
-    def _prepare_message(self, to_email: str, subject: str, body: str) -> MIMEMultipart:
-        msg = MIMEMultipart()
-        msg['From'] = self.from_email
-        msg['To'] = to_email
-        msg['Subject'] = subject
-        msg.attach(MIMEText(body, 'plain'))
-        return msg
-    
-    def _send_mail(self, to_email: str, subject: str, body: str):
-        msg: MIMEMultipart = self._prepare_message(to_email, subject, body)
-        self.server.sendmail(
-            from_addr=self.from_email,
-            to_addrs=to_email,
-            msg=msg.as_bytes()
-        )
-        return msg
-
-    def send_email(self, to_email: str, subject: str, body: str):
-        try:
-            self.connect()
-            self._send_mail(to_email, subject, body)
-        except Exception as e:
-            print(e)
-        finally:
-            self.close()
+    def template(self, subject: str) -> EmailTemplate:
+        template = self._templates.get(subject)
+        if template is None:
+            template = self._templates[subject] = EmailTemplate(self.from_email, subject, '{body}')
+        return template
+
+    def send_messages(self, messages: Iterable[tuple[str, bytes]]) -> list[tuple[str, bytes]]:
+        """
+        Отправляет готовые письма через одно соединение из пула.
+
+        Ошибка одного письма не прерывает отправку остальных. Письма, которые
+        сервер отклонил окончательно (коды 5xx), пропускаются; остальные
+        недоставленные письма, в том числе оставшиеся после обрыва соединения,
+        возвращаются для повторной отправки.
+
+        :param messages: Пары (адрес получателя, письмо).
+        :return: Недоставленные письма, которые стоит отправить позже.
+        """
+        messages = list(messages)
+        undelivered = []
+        server, sent = None, 0
+        for index, (to_email, msg) in enumerate(messages):
+            try:
+                if server is None:
+                    server, sent = self._acquire()
+                try:
+                    server.sendmail(self.from_email, to_email, msg)
+                except SMTPServerDisconnected:
+                    self._close(server)
+                    server, sent = self.connect(), 0
+                    server.sendmail(self.from_email, to_email, msg)
+            except SMTPRecipientsRefused as e:
+                logger.warning('Получатель %s отклонен: %s', to_email, e)
+                if any(code < 500 for code, _ in e.recipients.values()):
+                    undelivered.append((to_email, msg))
+                continue
+            except SMTPResponseException as e:
+                # SMTPSenderRefused, SMTPDataError и т.п.: sendmail уже сбросил транзакцию, соединение живо.
+                logger.warning('Письмо для %s отклонено: %s', to_email, e)
+                if e.smtp_code < 500:
+                    undelivered.append((to_email, msg))
+                continue
+            except (SMTPException, OSError):
+                logger.exception('Ошибка SMTP-соединения')
+                if server is not None:
+                    self._close(server)
+                return undelivered + messages[index:]
+            sent += 1
+            if sent >= self.max_messages:
+                self._close(server)
+                server = None
+        if server is not None:
+            self._release(server, sent)
+        return undelivered
+
+    def send_email(self, to_email: str, subject: str, body: str) -> bool:
+        return not self.send_messages([(to_email, self.template(subject).render(to_email, body=body))])
 
     def close(self):
-        if self.server:
-            self.server.quit()
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for server, _, _ in idle:
+            self._close(server)
+
+    def _acquire(self) -> tuple[SMTP, int]:
+        now = time.monotonic()
+        with self._lock:
+            while self._idle:
+                server, released_at, sent = self._idle.pop()
+                if now - released_at < self.max_idle:
+                    return server, sent
+                self._close(server)
+        return self.connect(), 0
+
+    def _release(self, server: SMTP, sent: int) -> None:
+        with self._lock:
+            if len(self._idle) < self.pool_size:
+                self._idle.append((server, time.monotonic(), sent))
+                return
+        self._close(server)
+
+    def _close(self, server: SMTP) -> None:
+        try:
+            server.quit()
+        except (SMTPException, OSError):
+            server.close()
 
 
 client = SMTPClient(
@@ -94,4 +219,7 @@ client = SMTPClient(
     user=settings.SMTP.USER,
     password=settings.SMTP.PASSWORD,
     use_tls=settings.SMTP.USE_TLS,
+    pool_size=settings.SMTP.POOL_SIZE,
+    max_idle=settings.SMTP.MAX_IDLE,
+    max_messages=settings.SMTP.MAX_MESSAGES_PER_CONNECTION,
 )
\ No newline at end of file
@@ -0,0 +1,441 @@
+"""
+Метрики приложения в текстовом формате Prometheus.
+
+Метрики хранятся в памяти процесса и отдаются эндпоинтом `/metrics`, поэтому
+каждый воркер uvicorn опрашивается отдельно. Значения, которые и так есть
+у сервисов (кеши DAO, пул хеширования паролей, соединения), собираются
+в момент запроса коллекторами. Длительности задач Celery копятся в Redis,
+так как воркеры Celery HTTP не обслуживают.
+"""
+import asyncio
+import logging
+import math
+import random
+import time
+from abc import ABC, abstractmethod
+from typing import Awaitable, Callable, Dict, Iterable, Optional, Sequence, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from .redis import Redis
+from .settings import settings
+
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+LAG_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+CELERY_PREFIX = 'metrics:celery'
+
+LabelValues = Tuple[str, ...]
+
+logger = logging.getLogger(__name__)
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return '+Inf'
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _format_labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ''
+    pairs = (
+        '{}="{}"'.format(name, str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+        for name, value in labels.items()
+    )
+    return '{' + ','.join(pairs) + '}'
+
+
+class Metric(ABC):
+    type = 'untyped'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+
+    def _key(self, labels: Dict[str, str]) -> LabelValues:
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    @abstractmethod
+    def samples(self) -> Iterable[Tuple[str, Dict[str, str], float]]:
+        """
+        :return: Отсчеты метрики: (имя, метки, значение).
+        """
+
+    def render(self) -> str:
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.type}']
+        for name, labels, value in self.samples():
+            lines.append(f'{name}{_format_labels(labels)} {_format_value(value)}')
+        return '\n'.join(lines)
+
+
+class Counter(Metric):
+    type = 'counter'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self.values: Dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1, **labels: str) -> None:
+        key = self._key(labels)
+        self.values[key] = self.values.get(key, 0) + amount
+
+    def samples(self) -> Iterable[Tuple[str, Dict[str, str], float]]:
+        for key, value in self.values.items():
+            yield f'{self.name}_total', dict(zip(self.labelnames, key)), value
+
+
+class Gauge(Counter):
+    type = 'gauge'
+
+    def set(self, value: float, **labels: str) -> None:
+        self.values[self._key(labels)] = value
+
+    def samples(self) -> Iterable[Tuple[str, Dict[str, str], float]]:
+        for key, value in self.values.items():
+            yield self.name, dict(zip(self.labelnames, key)), value
+
+
+class Histogram(Metric):
+    type = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+        # Для каждого набора меток: счетчики по корзинам (не накопленные), сумма.
+        self.values: Dict[LabelValues, Tuple[list, list]] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        state = self.values.get(key)
+        if state is None:
+            state = self.values[key] = ([0] * len(self.buckets), [0.0])
+        counts, total = state
+        for index, bound in enumerate(self.buckets):
+            if value <= bound:
+                counts[index] += 1
+                break
+        total[0] += value
+
+    def samples(self) -> Iterable[Tuple[str, Dict[str, str], float]]:
+        for key, (counts, total) in self.values.items():
+            labels = dict(zip(self.labelnames, key))
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                yield f'{self.name}_bucket', dict(labels, le=_format_value(bound)), cumulative
+            yield f'{self.name}_sum', labels, total[0]
+            yield f'{self.name}_count', labels, cumulative
+
+
+Collector = Callable[[], Awaitable[Iterable[Metric]]]
+
+
+class Registry:
+    """
+    Реестр метрик процесса.
+
+    Постоянные метрики создаются через `counter`, `gauge`, `histogram`.
+    Коллекторы - корутины, которые при каждом запросе `/metrics` строят
+    метрики из текущего состояния сервисов.
+    """
+
+    def __init__(self):
+        self.metrics: Dict[str, Metric] = {}
+        self.collectors: list[Collector] = []
+
+    def register(self, metric: Metric) -> Metric:
+        if metric.name in self.metrics:
+            raise ValueError(f'Метрика {metric.name} уже зарегистрирована')
+        self.metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self.register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self.register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def collector(self, collector: Collector) -> Collector:
+        """
+        Регистрирует коллектор (можно использовать как декоратор).
+
+        :param collector: Корутина без аргументов, возвращающая метрики.
+        :return: Тот же коллектор.
+        """
+        self.collectors.append(collector)
+        return collector
+
+    async def render(self) -> str:
+        """
+        :return: Все метрики в текстовом формате Prometheus.
+        """
+        metrics = list(self.metrics.values())
+        for collector in self.collectors:
+            try:
+                metrics.extend(await collector())
+            except Exception:
+                logger.exception('Ошибка коллектора метрик %s', getattr(collector, '__name__', collector))
+        return '\n'.join(metric.render() for metric in metrics) + '\n'
+
+
+def stats_gauges(prefix: str, documentation: str, stats: Dict[str, Dict[str, float]], label: str) -> list[Gauge]:
+    """
+    Превращает словари статистики сервисов в метрики.
+
+    :param prefix: Префикс имен метрик.
+    :param documentation: Описание метрик.
+    :param stats: Статистика вида {значение метки: {поле: число}}.
+    :param label: Имя метки.
+    :return: Метрики `<prefix>_<поле>` с меткой `label`.
+    """
+    gauges: Dict[str, Gauge] = {}
+    for label_value, values in stats.items():
+        for field, value in values.items():
+            gauge = gauges.get(field)
+            if gauge is None:
+                gauge = gauges[field] = Gauge(f'{prefix}_{field}', f'{documentation}: {field}', (label,))
+            gauge.set(value, **{label: label_value})
+    return list(gauges.values())
+
+
+registry = Registry()
+
+REQUEST_LATENCY = registry.histogram(
+    'http_request_duration_seconds', 'Время обработки HTTP-запроса', ('method', 'route', 'status'),
+)
+LOOP_LAG = registry.histogram(
+    'event_loop_lag_seconds', 'Задержка пробуждения задачи в цикле событий', buckets=LAG_BUCKETS,
+)
+DB_POOL_WAIT = registry.histogram(
+    'db_pool_checkout_wait_seconds', 'Ожидание свободного соединения в пуле', ('engine',), buckets=LAG_BUCKETS,
+)
+DB_POOL_HOLD = registry.histogram(
+    'db_pool_connection_hold_seconds', 'Время, на которое соединение берется из пула', ('engine',),
+)
+DB_QUERY_DURATION = registry.histogram(
+    'db_query_duration_seconds', 'Время выполнения SQL-запроса', ('engine',),
+)
+DB_SLOW_QUERIES = registry.counter(
+    'db_slow_queries', 'SQL-запросы дольше порога медленных запросов', ('engine',),
+)
+
+
+class MetricsMiddleware:
+    """
+    ASGI middleware, измеряющее время HTTP-запросов по шаблонам маршрутов.
+
+    Метка `route` берется из найденного маршрута (`/chat/messages/{user_id}`),
+    а не из пути запроса, поэтому число временных рядов не растет с числом
+    пользователей. Запросы без маршрута попадают в `route="unmatched"`.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+
+        status_code = 500
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal status_code
+            if message['type'] == 'http.response.start':
+                status_code = message['status']
+            await send(message)
+
+        started_at = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            route = scope.get('route')
+            REQUEST_LATENCY.observe(
+                time.perf_counter() - started_at,
+                method=scope['method'],
+                route=getattr(route, 'path', 'unmatched'),
+                status=str(status_code),
+            )
+
+
+class LoopLagMonitor:
+    """
+    Задача, которая просыпается каждые `interval` секунд и записывает
+    в `event_loop_lag_seconds`, насколько позже запланированного это произошло.
+    """
+
+    def __init__(self, interval: float = 0.1):
+        self.interval = interval
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self) -> None:
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            started_at = time.perf_counter()
+            await asyncio.sleep(self.interval)
+            LOOP_LAG.observe(max(0.0, time.perf_counter() - started_at - self.interval))
+
+
+loop_lag_monitor = LoopLagMonitor()
+
+
+class InstrumentedQueuePool(AsyncAdaptedQueuePool):
+    """
+    Пул соединений, который измеряет ожидание свободного соединения.
+
+    Метка `engine` берется из `pool_logging_name` движка: это имя сохраняется
+    и при пересоздании пула в `engine.dispose()`.
+    """
+
+    def _do_get(self):
+        started_at = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            DB_POOL_WAIT.observe(time.perf_counter() - started_at, engine=self._orig_logging_name or 'primary')
+
+
+_engines: Dict[str, AsyncEngine] = {}
+
+
+def instrument_engine(engine: AsyncEngine, name: str, slow_query_ms: int, slow_query_sample_rate: float) -> None:
+    """
+    Подключает к движку метрики пула и запросов и журнал медленных запросов.
+
+    Каждый запрос дольше `slow_query_ms` считается в `db_slow_queries`, а его
+    текст пишется в журнал с вероятностью `slow_query_sample_rate`: в отличие от
+    `echo=True`, быстрые запросы не журналируются вовсе.
+
+    :param engine: Асинхронный движок SQLAlchemy.
+    :param name: Имя движка для метки `engine` (primary, replica-0, ...).
+    :param slow_query_ms: Порог медленного запроса, миллисекунд.
+    :param slow_query_sample_rate: Доля журналируемых медленных запросов (0..1).
+    """
+    sync_engine = engine.sync_engine
+    slow_query_seconds = slow_query_ms / 1000
+    _engines[name] = engine
+
+    @event.listens_for(sync_engine.pool, 'checkout')
+    def _checkout(dbapi_connection, connection_record, connection_proxy):
+        connection_record.info['checked_out_at'] = time.perf_counter()
+
+    @event.listens_for(sync_engine.pool, 'checkin')
+    def _checkin(dbapi_connection, connection_record):
+        checked_out_at = connection_record.info.pop('checked_out_at', None)
+        if checked_out_at is not None:
+            DB_POOL_HOLD.observe(time.perf_counter() - checked_out_at, engine=name)
+
+    @event.listens_for(sync_engine, 'before_cursor_execute')
+    def _before_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('query_started_at', []).append(time.perf_counter())
+
+    @event.listens_for(sync_engine, 'after_cursor_execute')
+    def _after_execute(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info['query_started_at'].pop()
+        DB_QUERY_DURATION.observe(elapsed, engine=name)
+        if elapsed >= slow_query_seconds:
+            DB_SLOW_QUERIES.inc(engine=name)
+            if random.random() < slow_query_sample_rate:
+                logger.warning('Slow query %.1f ms (%s): %s', elapsed * 1000, name, ' '.join(statement.split())[:1000])
+
+    @event.listens_for(sync_engine, 'handle_error')
+    def _handle_error(exception_context):
+        # after_cursor_execute для упавшего запроса не вызывается: снимаем его время со стека.
+        conn = exception_context.connection
+        if conn is None or exception_context.cursor is None:
+            return
+        started = conn.info.get('query_started_at')
+        if started:
+            started.pop()
+
+
+@registry.collector
+async def _collect_pools() -> list[Metric]:
+    size = Gauge('db_pool_size', 'Размер пула соединений', ('engine',))
+    in_use = Gauge('db_pool_checked_out', 'Соединения, выданные из пула', ('engine',))
+    overflow = Gauge('db_pool_overflow', 'Соединения сверх размера пула', ('engine',))
+    for name, engine in _engines.items():
+        pool = engine.sync_engine.pool
+        if not isinstance(pool, QueuePool):
+            continue
+        size.set(pool.size(), engine=name)
+        in_use.set(pool.checkedout(), engine=name)
+        overflow.set(max(0, pool.overflow()), engine=name)
+    return [size, in_use, overflow]
+
+
+def instrument_celery() -> None:
+    """
+    Подключает к сигналам Celery учет длительности задач.
+
+    Длительности копятся в Redis в хешах `metrics:celery:<задача>:<состояние>`
+    в виде корзин гистограммы, откуда их читает `/metrics` приложения.
+    """
+    from celery.signals import task_prerun, task_postrun
+    from redis import Redis as SyncRedis
+
+    redis = SyncRedis.from_url(settings.REDIS.URL, password=settings.REDIS.PASSWORD or None)
+    started: Dict[str, float] = {}
+
+    @task_prerun.connect(weak=False)
+    def _task_prerun(task_id=None, **kwargs):
+        started[task_id] = time.perf_counter()
+
+    @task_postrun.connect(weak=False)
+    def _task_postrun(task_id=None, task=None, state=None, **kwargs):
+        started_at = started.pop(task_id, None)
+        if started_at is None:
+            return
+        elapsed = time.perf_counter() - started_at
+        key = f'{CELERY_PREFIX}:{task.name}:{state or "UNKNOWN"}'
+        bound = next(bound for bound in DEFAULT_BUCKETS + (math.inf,) if elapsed <= bound)
+        try:
+            with redis.pipeline(transaction=False) as pipe:
+                pipe.sadd(f'{CELERY_PREFIX}:keys', key)
+                pipe.hincrby(key, _format_value(bound), 1)
+                pipe.hincrbyfloat(key, 'sum', elapsed)
+                pipe.execute()
+        except Exception:
+            logger.exception('Не удалось записать метрики задачи %s', task.name)
+
+
+@registry.collector
+async def collect_celery() -> list[Metric]:
+    """
+    Собирает длительности задач Celery, накопленные `instrument_celery`.
+
+    :return: Гистограмма `celery_task_duration_seconds`.
+    """
+    redis = Redis()
+    histogram = Histogram('celery_task_duration_seconds', 'Время выполнения задачи Celery', ('task', 'state'))
+    keys = sorted(key.decode() for key in await redis.smembers(f'{CELERY_PREFIX}:keys'))
+    if not keys:
+        return []
+    async with redis.pipeline(transaction=False) as pipe:
+        for key in keys:
+            pipe.hgetall(key)
+        results = await pipe.execute()
+    for key, values in zip(keys, results):
+        task, state = key[len(CELERY_PREFIX) + 1:].rsplit(':', 1)
+        values = {field.decode(): value for field, value in values.items()}
+        counts = [int(values.get(_format_value(bound), 0)) for bound in histogram.buckets]
+        histogram.values[histogram._key({'task': task, 'state': state})] = (counts, [float(values.get('sum', 0))])
+    return [histogram]
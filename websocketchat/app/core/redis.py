@@ -0,0 +1,27 @@
+from typing import Optional
+
+from redis import asyncio as aioredis
+
+from .settings import settings
+
+
+class Redis:
+    _instance: Optional[aioredis.Redis] = None
+
+    def __new__(cls) -> aioredis.Redis:
+        if not cls._instance:
+            cls.connect()
+        return cls._instance
+
+    @classmethod
+    def connect(cls) -> None:
+        cls._instance = aioredis.from_url(
+            settings.REDIS.URL,
+            password=settings.REDIS.PASSWORD or None,
+        )
+
+    @classmethod
+    async def close(cls) -> None:
+        if cls._instance:
+            await cls._instance.aclose()
+            cls._instance = None
@@ -0,0 +1,106 @@
+import asyncio
+import logging
+import threading
+from functools import wraps
+from typing import Any, Awaitable, Callable, Coroutine, Optional
+
+from celery import shared_task
+from celery.signals import worker_process_init, worker_process_shutdown
+
+from core.redis import Redis
+from db.database import dispose_engines
+
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncRuntime:
+    """
+    Один цикл событий на процесс воркера Celery.
+
+    Цикл работает в фоновом потоке всё время жизни процесса, а задачи отправляют
+    в него корутины. Пул соединений SQLAlchemy, клиент Redis и HTTP-сессия бота
+    создаются один раз и переиспользуются всеми задачами, вместо того чтобы
+    заново подниматься в каждом `asyncio.run`.
+    """
+
+    def __init__(self):
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self.thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self._shutdown_callbacks: list[Callable[[], Awaitable[None]]] = []
+
+    def on_shutdown(self, callback: Callable[[], Awaitable[None]]) -> Callable[[], Awaitable[None]]:
+        """
+        Регистрирует корутину, освобождающую ресурсы процесса при его остановке.
+
+        :param callback: Функция без аргументов, возвращающая корутину.
+        :return: Та же функция (можно использовать как декоратор).
+        """
+        self._shutdown_callbacks.append(callback)
+        return callback
+
+    def start(self) -> None:
+        with self._lock:
+            if self.loop is not None:
+                return
+            loop = asyncio.new_event_loop()
+            thread = threading.Thread(target=loop.run_forever, name='async-runtime', daemon=True)
+            thread.start()
+            self.loop, self.thread = loop, thread
+
+    def run(self, coro: Coroutine[Any, Any, Any], timeout: Optional[float] = None) -> Any:
+        """
+        Выполняет корутину в цикле процесса и ждет результат.
+
+        :param coro: Корутина.
+        :param timeout: Максимальное время ожидания, секунд.
+        :return: Результат корутины.
+        """
+        if self.loop is None:
+            self.start()
+        return asyncio.run_coroutine_threadsafe(coro, self.loop).result(timeout)
+
+    def stop(self) -> None:
+        if self.loop is None:
+            return
+        for callback in reversed(self._shutdown_callbacks):
+            try:
+                self.run(callback(), timeout=10)
+            except Exception:
+                logger.exception('Ошибка при остановке цикла событий воркера')
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join(timeout=10)
+        self.loop.close()
+        self.loop, self.thread = None, None
+
+
+runtime = AsyncRuntime()
+runtime.on_shutdown(Redis.close)
+runtime.on_shutdown(dispose_engines)
+
+
+def async_task(*task_args, **task_kwargs):
+    """
+    Декоратор задачи Celery из корутины: задача выполняется в цикле событий
+    процесса воркера (`runtime`). Аргументы передаются в `shared_task`.
+    """
+    def decorator(func: Callable[..., Coroutine[Any, Any, Any]]):
+        @wraps(func)
+        def task(*args, **kwargs):
+            return runtime.run(func(*args, **kwargs))
+        return shared_task(*task_args, **task_kwargs)(task)
+    return decorator
+
+
+@worker_process_init.connect
+def _start_runtime(**kwargs) -> None:
+    runtime.start()
+    # Соединения пула, унаследованные от родителя после fork, ему и принадлежат:
+    # забываем их, не закрывая.
+    runtime.run(dispose_engines(close=False))
+
+
+@worker_process_shutdown.connect
+def _stop_runtime(**kwargs) -> None:
+    runtime.stop()
@@ -13,10 +13,32 @@ class DBSettings(BaseSettings):
     PASSWORD: str
     HOST: str
     PORT: int
+    ECHO: bool = False
+    SLOW_QUERY_MS: int = 200
+    SLOW_QUERY_SAMPLE_RATE: float = 1.0
+    POOL_SIZE: int = 10
+    MAX_OVERFLOW: int = 20
+    POOL_TIMEOUT: int = 30
+    POOL_RECYCLE: int = 1800
+    POOL_PRE_PING: bool = True
+    STATEMENT_CACHE_SIZE: int = 500
+    PGBOUNCER: bool = False
+    REPLICA_HOSTS: str = ''
 
     @property
     def URL(self) -> str:
-        return f'postgresql+asyncpg://{self.USER}:{self.PASSWORD}@{self.HOST}:{self.PORT}/{self.NAME}'
+        return self.url_for(self.HOST, self.PORT)
+
+    @property
+    def REPLICA_URLS(self) -> list[str]:
+        urls = []
+        for replica in filter(None, (host.strip() for host in self.REPLICA_HOSTS.split(','))):
+            host, _, port = replica.partition(':')
+            urls.append(self.url_for(host, int(port or self.PORT)))
+        return urls
+
+    def url_for(self, host: str, port: int) -> str:
+        return f'postgresql+asyncpg://{self.USER}:{self.PASSWORD}@{host}:{port}/{self.NAME}'
 
     model_config = SettingsConfigDict(
         env_file=os.path.join(ROOT_DIR, '.env', '.env.db'),
@@ -32,6 +54,12 @@ class SMTPSettings(BaseSettings):
     PASSWORD: str
     USE_TLS: bool
     DEFAULT_FROM_EMAIL: str
+    POOL_SIZE: int = 2
+    MAX_IDLE: int = 30
+    MAX_MESSAGES_PER_CONNECTION: int = 100
+    BATCH_SIZE: int = 50
+    BATCH_DELAY_MS: int = 500
+    RETRY_DELAY_MS: int = 60000
 
     model_config = SettingsConfigDict(
         env_file=os.path.join(ROOT_DIR, '.env', '.env.smtp'),
@@ -71,6 +99,10 @@ _redis = RedisSettings()
 class AuthSettings(BaseSettings):
     ALGORITHM: str
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 30
+    HASH_WORKERS: int = os.cpu_count() or 1
+    HASH_QUEUE_SIZE: int = 256
+    TOKEN_CACHE_SIZE: int = 10000
+    REVOCATION_PREFIX: str = 'auth'
 
     model_config = SettingsConfigDict(
         env_file=os.path.join(ROOT_DIR, '.env', '.env.auth'),
@@ -97,6 +129,44 @@ class CelerySettings(BaseSettings):
 _celery = CelerySettings()
 
 
+class ChatSettings(BaseSettings):
+    BROKER: str = 'redis'
+    CHANNEL_PREFIX: str = 'chat'
+    PRESENCE_TTL: int = 30
+    HEARTBEAT_INTERVAL: int = 10
+    PONG_TIMEOUT: int = 45
+    PRESENCE_BATCH_INTERVAL_MS: int = 1000
+    LAST_SEEN_RETENTION_DAYS: int = 30
+    WRITE_BEHIND: bool = True
+    WRITE_BATCH_SIZE: int = 200
+    WRITE_FLUSH_INTERVAL_MS: int = 50
+    WRITE_BUFFER_SIZE: int = 10000
+    PARTITION_MONTHS_AHEAD: int = 3
+    ARCHIVE_AFTER_MONTHS: int = 12
+    RECENT_HISTORY_DAYS: int = 31
+
+    model_config = SettingsConfigDict(
+        env_file=os.path.join(ROOT_DIR, '.env', '.env.chat'),
+        extra='ignore',
+    )
+_chat = ChatSettings()
+
+
+class CacheSettings(BaseSettings):
+    ENABLED: bool = True
+    PREFIX: str = 'dao'
+    TTL: int = 30
+    MAX_SIZE: int = 10000
+    REDIS: bool = True
+    REDIS_TTL: int = 300
+
+    model_config = SettingsConfigDict(
+        env_file=os.path.join(ROOT_DIR, '.env', '.env.cache'),
+        extra='ignore',
+    )
+_cache = CacheSettings()
+
+
 class Settings(BaseSettings):
     STATIC_DIR: Path = APP_DIR / 'static'
     SECRET_KEY: str
@@ -107,6 +177,8 @@ class Settings(BaseSettings):
     AUTH: AuthSettings
     CELERY: CelerySettings
     SMTP: SMTPSettings
+    CHAT: ChatSettings
+    CACHE: CacheSettings
     
     model_config = SettingsConfigDict(
         env_file=os.path.join(ROOT_DIR, '.env', '.env'),
@@ -121,4 +193,6 @@ settings = Settings(
     AUTH=_auth,
     CELERY=_celery,
     SMTP=_smtp,
+    CHAT=_chat,
+    CACHE=_cache,
 )
\ No newline at end of file
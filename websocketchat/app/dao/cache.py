@@ -0,0 +1,473 @@
+import asyncio
+import logging
+import time
+from collections import OrderedDict, namedtuple
+from datetime import date, datetime, time as dt_time
+from decimal import Decimal
+from typing import Any, Awaitable, Callable, Dict, Optional, Sequence
+
+import orjson
+from sqlalchemy import event
+from sqlalchemy.orm import Session, make_transient_to_detached
+
+from core.metrics import registry, stats_gauges
+from core.redis import Redis
+from core.settings import settings
+from db.database import Base
+from db.sessions import USE_PRIMARY
+
+
+logger = logging.getLogger(__name__)
+
+DIRTY_TABLES = 'dao_cache_dirty'
+
+_MISSING = object()
+
+# Типы колонок, которые orjson сохраняет строками: при чтении из Redis они восстанавливаются.
+_DECODERS: Dict[type, Callable[[Any], Any]] = {
+    datetime: datetime.fromisoformat,
+    date: date.fromisoformat,
+    dt_time: dt_time.fromisoformat,
+    Decimal: Decimal,
+}
+
+
+class DAOCache:
+    """
+    Кеш выборок одной модели: локальный TTL+LRU уровень в памяти процесса
+    и общий для всех воркеров уровень в Redis.
+
+    Хранятся не ORM-объекты, а снимки колонок: на каждое попадание собирается
+    новый отсоединенный экземпляр, поэтому запросы не делят изменяемые объекты.
+    Ключи Redis содержат версию таблицы, которая увеличивается при каждой записи,
+    так что устаревшие значения просто перестают читаться и истекают по TTL.
+
+    В Redis снимки хранятся в JSON. Выборки с приватными колонками (например,
+    хешем пароля) в Redis не попадают и кешируются только в памяти процесса.
+    """
+
+    def __init__(
+        self,
+        registry: 'CacheRegistry',
+        model: type[Base],
+        ttl: int,
+        max_size: int,
+        redis_ttl: int,
+        private: Sequence[str] = (),
+    ):
+        self.registry = registry
+        self.model = model
+        self.table = model.__tablename__
+        self.ttl = ttl
+        self.max_size = max_size
+        self.redis_ttl = redis_ttl
+        self.version = 0
+        self.epoch = 0
+        self.pending = 0
+        self.local: OrderedDict[str, tuple[float, Any]] = OrderedDict()
+        self.inflight: Dict[str, asyncio.Future] = {}
+        self.listeners: list[Callable[[], None]] = []
+        self.stats = dict.fromkeys(
+            ('local_hits', 'redis_hits', 'misses', 'coalesced', 'bypassed', 'invalidations', 'errors'), 0
+        )
+        self.private = frozenset(private)
+        self._columns = [column.key for column in model.__mapper__.column_attrs]
+        self._decoders = {}
+        for column in model.__mapper__.column_attrs:
+            try:
+                python_type = column.expression.type.python_type
+            except NotImplementedError:
+                continue
+            decoder = _DECODERS.get(python_type)
+            if decoder is not None:
+                self._decoders[column.key] = decoder
+
+    async def fetch(
+        self,
+        session: Session,
+        method: str,
+        filter_by: dict,
+        loader: Callable[[], Awaitable[Any]],
+        columns: Sequence[str] = (),
+    ) -> Any:
+        """
+        Возвращает результат выборки из кеша или загружает его через `loader`.
+
+        Одновременные промахи по одному ключу объединяются: в базу идет только
+        первый запрос, остальные ждут его результат. Кеш не используется, пока
+        реестр не запущен, и внутри транзакции, которая уже меняла эту таблицу.
+
+        :param session: Сессия, в которой выполняется выборка.
+        :param method: Имя метода DAO, часть ключа.
+        :param filter_by: Условия выборки, часть ключа.
+        :param loader: Корутина, выполняющая выборку из базы.
+        :param columns: Колонки проекции, если выбираются строки, а не сущности.
+        :return: Результат выборки.
+        """
+        if not self.registry.running or self.table in session.info.get(DIRTY_TABLES, ()):
+            self.stats['bypassed'] += 1
+            return await loader()
+
+        key = self._key(method, filter_by, columns)
+        snapshot = self._get_local(key)
+        if snapshot is not _MISSING:
+            self.stats['local_hits'] += 1
+            return self._restore(snapshot, columns)
+
+        while (future := self.inflight.get(key)) is not None:
+            self.stats['coalesced'] += 1
+            try:
+                snapshot = await asyncio.shield(future)
+            except asyncio.CancelledError:
+                # Отменили загружавший запрос, а не нас: загружаем сами.
+                if not future.cancelled():
+                    raise
+                continue
+            return self._restore(snapshot, columns)
+
+        future = asyncio.get_running_loop().create_future()
+        self.inflight[key] = future
+        try:
+            snapshot = await self._load(key, loader, columns, session)
+        except Exception:
+            future.set_exception(e)
+            future.exception()
+            raise
+        except BaseException:
+            future.cancel()
+            raise
+        else:
+            future.set_result(snapshot)
+        finally:
+            self.inflight.pop(key, None)
+        return self._restore(snapshot, columns)
+
+    def on_invalidate(self, callback: Callable[[], None]) -> None:
+        """
+        Регистрирует функцию, вызываемую при каждом изменении таблицы,
+        в том числе сделанном другим воркером.
+
+        :param callback: Синхронная функция без аргументов.
+        """
+        self.listeners.append(callback)
+
+    def invalidate_local(self, version: Optional[int] = None) -> None:
+        """
+        Сбрасывает локальный уровень кеша.
+
+        :param version: Новая версия таблицы, полученная от другого воркера.
+        """
+        if version is not None:
+            self.version = max(self.version, version)
+        self.epoch += 1
+        self.local.clear()
+        self.stats['invalidations'] += 1
+        for callback in self.listeners:
+            callback()
+
+    async def _load(self, key: str, loader: Callable[[], Awaitable[Any]], columns: Sequence[str], session: Session) -> Any:
+        epoch = self.epoch
+        use_redis = self.registry.redis is not None and not self.pending and self._shareable(columns)
+        if use_redis:
+            try:
+                data = await self.registry.redis.get(key)
+            except Exception:
+                logger.exception('Ошибка чтения кеша %s из Redis', self.table)
+                self.stats['errors'] += 1
+                data = None
+            if data is not None:
+                self.stats['redis_hits'] += 1
+                snapshot = self._decode(orjson.loads(data), columns)
+                self._set_local(key, snapshot, epoch)
+                return snapshot
+
+        self.stats['misses'] += 1
+        # Кеш заполняется из основной базы: реплика может отставать от версии таблицы,
+        # и устаревшая строка сохранилась бы под новой версией до истечения TTL.
+        use_primary = session.info.get(USE_PRIMARY)
+        session.info[USE_PRIMARY] = True
+        try:
+            result = await loader()
+        finally:
+            if not use_primary:
+                session.info.pop(USE_PRIMARY, None)
+        snapshot = self._snapshot(result, columns)
+        # Пока шла выборка, таблицу могли изменить: такой результат не сохраняем.
+        if epoch != self.epoch or self.pending:
+            return snapshot
+        self._set_local(key, snapshot, epoch)
+        if use_redis:
+            try:
+                await self.registry.redis.set(key, orjson.dumps(snapshot), ex=self.redis_ttl)
+            except Exception:
+                logger.exception('Ошибка записи кеша %s в Redis', self.table)
+                self.stats['errors'] += 1
+        return snapshot
+
+    def _shareable(self, columns: Sequence[str]) -> bool:
+        """
+        :return: Можно ли хранить выборку в Redis: в ней нет приватных колонок.
+        """
+        if not self.private:
+            return True
+        return bool(columns) and self.private.isdisjoint(columns)
+
+    def _decode(self, data: Any, columns: Sequence[str]) -> Any:
+        """
+        Восстанавливает снимок, прочитанный из JSON.
+        """
+        if data is None:
+            return None
+        if columns:
+            decoders = [self._decoders.get(column) for column in columns]
+            return [
+                tuple(value if decoder is None or value is None else decoder(value) for decoder, value in zip(decoders, row))
+                for row in data
+            ]
+        if isinstance(data, dict):
+            return self._decode_entity(data)
+        return [self._decode_entity(item) for item in data]
+
+    def _decode_entity(self, data: dict) -> dict:
+        for column, decoder in self._decoders.items():
+            value = data.get(column)
+            if value is not None:
+                data[column] = decoder(value)
+        return data
+
+    def _key(self, method: str, filter_by: dict, columns: Sequence[str]) -> str:
+        conditions = ','.join(f'{k}={v!r}' for k, v in sorted(filter_by.items()))
+        return f'{self.registry.prefix}:{self.table}:{self.version}:{method}:{",".join(columns)}:{conditions}'
+
+    def _get_local(self, key: str) -> Any:
+        item = self.local.get(key)
+        if item is None:
+            return _MISSING
+        expires_at, snapshot = item
+        if expires_at < time.monotonic():
+            del self.local[key]
+            return _MISSING
+        self.local.move_to_end(key)
+        return snapshot
+
+    def _set_local(self, key: str, snapshot: Any, epoch: int) -> None:
+        if epoch != self.epoch:
+            return
+        self.local[key] = (time.monotonic() + self.ttl, snapshot)
+        self.local.move_to_end(key)
+        while len(self.local) > self.max_size:
+            self.local.popitem(last=False)
+
+    def _snapshot(self, result: Any, columns: Sequence[str]) -> Any:
+        if result is None:
+            return None
+        if columns:
+            return [tuple(row) for row in result]
+        if isinstance(result, self.model):
+            return self._dump(result)
+        return [self._dump(instance) for instance in result]
+
+    def _restore(self, snapshot: Any, columns: Sequence[str]) -> Any:
+        if snapshot is None:
+            return None
+        if columns:
+            row = _row_type(tuple(columns))
+            return [row(*values) for values in snapshot]
+        if isinstance(snapshot, dict):
+            return self._build(snapshot)
+        return [self._build(data) for data in snapshot]
+
+    def _dump(self, instance: Base) -> dict:
+        return {column: getattr(instance, column) for column in self._columns}
+
+    def _build(self, data: dict) -> Base:
+        instance = self.model(**data)
+        make_transient_to_detached(instance)
+        return instance
+
+
+_row_types: Dict[tuple, type] = {}
+
+
+def _row_type(columns: tuple) -> type:
+    row = _row_types.get(columns)
+    if row is None:
+        row = _row_types[columns] = namedtuple('Row', columns)
+    return row
+
+
+class CacheRegistry:
+    """
+    Реестр кешей DAO и их инвалидация.
+
+    Записи в кешируемые таблицы отслеживаются событиями сессии. После фиксации
+    транзакции локальный кеш сбрасывается сразу, затем версия таблицы
+    увеличивается в Redis и публикуется в канал, по которому остальные воркеры
+    сбрасывают свои локальные кеши.
+    """
+
+    def __init__(self, enabled: bool, prefix: str, ttl: int, max_size: int, use_redis: bool, redis_ttl: int):
+        self.enabled = enabled
+        self.prefix = prefix
+        self.ttl = ttl
+        self.max_size = max_size
+        self.use_redis = use_redis
+        self.redis_ttl = redis_ttl
+        self.channel = f'{prefix}:invalidate'
+        self.caches: Dict[str, DAOCache] = {}
+        self.running = False
+        self.redis = None
+        self.pubsub = None
+        self._task: Optional[asyncio.Task] = None
+        self._publishing: set[asyncio.Task] = set()
+
+    def register(
+        self,
+        model: type[Base],
+        ttl: Optional[int] = None,
+        max_size: Optional[int] = None,
+        private: Sequence[str] = (),
+    ) -> Optional[DAOCache]:
+        """
+        Создает кеш для модели.
+
+        :param model: Модель, выборки которой кешируются.
+        :param ttl: Время жизни записи в локальном кеше, секунд.
+        :param max_size: Максимальное число записей в локальном кеше.
+        :param private: Колонки, которые нельзя выносить в общий Redis (хеши паролей, секреты).
+        :return: Кеш модели или None, если кеширование выключено.
+        """
+        if not self.enabled:
+            return None
+        cache = DAOCache(self, model, ttl or self.ttl, max_size or self.max_size, self.redis_ttl, private)
+        self.caches[cache.table] = cache
+        return cache
+
+    def version_key(self, table: str) -> str:
+        return f'{self.prefix}:version:{table}'
+
+    async def start(self) -> None:
+        if not self.caches:
+            return
+        if self.use_redis:
+            self.redis = Redis()
+            tables = list(self.caches)
+            versions = await self.redis.mget([self.version_key(table) for table in tables])
+            for table, version in zip(tables, versions):
+                self.caches[table].version = int(version or 0)
+            self.pubsub = self.redis.pubsub(ignore_subscribe_messages=True)
+            await self.pubsub.subscribe(self.channel)
+            self._task = asyncio.create_task(self._listen())
+        self.running = True
+
+    async def stop(self) -> None:
+        self.running = False
+        if self._publishing:
+            await asyncio.gather(*self._publishing, return_exceptions=True)
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        if self.pubsub is not None:
+            await self.pubsub.aclose()
+            self.pubsub = None
+        for cache in self.caches.values():
+            cache.invalidate_local()
+        self.redis = None
+
+    def metrics(self) -> Dict[str, dict]:
+        return {table: dict(cache.stats, size=len(cache.local)) for table, cache in self.caches.items()}
+
+    def mark_dirty(self, session: Session, table: str) -> None:
+        if table in self.caches:
+            session.info.setdefault(DIRTY_TABLES, set()).add(table)
+
+    def committed(self, tables: set[str]) -> None:
+        """
+        Сбрасывает кеши таблиц, измененных зафиксированной транзакцией.
+
+        :param tables: Имена измененных таблиц.
+        """
+        for table in tables:
+            cache = self.caches[table]
+            cache.invalidate_local()
+            if not self.use_redis:
+                continue
+            try:
+                loop = asyncio.get_running_loop()
+            except RuntimeError:
+                continue
+            # До публикации новой версии Redis-уровень этой таблицы не читается.
+            cache.pending += 1
+            task = loop.create_task(self._publish(cache))
+            self._publishing.add(task)
+            task.add_done_callback(self._publishing.discard)
+
+    async def _publish(self, cache: DAOCache) -> None:
+        try:
+            redis = self.redis or Redis()
+            version = await redis.incr(self.version_key(cache.table))
+            cache.invalidate_local(version)
+            await redis.publish(self.channel, f'{cache.table}:{version}')
+        except Exception:
+            logger.exception('Ошибка публикации инвалидации кеша %s', cache.table)
+            cache.stats['errors'] += 1
+        finally:
+            cache.pending -= 1
+
+    async def _listen(self) -> None:
+        while True:
+            try:
+                message = await self.pubsub.get_message(ignore_subscribe_messages=True, timeout=1.0)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.exception('Ошибка чтения канала инвалидации кеша')
+                await asyncio.sleep(1)
+                continue
+            if message is None or message['type'] != 'message':
+                continue
+            table, _, version = message['data'].decode().rpartition(':')
+            cache = self.caches.get(table)
+            if cache is not None:
+                cache.invalidate_local(int(version))
+
+
+caches = CacheRegistry(
+    enabled=settings.CACHE.ENABLED,
+    prefix=settings.CACHE.PREFIX,
+    ttl=settings.CACHE.TTL,
+    max_size=settings.CACHE.MAX_SIZE,
+    use_redis=settings.CACHE.REDIS,
+    redis_ttl=settings.CACHE.REDIS_TTL,
+)
+
+
+@registry.collector
+async def _collect_caches() -> list:
+    return stats_gauges('dao_cache', 'Кеш DAO', caches.metrics(), 'table')
+
+
+@event.listens_for(Session, 'after_flush')
+def _mark_flushed(session: Session, flush_context) -> None:
+    for instance in (*session.new, *session.dirty, *session.deleted):
+        caches.mark_dirty(session, instance.__tablename__)
+
+
+@event.listens_for(Session, 'do_orm_execute')
+def _mark_executed(orm_execute_state) -> None:
+    if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+        caches.mark_dirty(orm_execute_state.session, orm_execute_state.statement.table.name)
+
+
+@event.listens_for(Session, 'after_commit')
+def _invalidate_committed(session: Session) -> None:
+    tables = session.info.pop(DIRTY_TABLES, None)
+    if tables:
+        caches.committed(tables)
+
+
+@event.listens_for(Session, 'after_soft_rollback')
+def _forget_rolled_back(session: Session, previous_transaction) -> None:
+    if not session.in_transaction():
+        session.info.pop(DIRTY_TABLES, None)
@@ -0,0 +1,21 @@
+from typing import AsyncIterator
+
+from fastapi.requests import HTTPConnection
+
+from .sessions import session_scope
+
+
+async def request_session(connection: HTTPConnection) -> AsyncIterator[None]:
+    """
+    Открывает одну сессию базы данных на HTTP-запрос.
+
+    Сессия подключается к базе лениво, при первом запросе DAO, и фиксируется
+    до отправки ответа. Websocket-соединения живут долго и сессию не получают.
+
+    :param connection: Текущее соединение.
+    """
+    if connection.scope['type'] != 'http':
+        yield
+        return
+    async with session_scope():
+        yield
@@ -0,0 +1,58 @@
+from uuid import uuid4
+
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
+
+from core.metrics import InstrumentedQueuePool, instrument_engine
+from core.settings import DBSettings
+
+
+def engine_options(db: DBSettings) -> dict:
+    """
+    Собирает параметры движка из настроек базы данных.
+
+    asyncpg кеширует подготовленные выражения на каждом соединении
+    (`STATEMENT_CACHE_SIZE`), поэтому повторяющиеся запросы DAO не разбираются
+    и не планируются сервером заново. За PgBouncer в режиме transaction
+    соединение с сервером меняется от транзакции к транзакции, и подготовленные
+    выражения там не переживают запроса: кеш отключается, а имена выражений
+    делаются уникальными, чтобы не пересекаться на общем серверном соединении.
+
+    :param db: Настройки базы данных.
+    :return: Именованные аргументы для `create_async_engine`.
+    """
+    connect_args = {'prepared_statement_cache_size': db.STATEMENT_CACHE_SIZE}
+    if db.PGBOUNCER:
+        connect_args = {
+            'prepared_statement_cache_size': 0,
+            'statement_cache_size': 0,
+            'prepared_statement_name_func': lambda: f'__asyncpg_{uuid4()}__',
+        }
+    return {
+        'echo': db.ECHO,
+        'poolclass': InstrumentedQueuePool,
+        'pool_size': db.POOL_SIZE,
+        'max_overflow': db.MAX_OVERFLOW,
+        'pool_timeout': db.POOL_TIMEOUT,
+        'pool_recycle': db.POOL_RECYCLE,
+        'pool_pre_ping': db.POOL_PRE_PING,
+        'connect_args': connect_args,
+    }
+
+
+def create_engine(db: DBSettings, url: str, name: str) -> AsyncEngine:
+    """
+    Создает движок с пулом по настройкам и подключает к нему метрики.
+
+    :param db: Настройки базы данных.
+    :param url: URL базы данных (основной или реплики).
+    :param name: Имя движка в метриках.
+    :return: Асинхронный движок.
+    """
+    engine = create_async_engine(url, pool_logging_name=name, **engine_options(db))
+    instrument_engine(
+        engine,
+        name=name,
+        slow_query_ms=db.SLOW_QUERY_MS,
+        slow_query_sample_rate=db.SLOW_QUERY_SAMPLE_RATE,
+    )
+    return engine
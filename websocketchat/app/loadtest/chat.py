@@ -0,0 +1,245 @@
+"""
+Нагрузочный тест чата: N пользователей входят через /auth/login/, открывают
+/chat/ws/{user_id} и отправляют сообщения через POST /chat/messages с заданной
+частотой. Пользователь i пишет пользователю i+1, задержка доставки измеряется
+от отправки запроса до получения сообщения получателем по websocket.
+
+Запуск из каталога app. Против запущенного приложения:
+
+    python -m loadtest.chat --url http://localhost:8000 --users 200 --rate 0.5 --seed
+
+Или приложение в том же процессе, с брокером и присутствием в памяти
+(CHAT.BROKER=local); PostgreSQL и Redis по-прежнему нужны для пользователей
+и токенов:
+
+    python -m loadtest.chat --in-process --users 200 --seed
+
+`--seed` создает подтвержденных пользователей `<prefix><i>@example.com`
+с паролем `--password`. Память на соединение считается по RSS процесса
+приложения (`--server-pid`, в режиме --in-process - по своему процессу,
+вместе с клиентами).
+"""
+import argparse
+import asyncio
+import base64
+import json
+import os
+import random
+import time
+from typing import Optional
+
+import aiohttp
+
+from .common import LoopLagSampler, percentile
+
+
+def rss_bytes(pid: Optional[int] = None) -> Optional[int]:
+    """
+    :param pid: ID процесса, по умолчанию текущий.
+    :return: Resident set size процесса в байтах или None, если его не узнать.
+    """
+    try:
+        with open(f'/proc/{pid or "self"}/status') as status:
+            for line in status:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        return None
+    return None
+
+
+def token_user_id(token: str) -> int:
+    payload = token.split('.')[1]
+    payload += '=' * (-len(payload) % 4)
+    return int(json.loads(base64.urlsafe_b64decode(payload))['sub'])
+
+
+class Stats:
+    def __init__(self):
+        self.sent = 0
+        self.delivered = 0
+        self.errors = 0
+        self.disconnects = 0
+        self.latencies: list[float] = []
+        self.pending: dict[str, float] = {}
+
+
+class SimulatedUser:
+    def __init__(self, index: int, email: str, password: str):
+        self.index = index
+        self.email = email
+        self.password = password
+        self.user_id: Optional[int] = None
+        self.token: Optional[str] = None
+        self.ws: Optional[aiohttp.ClientWebSocketResponse] = None
+
+    @property
+    def headers(self) -> dict:
+        return {'Cookie': f'Access_Token={self.token}'}
+
+    async def login(self, http: aiohttp.ClientSession, url: str) -> None:
+        async with http.post(f'{url}/auth/login/', json={'email': self.email, 'password': self.password}) as response:
+            response.raise_for_status()
+            self.token = (await response.json())['Access_Token']
+        self.user_id = token_user_id(self.token)
+
+    async def connect(self, http: aiohttp.ClientSession, url: str) -> None:
+        ws_url = url.replace('http', 'ws', 1)
+        self.ws = await http.ws_connect(f'{ws_url}/chat/ws/{self.user_id}', headers=self.headers, heartbeat=None)
+
+    async def receive(self, stats: Stats) -> None:
+        async for frame in self.ws:
+            if frame.type != aiohttp.WSMsgType.TEXT:
+                continue
+            message = json.loads(frame.data)
+            if message.get('type') == 'ping':
+                await self.ws.send_str('{"type": "pong"}')
+                continue
+            if message.get('recipient_id') != self.user_id or message.get('sender_id') == self.user_id:
+                continue
+            sent_at = stats.pending.pop(message.get('content'), None)
+            if sent_at is not None:
+                stats.delivered += 1
+                stats.latencies.append(time.perf_counter() - sent_at)
+        stats.disconnects += 1
+
+    async def send(self, http: aiohttp.ClientSession, url: str, recipient_id: int, rate: float, deadline: float, stats: Stats) -> None:
+        # Разносим первые отправки, чтобы пользователи не стреляли одновременно.
+        await asyncio.sleep(random.uniform(0, 1 / rate))
+        seq = 0
+        while time.perf_counter() < deadline:
+            seq += 1
+            content = f'loadtest:{self.index}:{seq}'
+            stats.pending[content] = time.perf_counter()
+            try:
+                async with http.post(
+                    f'{url}/chat/messages',
+                    json={'recipient_id': recipient_id, 'content': content},
+                    headers=self.headers,
+                ) as response:
+                    response.raise_for_status()
+                stats.sent += 1
+            except aiohttp.ClientError:
+                stats.pending.pop(content, None)
+                stats.errors += 1
+            await asyncio.sleep(random.expovariate(rate))
+
+
+async def seed_users(prefix: str, count: int, password: str) -> None:
+    from users.dao import UsersDAO
+    from users.utils import pwd_context
+
+    hashed = pwd_context.hash(password)
+    rows = [
+        {
+            'username': f'{prefix}{i}',
+            'email': f'{prefix}{i}@example.com',
+            'password': hashed,
+            'is_verified': True,
+        }
+        for i in range(count)
+    ]
+    await UsersDAO.upsert_many(rows, index_elements=['email'], update_columns=['password', 'is_verified'])
+
+
+async def start_server(port: int):
+    os.environ.setdefault('BROKER', 'local')
+    import uvicorn
+    from main import app
+
+    server = uvicorn.Server(uvicorn.Config(app, host='127.0.0.1', port=port, log_level='warning', ws_ping_interval=None))
+    task = asyncio.create_task(server.serve())
+    while not server.started:
+        if task.done():
+            task.result()
+        await asyncio.sleep(0.05)
+    return server, task
+
+
+async def run(args: argparse.Namespace) -> None:
+    url = args.url.rstrip('/')
+    server = server_task = None
+    server_pid = args.server_pid
+    if args.in_process:
+        server, server_task = await start_server(args.port)
+        url = f'http://127.0.0.1:{args.port}'
+    if args.seed:
+        await seed_users(args.prefix, args.users, args.password)
+
+    users = [SimulatedUser(i, f'{args.prefix}{i}@example.com', args.password) for i in range(args.users)]
+    stats = Stats()
+    connector = aiohttp.TCPConnector(limit=args.connections)
+    async with aiohttp.ClientSession(connector=connector, cookie_jar=aiohttp.DummyCookieJar()) as http:
+        login_limit = asyncio.Semaphore(args.login_concurrency)
+
+        async def login(user: SimulatedUser) -> None:
+            async with login_limit:
+                await user.login(http, url)
+
+        started_at = time.perf_counter()
+        await asyncio.gather(*(login(user) for user in users))
+        print(f'logged in {len(users)} users in {time.perf_counter() - started_at:.1f}s')
+
+        rss_before = rss_bytes(server_pid)
+        await asyncio.gather(*(user.connect(http, url) for user in users))
+        await asyncio.sleep(1)
+        rss_after = rss_bytes(server_pid)
+
+        receivers = [asyncio.create_task(user.receive(stats)) for user in users]
+        sampler = LoopLagSampler()
+        sampler.start()
+        started_at = time.perf_counter()
+        deadline = started_at + args.duration
+        await asyncio.gather(*(
+            user.send(http, url, users[(i + 1) % len(users)].user_id, args.rate, deadline, stats)
+            for i, user in enumerate(users)
+        ))
+        # Ждем доставки сообщений, отправленных в конце.
+        await asyncio.sleep(args.drain)
+        elapsed = time.perf_counter() - started_at
+        await sampler.stop()
+
+        for user in users:
+            await user.ws.close()
+        await asyncio.gather(*receivers, return_exceptions=True)
+
+    lag = sampler.summary()
+    latencies = stats.latencies
+    print(f'users={len(users)} rate={args.rate}/s per user duration={args.duration}s')
+    print(f'sent={stats.sent} delivered={stats.delivered} lost={len(stats.pending)} errors={stats.errors}')
+    print(f'throughput={stats.delivered / elapsed:.1f} msg/s')
+    print(
+        f'latency p50={percentile(latencies, 50) * 1000:.1f}ms '
+        f'p95={percentile(latencies, 95) * 1000:.1f}ms p99={percentile(latencies, 99) * 1000:.1f}ms '
+        f'max={max(latencies, default=0) * 1000:.1f}ms'
+    )
+    scope = 'app+harness' if args.in_process else 'harness'
+    print(f'loop lag ({scope}) p50={lag["p50_ms"]:.1f}ms p99={lag["p99_ms"]:.1f}ms max={lag["max_ms"]:.1f}ms')
+    if rss_before is not None and rss_after is not None:
+        print(f'memory per connection={(rss_after - rss_before) / len(users) / 1024:.1f} KiB (RSS {scope if args.in_process else f"pid {server_pid}"})')
+
+    if server is not None:
+        server.should_exit = True
+        await server_task
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--url', default='http://localhost:8000', help='Адрес приложения')
+    parser.add_argument('--users', type=int, default=100, help='Число пользователей')
+    parser.add_argument('--rate', type=float, default=1.0, help='Сообщений в секунду от одного пользователя')
+    parser.add_argument('--duration', type=float, default=30.0, help='Длительность отправки, секунд')
+    parser.add_argument('--drain', type=float, default=2.0, help='Ожидание доставки после отправки, секунд')
+    parser.add_argument('--prefix', default='loadtest', help='Префикс имен и email пользователей')
+    parser.add_argument('--password', default='loadtest-password')
+    parser.add_argument('--seed', action='store_true', help='Создать пользователей в базе данных')
+    parser.add_argument('--login-concurrency', type=int, default=20)
+    parser.add_argument('--connections', type=int, default=100, help='Лимит HTTP-соединений клиента')
+    parser.add_argument('--server-pid', type=int, default=None, help='PID приложения для замера памяти')
+    parser.add_argument('--in-process', action='store_true', help='Запустить приложение в этом процессе')
+    parser.add_argument('--port', type=int, default=8765, help='Порт приложения в режиме --in-process')
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == '__main__':
+    main()
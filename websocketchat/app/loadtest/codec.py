@@ -0,0 +1,76 @@
+"""
+Стоимость кодирования сообщений чата при рассылке.
+
+Запуск из каталога app:
+
+    python -m loadtest.codec --recipients 50 --messages 20000
+
+Сравнивает кодирование одного сообщения для `--recipients` соединений:
+
+    send_json   json.dumps для каждого соединения (как WebSocket.send_json)
+    frame-json  Frame: orjson один раз на рассылку
+    frame-msgpack  Frame: msgpack один раз на рассылку (если установлен msgpack)
+
+и печатает процессорное время на рассылку и размер кадра.
+"""
+import argparse
+import json
+import time
+
+from chat.codec import CODECS, Frame, MsgpackCodec, json_codec
+
+
+def sample_message(index: int) -> dict:
+    return {
+        'sender_id': 1000 + index % 500,
+        'recipient_id': 2000 + index % 700,
+        'content': f'Привет! Сообщение номер {index}, проверка кодирования 👋',
+    }
+
+
+def bench_send_json(messages: list[dict], recipients: int) -> tuple[float, int]:
+    started_at = time.process_time()
+    size = 0
+    for message in messages:
+        for _ in range(recipients):
+            data = json.dumps(message, separators=(',', ':'), ensure_ascii=False)
+        size += len(data.encode())
+    return time.process_time() - started_at, size
+
+
+def bench_frame(messages: list[dict], recipients: int, codec) -> tuple[float, int]:
+    started_at = time.process_time()
+    size = 0
+    for message in messages:
+        frame = Frame(message)
+        for _ in range(recipients):
+            data = frame.encode(codec)
+        size += len(data.encode()) if isinstance(data, str) else len(data)
+    return time.process_time() - started_at, size
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--recipients', type=int, default=50, help='Соединений на одно сообщение')
+    parser.add_argument('--messages', type=int, default=20000)
+    args = parser.parse_args()
+
+    messages = [sample_message(i) for i in range(args.messages)]
+    results = {'send_json': bench_send_json(messages, args.recipients)}
+    results['frame-json'] = bench_frame(messages, args.recipients, json_codec)
+    msgpack_codec = CODECS.get(MsgpackCodec.subprotocol)
+    if msgpack_codec is not None:
+        results['frame-msgpack'] = bench_frame(messages, args.recipients, msgpack_codec)
+    else:
+        print('msgpack не установлен, frame-msgpack пропущен')
+
+    baseline = results['send_json'][0]
+    for name, (elapsed, size) in results.items():
+        print(
+            f'{name:<14} {elapsed / args.messages * 1e6:8.1f} us/fan-out  '
+            f'{size / args.messages:6.1f} bytes/message  x{baseline / elapsed:.1f}'
+        )
+
+
+if __name__ == '__main__':
+    main()
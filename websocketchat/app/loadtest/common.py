@@ -0,0 +1,55 @@
+import asyncio
+import time
+from typing import Optional, Sequence
+
+
+def percentile(values: Sequence[float], q: float) -> float:
+    """
+    Возвращает перцентиль выборки (ближайший ранг).
+
+    :param values: Значения.
+    :param q: Перцентиль от 0 до 100.
+    :return: Значение перцентиля или 0.0 для пустой выборки.
+    """
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(q / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+class LoopLagSampler:
+    """
+    Измеряет задержку цикла событий: задача просыпается каждые `interval`
+    секунд и записывает, насколько позже запланированного это произошло.
+    Если цикл блокирует синхронный код, задержка растет.
+    """
+
+    def __init__(self, interval: float = 0.01):
+        self.interval = interval
+        self.samples: list[float] = []
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        self.samples = []
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> list[float]:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        return self.samples
+
+    async def _run(self) -> None:
+        while True:
+            started_at = time.perf_counter()
+            await asyncio.sleep(self.interval)
+            self.samples.append(max(0.0, time.perf_counter() - started_at - self.interval))
+
+    def summary(self) -> dict:
+        return {
+            'p50_ms': percentile(self.samples, 50) * 1000,
+            'p99_ms': percentile(self.samples, 99) * 1000,
+            'max_ms': max(self.samples, default=0.0) * 1000,
+        }
@@ -0,0 +1,98 @@
+"""
+Сравнение настроек пула соединений и кеша подготовленных выражений.
+
+Запуск из каталога app (нужна база с данными приложения):
+
+    python -m loadtest.engine --concurrency 50 --duration 10
+
+Для каждой конфигурации `--concurrency` задач в цикле открывают сессию,
+выполняют типичные запросы DAO (пользователь по id и последние сообщения
+переписки) и закрывают ее, как это делает декоратор `connection`.
+Конфигурации:
+
+    defaults   create_async_engine(url) без параметров (пул 5 + 10)
+    no-cache   настройки из DBSettings без кеша подготовленных выражений
+               (так движок работает с PGBOUNCER=true)
+    tuned      настройки из DBSettings
+"""
+import argparse
+import asyncio
+import random
+import time
+
+from sqlalchemy import or_, select
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from core.settings import settings
+from db.engine import engine_options
+from chat.models import Message
+from users.models import User
+from .common import percentile
+
+
+async def run_workload(engine, user_ids: list[int], concurrency: int, duration: float) -> dict:
+    session_maker = async_sessionmaker(engine, expire_on_commit=False)
+    latencies: list[float] = []
+    deadline = time.perf_counter() + duration
+
+    async def worker() -> None:
+        while time.perf_counter() < deadline:
+            user_id, peer_id = random.sample(user_ids, 2)
+            started_at = time.perf_counter()
+            async with session_maker() as session:
+                await session.scalar(select(User).where(User.id == user_id))
+                await session.scalars(
+                    select(Message)
+                    .where(or_(
+                        (Message.sender_id == user_id) & (Message.recipient_id == peer_id),
+                        (Message.sender_id == peer_id) & (Message.recipient_id == user_id),
+                    ))
+                    .order_by(Message.id.desc())
+                    .limit(50)
+                )
+            latencies.append(time.perf_counter() - started_at)
+
+    started_at = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started_at
+    return {
+        'qps': len(latencies) * 2 / elapsed,
+        'p50_ms': percentile(latencies, 50) * 1000,
+        'p99_ms': percentile(latencies, 99) * 1000,
+    }
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--concurrency', type=int, default=50)
+    parser.add_argument('--duration', type=float, default=10.0, help='Длительность прогона одной конфигурации, секунд')
+    parser.add_argument('--warmup', type=float, default=2.0, help='Прогрев перед замером, секунд')
+    args = parser.parse_args()
+
+    db = settings.DATABASE
+    configs = {
+        'defaults': lambda: create_async_engine(db.URL),
+        'no-cache': lambda: create_async_engine(db.URL, **engine_options(db.model_copy(update={'STATEMENT_CACHE_SIZE': 0}))),
+        'tuned': lambda: create_async_engine(db.URL, **engine_options(db)),
+    }
+
+    for name, factory in configs.items():
+        engine = factory()
+        try:
+            async with engine.connect() as connection:
+                user_ids = list((await connection.scalars(select(User.id).limit(1000))).all())
+            if len(user_ids) < 2:
+                print('Нужно хотя бы два пользователя в базе данных')
+                return
+            await run_workload(engine, user_ids, args.concurrency, args.warmup)
+            result = await run_workload(engine, user_ids, args.concurrency, args.duration)
+        finally:
+            await engine.dispose()
+        print(
+            f'{name:<9} {result["qps"]:8.0f} queries/s  '
+            f'session p50={result["p50_ms"]:.1f}ms p99={result["p99_ms"]:.1f}ms'
+        )
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -0,0 +1,65 @@
+"""
+Нагрузочный тест хеширования паролей: задержка цикла событий во время
+одновременных входов.
+
+Запуск из каталога app:
+
+    python -m loadtest.passwords --logins 100
+
+Сначала проверки выполняются прямо в цикле событий (как раньше делали
+`register` и `authenticate_user`), затем через `password_hasher`. Во втором
+случае задержка цикла должна оставаться на уровне интервала опроса, сколько бы
+входов ни выполнялось одновременно.
+"""
+import argparse
+import asyncio
+import time
+
+from core.settings import settings
+from users.passwords import PasswordHasher
+from users.utils import pwd_context
+from .common import LoopLagSampler
+
+
+PASSWORD = 'correct horse battery staple'
+
+
+async def blocking_login(hashed: str) -> bool:
+    return pwd_context.verify(PASSWORD, hashed)
+
+
+async def run(name: str, logins: int, login) -> None:
+    sampler = LoopLagSampler()
+    sampler.start()
+    # Даем сэмплеру набрать фон до начала нагрузки.
+    await asyncio.sleep(0.1)
+    started_at = time.perf_counter()
+    results = await asyncio.gather(*(login() for _ in range(logins)))
+    elapsed = time.perf_counter() - started_at
+    await sampler.stop()
+
+    lag = sampler.summary()
+    print(
+        f'{name:>8}: {logins} logins in {elapsed:.2f}s, ok={sum(results)}, '
+        f'loop lag p50={lag["p50_ms"]:.1f}ms p99={lag["p99_ms"]:.1f}ms max={lag["max_ms"]:.1f}ms'
+    )
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--logins', type=int, default=100, help='Число одновременных входов')
+    parser.add_argument('--workers', type=int, default=None, help='Размер пула хеширования')
+    parser.add_argument('--skip-blocking', action='store_true', help='Не запускать синхронный вариант')
+    args = parser.parse_args()
+
+    hashed = pwd_context.hash(PASSWORD)
+    hasher = PasswordHasher(workers=args.workers or settings.AUTH.HASH_WORKERS, queue_size=args.logins)
+    if not args.skip_blocking:
+        await run('blocking', args.logins, lambda: blocking_login(hashed))
+    await run('executor', args.logins, lambda: hasher.verify(PASSWORD, hashed))
+    print('hasher:', hasher.metrics())
+    hasher.shutdown()
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
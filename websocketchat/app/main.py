@@ -1,15 +1,48 @@
-from fastapi import FastAPI, Request
-from fastapi.responses import HTMLResponse
+from contextlib import asynccontextmanager
+
+from fastapi import FastAPI, Request, Depends
+from fastapi.responses import HTMLResponse, ORJSONResponse, PlainTextResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi.middleware.cors import CORSMiddleware
 
 from core.jinja2 import templates
+from core.metrics import MetricsMiddleware, loop_lag_monitor, registry
+from core.redis import Redis
 from core.settings import settings
+from dao.cache import caches
+from db.dependencies import request_session
 from users.router import router as router_users
+from users.passwords import password_hasher
+from users.tokens import token_verifier
+from users.directory import user_directory
 from chat.router import router as router_chat
+from chat.broker import broker
+from chat.presence import presence
+from chat.writer import message_writer
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await loop_lag_monitor.start()
+    await caches.start()
+    await token_verifier.start()
+    await user_directory.start()
+    await broker.start()
+    await presence.start()
+    await message_writer.start()
+    yield
+    await message_writer.stop()
+    await presence.stop()
+    await broker.stop()
+    await user_directory.stop()
+    await token_verifier.stop()
+    await caches.stop()
+    await Redis.close()
+    password_hasher.shutdown()
+    await loop_lag_monitor.stop()
 
 
-app = FastAPI()
+app = FastAPI(lifespan=lifespan, dependencies=[Depends(request_session)], default_response_class=ORJSONResponse)
 app.mount('/static', StaticFiles(directory=settings.STATIC_DIR), name='static')
 
 
@@ -20,6 +53,7 @@ app.add_middleware(
     allow_methods=['*'],  
     allow_headers=['*'],  
 )
+app.add_middleware(MetricsMiddleware)
 
 
 @app.get('/', response_class=HTMLResponse, summary='Страница авторизации и регистрации')
@@ -27,5 +61,10 @@ async def root(request: Request):
     return templates.TemplateResponse('auth.html', {'request': request})
 
 
+@app.get('/metrics', response_class=PlainTextResponse, include_in_schema=False)
+async def metrics():
+    return PlainTextResponse(await registry.render(), media_type='text/plain; version=0.0.4')
+
+
 app.include_router(router_users)
 app.include_router(router_chat)
\ No newline at end of file
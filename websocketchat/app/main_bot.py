@@ -1,7 +1,11 @@
 import asyncio
 import os
 
+from typing import Optional
+
 from aiogram import Bot, Dispatcher, F
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import TelegramAPIServer
 from aiogram.types import Message
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import StatesGroup, State
@@ -11,11 +15,15 @@ from pydantic_settings import BaseSettings, SettingsConfigDict
 from core.settings import ROOT_DIR
 from users.dao import UsersDAO
 from users.models import User
-from users.utils import verify_password
+from users.passwords import password_hasher
 from bot.dao import TelegramUsersDAO
 
 class BotSettings(BaseSettings):
     API_TOKEN: str
+    API_URL: Optional[str] = None
+    NOTIFY_WINDOW_MS: int = 3000
+    NOTIFY_GLOBAL_RATE: float = 25.0
+    NOTIFY_CHAT_RATE: float = 1.0
 
     model_config = SettingsConfigDict(
         env_file=os.path.join(ROOT_DIR, '.env', '.env.bot'),
@@ -24,8 +32,18 @@ class BotSettings(BaseSettings):
 _bot_settings = BotSettings()
 
 API_TOKEN = _bot_settings.API_TOKEN
-
-bot = Bot(token=API_TOKEN)
+API_URL = _bot_settings.API_URL
+NOTIFY_WINDOW_MS = _bot_settings.NOTIFY_WINDOW_MS
+NOTIFY_GLOBAL_RATE = _bot_settings.NOTIFY_GLOBAL_RATE
+NOTIFY_CHAT_RATE = _bot_settings.NOTIFY_CHAT_RATE
+
+def create_session() -> Optional[AiohttpSession]:
+    """Сессия для Bot API: по умолчанию api.telegram.org, для тестов - адрес из API_URL"""
+    if not API_URL:
+        return None
+    return AiohttpSession(api=TelegramAPIServer.from_base(API_URL))
+
+bot = Bot(token=API_TOKEN, session=create_session())
 dp = Dispatcher()
 
 class Form(StatesGroup):
@@ -69,7 +87,7 @@ async def process_password(message: Message, state: FSMContext):
         await state.clear()
         return
 
-    if not verify_password(password, user.password):
+    if not await password_hasher.verify(password, user.password):
         await message.reply('Неверный пароль.')
         await state.clear() 
         return
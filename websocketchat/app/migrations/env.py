@@ -14,7 +14,7 @@ sys.path.insert(0, dirname(dirname(abspath(__file__))))
 
 from db.database import DATABASE_URL, Base
 from users.models import User
-from chat.models import Message
+from chat.models import Message, Conversation
 from bot.models import TelegramUser
 
 
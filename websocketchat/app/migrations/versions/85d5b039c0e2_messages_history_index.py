@@ -0,0 +1,26 @@
+"""Messages history index
+
+Revision ID: 85d5b039c0e2
+Revises: b68e56974bc4
+Create Date: 2026-10-19 10:27:40.902113
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '85d5b039c0e2'
+down_revision: Union[str, None] = 'b68e56974bc4'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_index('ix_messages_sender_recipient_id', 'messages', ['sender_id', 'recipient_id', 'id'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_messages_sender_recipient_id', table_name='messages')
@@ -0,0 +1,122 @@
+"""Messages partitioning
+
+Revision ID: a928a03aabd4
+Revises: bfef1a0c1cb0
+Create Date: 2026-10-19 16:40:52.118934
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a928a03aabd4'
+down_revision: Union[str, None] = 'bfef1a0c1cb0'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+SEARCH_VECTOR_SQL = "to_tsvector('russian'::regconfig, content) || to_tsvector('english'::regconfig, content)"
+COLUMNS = 'id, sender_id, recipient_id, conversation_id, content, created_at, updated_at'
+MONTHS_AHEAD = 3
+
+
+def upgrade() -> None:
+    op.drop_index('ix_messages_conversation_id_search_vector', table_name='messages', postgresql_using='gin')
+    op.drop_index('ix_messages_conversation_id_id', table_name='messages')
+    op.rename_table('messages', 'messages_unpartitioned')
+    op.execute('ALTER TABLE messages_unpartitioned RENAME CONSTRAINT messages_pkey TO messages_unpartitioned_pkey')
+
+    op.create_table('messages',
+    sa.Column('id', sa.Integer(), server_default=sa.text("nextval('messages_id_seq'::regclass)"), nullable=False),
+    sa.Column('sender_id', sa.Integer(), nullable=False),
+    sa.Column('recipient_id', sa.Integer(), nullable=False),
+    sa.Column('conversation_id', sa.BigInteger(), nullable=False),
+    sa.Column('content', sa.Text(), nullable=False),
+    sa.Column('search_vector', postgresql.TSVECTOR(), sa.Computed(SEARCH_VECTOR_SQL, persisted=True), nullable=True),
+    sa.Column('created_at', sa.DateTime(), server_default=sa.text('now()'), nullable=False),
+    sa.Column('updated_at', sa.DateTime(), server_default=sa.text('now()'), nullable=False),
+    sa.ForeignKeyConstraint(['recipient_id'], ['users.id'], ),
+    sa.ForeignKeyConstraint(['sender_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('id', 'created_at'),
+    postgresql_partition_by='RANGE (created_at)',
+    )
+    op.create_index('ix_messages_conversation_id_id', 'messages', ['conversation_id', sa.text('id DESC')], unique=False)
+    op.create_index(
+        'ix_messages_conversation_id_search_vector',
+        'messages',
+        ['conversation_id', 'search_vector'],
+        unique=False,
+        postgresql_using='gin',
+    )
+
+    # Секции с месяца самого старого сообщения и на MONTHS_AHEAD месяцев вперед;
+    # дальше их создает задача maintain_message_partitions_task.
+    op.execute(f"""
+        DO $$
+        DECLARE
+            month date := date_trunc('month', coalesce((SELECT min(created_at) FROM messages_unpartitioned), now()));
+        BEGIN
+            WHILE month <= date_trunc('month', now() + interval '{MONTHS_AHEAD} months') LOOP
+                EXECUTE format(
+                    'CREATE TABLE %I PARTITION OF messages FOR VALUES FROM (%L) TO (%L)',
+                    'messages_y' || to_char(month, 'YYYY') || 'm' || to_char(month, 'MM'),
+                    month,
+                    month + interval '1 month'
+                );
+                month := month + interval '1 month';
+            END LOOP;
+        END $$
+    """)
+    op.execute('CREATE TABLE messages_default PARTITION OF messages DEFAULT')
+
+    op.execute(f'INSERT INTO messages ({COLUMNS}) SELECT {COLUMNS} FROM messages_unpartitioned')
+    op.execute('ALTER SEQUENCE messages_id_seq OWNED BY messages.id')
+    op.drop_table('messages_unpartitioned')
+
+    op.create_table('messages_archive',
+    sa.Column('id', sa.Integer(), autoincrement=False, nullable=False),
+    sa.Column('sender_id', sa.Integer(), nullable=False),
+    sa.Column('recipient_id', sa.Integer(), nullable=False),
+    sa.Column('conversation_id', sa.BigInteger(), nullable=False),
+    sa.Column('content', sa.Text(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), server_default=sa.text('now()'), nullable=False),
+    sa.Column('updated_at', sa.DateTime(), server_default=sa.text('now()'), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.execute('ALTER TABLE messages_archive ALTER COLUMN content SET COMPRESSION lz4')
+    op.create_index('ix_messages_archive_conversation_id_id', 'messages_archive', ['conversation_id', sa.text('id DESC')], unique=False)
+
+
+def downgrade() -> None:
+    op.rename_table('messages', 'messages_partitioned')
+    op.create_table('messages',
+    sa.Column('id', sa.Integer(), server_default=sa.text("nextval('messages_id_seq'::regclass)"), nullable=False),
+    sa.Column('sender_id', sa.Integer(), nullable=False),
+    sa.Column('recipient_id', sa.Integer(), nullable=False),
+    sa.Column('conversation_id', sa.BigInteger(), nullable=False),
+    sa.Column('content', sa.Text(), nullable=False),
+    sa.Column('search_vector', postgresql.TSVECTOR(), sa.Computed(SEARCH_VECTOR_SQL, persisted=True), nullable=True),
+    sa.Column('created_at', sa.DateTime(), server_default=sa.text('now()'), nullable=False),
+    sa.Column('updated_at', sa.DateTime(), server_default=sa.text('now()'), nullable=False),
+    sa.ForeignKeyConstraint(['recipient_id'], ['users.id'], ),
+    sa.ForeignKeyConstraint(['sender_id'], ['users.id'], ),
+    )
+    op.execute(f'INSERT INTO messages ({COLUMNS}) SELECT {COLUMNS} FROM messages_archive')
+    op.execute(f'INSERT INTO messages ({COLUMNS}) SELECT {COLUMNS} FROM messages_partitioned')
+    op.execute('ALTER SEQUENCE messages_id_seq OWNED BY messages.id')
+    op.drop_table('messages_partitioned')
+    op.drop_index('ix_messages_archive_conversation_id_id', table_name='messages_archive')
+    op.drop_table('messages_archive')
+    op.create_primary_key('messages_pkey', 'messages', ['id'])
+    op.create_index('ix_messages_conversation_id_id', 'messages', ['conversation_id', sa.text('id DESC')], unique=False)
+    op.create_index(
+        'ix_messages_conversation_id_search_vector',
+        'messages',
+        ['conversation_id', 'search_vector'],
+        unique=False,
+        postgresql_using='gin',
+    )
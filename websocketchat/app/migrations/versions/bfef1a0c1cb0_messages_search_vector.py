@@ -0,0 +1,46 @@
+"""Messages search vector
+
+Revision ID: bfef1a0c1cb0
+Revises: f4de7d92e798
+Create Date: 2026-10-19 14:02:18.417305
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'bfef1a0c1cb0'
+down_revision: Union[str, None] = 'f4de7d92e798'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # btree_gin позволяет положить conversation_id в один GIN-индекс с tsvector,
+    # чтобы поиск сразу ограничивался переписками пользователя.
+    op.execute('CREATE EXTENSION IF NOT EXISTS btree_gin')
+    op.add_column('messages', sa.Column(
+        'search_vector',
+        postgresql.TSVECTOR(),
+        sa.Computed(
+            "to_tsvector('russian'::regconfig, content) || to_tsvector('english'::regconfig, content)",
+            persisted=True,
+        ),
+        nullable=True,
+    ))
+    op.create_index(
+        'ix_messages_conversation_id_search_vector',
+        'messages',
+        ['conversation_id', 'search_vector'],
+        unique=False,
+        postgresql_using='gin',
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('ix_messages_conversation_id_search_vector', table_name='messages', postgresql_using='gin')
+    op.drop_column('messages', 'search_vector')
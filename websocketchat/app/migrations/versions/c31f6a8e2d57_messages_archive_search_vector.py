@@ -0,0 +1,43 @@
+"""Messages archive search vector
+
+Revision ID: c31f6a8e2d57
+Revises: eee4d50f876c
+Create Date: 2026-10-19 19:12:44.508312
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c31f6a8e2d57'
+down_revision: Union[str, None] = 'eee4d50f876c'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('messages_archive', sa.Column(
+        'search_vector',
+        postgresql.TSVECTOR(),
+        sa.Computed(
+            "to_tsvector('russian'::regconfig, content) || to_tsvector('english'::regconfig, content)",
+            persisted=True,
+        ),
+        nullable=True,
+    ))
+    op.create_index(
+        'ix_messages_archive_conversation_id_search_vector',
+        'messages_archive',
+        ['conversation_id', 'search_vector'],
+        unique=False,
+        postgresql_using='gin',
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('ix_messages_archive_conversation_id_search_vector', table_name='messages_archive', postgresql_using='gin')
+    op.drop_column('messages_archive', 'search_vector')
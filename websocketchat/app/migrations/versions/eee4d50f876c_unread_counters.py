@@ -0,0 +1,38 @@
+"""Unread counters
+
+Revision ID: eee4d50f876c
+Revises: a928a03aabd4
+Create Date: 2026-10-19 18:05:31.264087
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'eee4d50f876c'
+down_revision: Union[str, None] = 'a928a03aabd4'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Счетчиков до миграции нет: существующие переписки считаются прочитанными.
+    op.create_table('unread_counters',
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('conversation_id', sa.BigInteger(), nullable=False),
+    sa.Column('unread_count', sa.Integer(), server_default='0', nullable=False),
+    sa.Column('last_read_message_id', sa.Integer(), nullable=True),
+    sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+    sa.Column('created_at', sa.DateTime(), server_default=sa.text('now()'), nullable=False),
+    sa.Column('updated_at', sa.DateTime(), server_default=sa.text('now()'), nullable=False),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('user_id', 'conversation_id', name='uq_unread_counters_user_id_conversation_id')
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('unread_counters')
@@ -0,0 +1,62 @@
+"""Messages conversation id
+
+Revision ID: f4de7d92e798
+Revises: 85d5b039c0e2
+Create Date: 2026-10-19 11:14:05.631977
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f4de7d92e798'
+down_revision: Union[str, None] = '85d5b039c0e2'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('messages', sa.Column('conversation_id', sa.BigInteger(), nullable=True))
+    op.execute(
+        'UPDATE messages SET conversation_id = '
+        '(LEAST(sender_id, recipient_id)::bigint << 32) | GREATEST(sender_id, recipient_id)'
+    )
+    op.alter_column('messages', 'conversation_id', nullable=False)
+    op.create_index('ix_messages_conversation_id_id', 'messages', ['conversation_id', sa.text('id DESC')], unique=False)
+    op.drop_index('ix_messages_sender_recipient_id', table_name='messages')
+
+    op.create_table('conversations',
+    sa.Column('id', sa.BigInteger(), autoincrement=False, nullable=False),
+    sa.Column('user_low_id', sa.Integer(), nullable=False),
+    sa.Column('user_high_id', sa.Integer(), nullable=False),
+    sa.Column('last_message_id', sa.Integer(), nullable=True),
+    sa.Column('last_message_preview', sa.String(length=100), nullable=True),
+    sa.Column('last_message_at', sa.DateTime(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), server_default=sa.text('now()'), nullable=False),
+    sa.Column('updated_at', sa.DateTime(), server_default=sa.text('now()'), nullable=False),
+    sa.ForeignKeyConstraint(['user_high_id'], ['users.id'], ),
+    sa.ForeignKeyConstraint(['user_low_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_conversations_user_low_id', 'conversations', ['user_low_id', 'last_message_id'], unique=False)
+    op.create_index('ix_conversations_user_high_id', 'conversations', ['user_high_id', 'last_message_id'], unique=False)
+    op.execute(
+        'INSERT INTO conversations '
+        '(id, user_low_id, user_high_id, last_message_id, last_message_preview, last_message_at, created_at) '
+        'SELECT DISTINCT ON (conversation_id) '
+        'conversation_id, LEAST(sender_id, recipient_id), GREATEST(sender_id, recipient_id), '
+        'id, left(content, 100), created_at, created_at '
+        'FROM messages ORDER BY conversation_id, id DESC'
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('ix_conversations_user_high_id', table_name='conversations')
+    op.drop_index('ix_conversations_user_low_id', table_name='conversations')
+    op.drop_table('conversations')
+    op.create_index('ix_messages_sender_recipient_id', 'messages', ['sender_id', 'recipient_id', 'id'], unique=False)
+    op.drop_index('ix_messages_conversation_id_id', table_name='messages')
+    op.drop_column('messages', 'conversation_id')
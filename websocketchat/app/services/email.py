@@ -1,9 +1,27 @@
-from core.email import client, create_confirmation_token
+from typing import Iterable
 
+from core.email import client, create_confirmation_token, EmailTemplate
+
+
+VERIFICATION_TEMPLATE = EmailTemplate(client.from_email, 'Подтверждение создания аккаунта', '{url}')
 
 
 def send_email_with_verification_link(abs_url: str, to_email: str):
-    token = create_confirmation_token(to_email)
-    url = f'{abs_url}?token={token}'
-    subject = 'Подтверждение создания аккаунта'
-    return client.send_email(to_email, subject, url)
+    return send_emails_with_verification_link([(abs_url, to_email)])
+
+
+def send_emails_with_verification_link(recipients: Iterable[tuple[str, str]]) -> list[tuple[str, str]]:
+    """
+    Отправляет письма со ссылкой подтверждения через одно SMTP-соединение.
+
+    :param recipients: Пары (адрес страницы подтверждения, email получателя).
+    :return: Получатели, которым письмо нужно отправить повторно.
+    """
+    recipients = list(recipients)
+    messages = []
+    for abs_url, to_email in recipients:
+        token = create_confirmation_token(to_email)
+        url = f'{abs_url}?token={token}'
+        messages.append((to_email, VERIFICATION_TEMPLATE.render(to_email, url=url)))
+    undelivered = {to_email for to_email, _ in client.send_messages(messages)}
+    return [(abs_url, to_email) for abs_url, to_email in recipients if to_email in undelivered]
@@ -0,0 +1,105 @@
+"""
+Локальный SMTP-сервер для тестов отправки писем: принимает все письма
+и ничего не отправляет.
+
+    python -m services.smtp_sink --port 1025
+
+и в .env/.env.smtp HOST=localhost, PORT=1025, USE_TLS=false. Каждое письмо
+печатается; с `--dir` письма сохраняются в файлы .eml. Печатается и число
+соединений, по которому видно, переиспользует ли клиент сессии.
+"""
+import argparse
+import asyncio
+import itertools
+import os
+from typing import Optional
+
+
+class SMTPSink:
+    def __init__(self, directory: Optional[str] = None):
+        self.directory = directory
+        self.connections = 0
+        self.messages: list[tuple[str, list[str], bytes]] = []
+        self._ids = itertools.count(1)
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        self.connections += 1
+        mail_from, rcpt_to = None, []
+
+        async def reply(line: str) -> None:
+            writer.write(line.encode() + b'\r\n')
+            await writer.drain()
+
+        await reply('220 smtp-sink ready')
+        try:
+            while line := await reader.readline():
+                command, _, argument = line.decode(errors='replace').strip().partition(' ')
+                command = command.upper()
+                if command == 'EHLO':
+                    writer.write(b'250-smtp-sink\r\n250-8BITMIME\r\n250 AUTH PLAIN LOGIN\r\n')
+                    await writer.drain()
+                elif command == 'HELO':
+                    await reply('250 smtp-sink')
+                elif command == 'AUTH':
+                    mechanism = argument.split()[0].upper() if argument else ''
+                    if mechanism == 'LOGIN':
+                        for prompt in ('334 VXNlcm5hbWU6', '334 UGFzc3dvcmQ6'):
+                            await reply(prompt)
+                            await reader.readline()
+                    elif mechanism == 'PLAIN' and len(argument.split()) == 1:
+                        await reply('334 ')
+                        await reader.readline()
+                    await reply('235 Authentication successful')
+                elif command == 'MAIL':
+                    mail_from, rcpt_to = argument.partition(':')[2].strip('<> '), []
+                    await reply('250 OK')
+                elif command == 'RCPT':
+                    rcpt_to.append(argument.partition(':')[2].strip('<> '))
+                    await reply('250 OK')
+                elif command == 'DATA':
+                    await reply('354 End data with <CR><LF>.<CR><LF>')
+                    data = bytearray()
+                    while (chunk := await reader.readline()) not in (b'.\r\n', b''):
+                        data += chunk[1:] if chunk.startswith(b'..') else chunk
+                    self.store(mail_from, rcpt_to, bytes(data))
+                    await reply('250 OK queued')
+                elif command == 'RSET':
+                    mail_from, rcpt_to = None, []
+                    await reply('250 OK')
+                elif command == 'NOOP':
+                    await reply('250 OK')
+                elif command == 'QUIT':
+                    await reply('221 Bye')
+                    break
+                else:
+                    await reply('502 Command not implemented')
+        finally:
+            writer.close()
+
+    def store(self, mail_from: str, rcpt_to: list[str], data: bytes) -> None:
+        self.messages.append((mail_from, rcpt_to, data))
+        message_id = next(self._ids)
+        print(f'#{message_id} from={mail_from} to={",".join(rcpt_to)} bytes={len(data)} connections={self.connections}')
+        if self.directory:
+            with open(os.path.join(self.directory, f'{message_id:06d}.eml'), 'wb') as file:
+                file.write(data)
+
+    async def serve(self, host: str, port: int) -> asyncio.Server:
+        return await asyncio.start_server(self.handle, host, port)
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=1025)
+    parser.add_argument('--dir', default=None, help='Каталог для сохранения писем')
+    args = parser.parse_args()
+    if args.dir:
+        os.makedirs(args.dir, exist_ok=True)
+    server = await SMTPSink(args.dir).serve(args.host, args.port)
+    async with server:
+        await server.serve_forever()
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -1,25 +1,133 @@
 import asyncio
+import json
 
 from celery import shared_task
 
-from .telegram_notification import send_telegram_notification
-from .email import send_email_with_verification_link
+from core.redis import Redis
+from core.runtime import async_task, runtime
+from core.settings import settings
+from chat.partitions import maintain_partitions
+from .telegram_notification import enqueue_telegram_notification
+from .email import send_email_with_verification_link, send_emails_with_verification_link
 
 
-@shared_task
-def send_telegram_notification_task(user_id: int, username: str):
+PENDING_EMAILS_KEY = 'email:pending'
+PROCESSING_EMAILS_KEY = 'email:processing'
+EMAIL_BATCH_SCHEDULED_KEY = 'email:scheduled'
+EMAIL_SENDING_LOCK_KEY = 'email:sending'
+EMAIL_SENDING_LOCK_TIMEOUT = 120
+
+
+@runtime.on_shutdown
+async def _close_bot_session():
+    from main_bot import bot
+    await bot.session.close()
+
+
+@runtime.on_shutdown
+async def _close_smtp_connections():
+    from core.email import client
+    client.close()
+
+
+@async_task()
+async def send_telegram_notification_task(user_id: int, username: str):
     """
     Задача Celery для отправки уведомления пользователю в Telegram.
 
+    Оставлена для задач, поставленных до перехода на диспетчер: уведомление
+    перекладывается в его очередь, отправляет его диспетчер.
+
     :param user_id: ID пользователя, которому нужно отправить уведомление.
     :param username: Имя пользователя, которое будет указано в уведомлении.
-    
-    Эта функция запускает асинхронную функцию send_telegram_notification, 
-    чтобы отправить уведомление пользователю в Telegram.
     """
-    asyncio.run(send_telegram_notification(user_id=user_id, username=username))
-     
+    await enqueue_telegram_notification(user_id=user_id, username=username)
+
 
 @shared_task
 def send_email_with_verification_link_task(abs_url: str, to_email: str):
-    send_email_with_verification_link(abs_url, to_email)
\ No newline at end of file
+    send_email_with_verification_link(abs_url, to_email)
+
+
+async def enqueue_email_with_verification_link(abs_url: str, to_email: str):
+    """
+    Ставит письмо подтверждения в очередь. Письма, накопившиеся за
+    `SMTP.BATCH_DELAY_MS`, отправляет одна задача через одно SMTP-соединение.
+
+    :param abs_url: Адрес страницы подтверждения.
+    :param to_email: Email получателя.
+    """
+    redis = Redis()
+    await redis.rpush(PENDING_EMAILS_KEY, json.dumps([abs_url, to_email]))
+    if await redis.set(EMAIL_BATCH_SCHEDULED_KEY, 1, nx=True, ex=60):
+        send_pending_emails_task.apply_async(countdown=settings.SMTP.BATCH_DELAY_MS / 1000)
+
+
+@async_task()
+async def send_pending_emails_task():
+    """
+    Задача Celery, отправляющая накопленные письма подтверждения пачками.
+
+    Пачка перекладывается LMOVE в список `PROCESSING_EMAILS_KEY` и удаляется
+    из него только после отправки, поэтому письма упавшего воркера возвращаются
+    в очередь следующим запуском. Одновременно отправляет одна задача: она
+    держит блокировку `EMAIL_SENDING_LOCK_KEY`, остальные откладывают запуск.
+
+    Недоставленные письма возвращаются в очередь и отправляются повторно
+    через `SMTP.RETRY_DELAY_MS`.
+    """
+    redis = Redis()
+    # Письма, поставленные после этой точки, запланируют следующий запуск.
+    await redis.delete(EMAIL_BATCH_SCHEDULED_KEY)
+    lock = redis.lock(EMAIL_SENDING_LOCK_KEY, timeout=EMAIL_SENDING_LOCK_TIMEOUT)
+    if not await lock.acquire(blocking=False):
+        await _schedule_pending_emails(settings.SMTP.BATCH_DELAY_MS)
+        return
+    try:
+        while await redis.lmove(PROCESSING_EMAILS_KEY, PENDING_EMAILS_KEY, 'RIGHT', 'LEFT') is not None:
+            pass
+        undelivered = 0
+        while items := await _take_pending_emails(redis, settings.SMTP.BATCH_SIZE):
+            recipients = [tuple(json.loads(item)) for item in items]
+            failed = set(await asyncio.to_thread(send_emails_with_verification_link, recipients))
+            undelivered += len(failed)
+            # Недоставленные письма остаются в списке обработки до конца запуска.
+            async with redis.pipeline(transaction=False) as pipe:
+                for item, recipient in zip(items, recipients):
+                    if recipient not in failed:
+                        pipe.lrem(PROCESSING_EMAILS_KEY, 1, item)
+                await pipe.execute()
+            await lock.reacquire()
+        while await redis.lmove(PROCESSING_EMAILS_KEY, PENDING_EMAILS_KEY, 'LEFT', 'RIGHT') is not None:
+            pass
+    finally:
+        await lock.release()
+    if undelivered:
+        await _schedule_pending_emails(settings.SMTP.RETRY_DELAY_MS)
+
+
+async def _take_pending_emails(redis, count: int) -> list[bytes]:
+    async with redis.pipeline(transaction=False) as pipe:
+        for _ in range(count):
+            pipe.lmove(PENDING_EMAILS_KEY, PROCESSING_EMAILS_KEY, 'LEFT', 'RIGHT')
+        items = await pipe.execute()
+    return [item for item in items if item is not None]
+
+
+async def _schedule_pending_emails(delay_ms: int) -> None:
+    if await Redis().set(EMAIL_BATCH_SCHEDULED_KEY, 1, nx=True, ex=60 + delay_ms // 1000):
+        send_pending_emails_task.apply_async(countdown=delay_ms / 1000)
+
+
+@async_task()
+async def maintain_message_partitions_task():
+    """
+    Периодическая задача Celery: создает секции `messages` на
+    `CHAT.PARTITION_MONTHS_AHEAD` месяцев вперед и переносит в `messages_archive`
+    секции старше `CHAT.ARCHIVE_AFTER_MONTHS` месяцев.
+    """
+    result = await maintain_partitions(
+        months_ahead=settings.CHAT.PARTITION_MONTHS_AHEAD,
+        archive_after_months=settings.CHAT.ARCHIVE_AFTER_MONTHS,
+    )
+    return result
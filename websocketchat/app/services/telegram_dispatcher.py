@@ -0,0 +1,249 @@
+"""
+Диспетчер Telegram-уведомлений о новых сообщениях.
+
+Запускается отдельным процессом из каталога app:
+
+    python -m services.telegram_dispatcher
+
+Читает очередь, которую наполняет `enqueue_telegram_notification`, и работает
+в одном долгоживущем цикле событий с одной HTTP-сессией бота. Запускается
+один диспетчер: принятые уведомления лежат в `PROCESSING_KEY` до отправки
+и возвращаются в очередь при остановке или следующем запуске после падения.
+"""
+import asyncio
+import json
+import logging
+import time
+from typing import Dict, List, Optional
+
+from aiogram import Bot
+from aiogram.exceptions import TelegramForbiddenError, TelegramRetryAfter
+
+from core.redis import Redis
+from main_bot import bot, NOTIFY_WINDOW_MS, NOTIFY_GLOBAL_RATE, NOTIFY_CHAT_RATE
+from bot.dao import TelegramUsersDAO
+from chat.presence import presence
+from .telegram_notification import NOTIFICATIONS_KEY
+
+
+logger = logging.getLogger(__name__)
+
+PROCESSING_KEY = f'{NOTIFICATIONS_KEY}:processing'
+MAX_ATTEMPTS = 5
+RETRY_DELAY = 5.0
+
+
+class TokenBucket:
+    """
+    Ограничитель частоты: `rate` токенов в секунду, не больше `capacity` накопленных.
+    """
+
+    def __init__(self, rate: float, capacity: float = 1.0):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated_at = time.monotonic()
+
+    def wait_time(self) -> float:
+        """
+        :return: Через сколько секунд будет доступен токен (0, если уже доступен).
+        """
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+        if self.tokens >= 1:
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+    def consume(self) -> None:
+        self.tokens -= 1
+
+    @property
+    def full(self) -> bool:
+        return self.wait_time() == 0.0 and self.tokens >= self.capacity
+
+
+class PendingNotification:
+    def __init__(self, due_at: float):
+        self.due_at = due_at
+        self.count = 0
+        self.usernames: Dict[str, None] = {}
+        self.items: List[bytes] = []
+        self.attempts = 0
+
+    def add(self, username: str, data: bytes) -> None:
+        self.count += 1
+        self.usernames[username] = None
+        self.items.append(data)
+
+
+def format_notification(pending: PendingNotification, max_names: int = 3) -> str:
+    """
+    Собирает текст уведомления о нескольких сообщениях.
+
+    :param pending: Накопленные уведомления получателя.
+    :param max_names: Сколько отправителей перечислить по имени.
+    :return: Текст уведомления.
+    """
+    usernames = list(pending.usernames)
+    if pending.count == 1:
+        return f'Пользователь `{usernames[0]}`: Отправил вам сообщение!'
+    names = ', '.join(f'`{username}`' for username in usernames[:max_names])
+    if len(usernames) > max_names:
+        names += f' и еще {len(usernames) - max_names}'
+    return f'Новых сообщений: {pending.count} от {names}'
+
+
+class TelegramDispatcher:
+    """
+    Собирает уведомления для каждого получателя в течение `window` секунд с первого
+    из них и отправляет одно сообщение вида "Новых сообщений: N от A, B".
+
+    Отправка ограничена общим лимитом Bot API (`global_rate` сообщений в секунду)
+    и лимитом на чат (`chat_rate`). Если лимит чата еще не восстановился,
+    уведомление откладывается и продолжает копить новые сообщения. Получателям,
+    которые к моменту отправки онлайн, уведомление не отправляется.
+
+    Уведомление удаляется из `PROCESSING_KEY`, когда оно отправлено или пропущено.
+    При ошибке отправка повторяется через `RETRY_DELAY` * номер попытки, после
+    `MAX_ATTEMPTS` попыток уведомление отбрасывается.
+    """
+
+    def __init__(self, bot: Bot, window: float, global_rate: float, chat_rate: float):
+        self.bot = bot
+        self.window = window
+        self.global_bucket = TokenBucket(global_rate, capacity=global_rate)
+        self.chat_rate = chat_rate
+        self.chat_buckets: Dict[int, TokenBucket] = {}
+        self.pending: Dict[int, PendingNotification] = {}
+        self.stats = dict.fromkeys(('received', 'sent', 'skipped_online', 'skipped_unlinked', 'retried', 'failed'), 0)
+        self.redis = None
+
+    async def run(self) -> None:
+        self.redis = Redis()
+        await self.requeue()
+        while True:
+            timeout = 1.0
+            if self.pending:
+                next_due = min(pending.due_at for pending in self.pending.values())
+                timeout = min(timeout, max(0.01, next_due - time.monotonic()))
+            data = await self.redis.blmove(NOTIFICATIONS_KEY, PROCESSING_KEY, timeout, 'LEFT', 'RIGHT')
+            if data is not None:
+                self.add(data)
+                async with self.redis.pipeline(transaction=False) as pipe:
+                    for _ in range(500):
+                        pipe.lmove(NOTIFICATIONS_KEY, PROCESSING_KEY, 'LEFT', 'RIGHT')
+                    for data in await pipe.execute():
+                        if data is not None:
+                            self.add(data)
+            await self.flush_due()
+
+    async def requeue(self) -> None:
+        """
+        Возвращает в начало очереди принятые, но не отправленные уведомления.
+        """
+        while await self.redis.lmove(PROCESSING_KEY, NOTIFICATIONS_KEY, 'RIGHT', 'LEFT') is not None:
+            pass
+        self.pending.clear()
+
+    def add(self, data: bytes) -> None:
+        notification = json.loads(data)
+        self.stats['received'] += 1
+        pending = self.pending.get(notification['user_id'])
+        if pending is None:
+            pending = self.pending[notification['user_id']] = PendingNotification(time.monotonic() + self.window)
+        pending.add(notification['username'], data)
+
+    async def flush_due(self) -> None:
+        now = time.monotonic()
+        for user_id in [user_id for user_id, pending in self.pending.items() if pending.due_at <= now]:
+            pending = self.pending.pop(user_id)
+            try:
+                if not await self.send(user_id, pending):
+                    continue
+            except Exception:
+                pending.attempts += 1
+                if pending.attempts < MAX_ATTEMPTS:
+                    logger.exception('Ошибка отправки уведомления пользователю %s, попытка %s', user_id, pending.attempts)
+                    self.stats['retried'] += 1
+                    self._postpone(user_id, pending, RETRY_DELAY * pending.attempts)
+                    continue
+                logger.exception('Уведомление пользователю %s отброшено после %s попыток', user_id, pending.attempts)
+                self.stats['failed'] += 1
+            await self._ack(pending)
+        self.chat_buckets = {chat_id: bucket for chat_id, bucket in self.chat_buckets.items() if not bucket.full}
+
+    async def send(self, user_id: int, pending: PendingNotification) -> bool:
+        """
+        :return: False, если уведомление отложено, иначе True.
+        """
+        if await presence.is_online(user_id):
+            self.stats['skipped_online'] += 1
+            return True
+        telegram_user = await TelegramUsersDAO.find_one_or_none(user_id=user_id)
+        if not telegram_user:
+            self.stats['skipped_unlinked'] += 1
+            return True
+
+        chat_bucket = self.chat_buckets.get(telegram_user.telegram_id)
+        if chat_bucket is None:
+            chat_bucket = self.chat_buckets[telegram_user.telegram_id] = TokenBucket(self.chat_rate)
+        delay = chat_bucket.wait_time()
+        if delay:
+            self._postpone(user_id, pending, delay)
+            return False
+        await asyncio.sleep(self.global_bucket.wait_time())
+        self.global_bucket.consume()
+        chat_bucket.consume()
+
+        try:
+            await self.bot.send_message(telegram_user.telegram_id, format_notification(pending))
+        except TelegramRetryAfter as e:
+            self.stats['retried'] += 1
+            self._postpone(user_id, pending, e.retry_after)
+            return False
+        except TelegramForbiddenError:
+            # Пользователь заблокировал бота.
+            self.stats['skipped_unlinked'] += 1
+        else:
+            self.stats['sent'] += 1
+        return True
+
+    def _postpone(self, user_id: int, pending: PendingNotification, delay: float) -> None:
+        newer: Optional[PendingNotification] = self.pending.get(user_id)
+        if newer is not None:
+            pending.count += newer.count
+            pending.usernames.update(newer.usernames)
+            pending.items += newer.items
+        pending.due_at = time.monotonic() + delay
+        self.pending[user_id] = pending
+
+    async def _ack(self, pending: PendingNotification) -> None:
+        async with self.redis.pipeline(transaction=False) as pipe:
+            for data in pending.items:
+                pipe.lrem(PROCESSING_KEY, 1, data)
+            await pipe.execute()
+
+
+async def main() -> None:
+    dispatcher = TelegramDispatcher(
+        bot,
+        window=NOTIFY_WINDOW_MS / 1000,
+        global_rate=NOTIFY_GLOBAL_RATE,
+        chat_rate=NOTIFY_CHAT_RATE,
+    )
+    try:
+        await dispatcher.run()
+    finally:
+        logger.info('Статистика диспетчера: %s', dispatcher.stats)
+        try:
+            if dispatcher.redis is not None:
+                await dispatcher.requeue()
+        finally:
+            await bot.session.close()
+            await Redis.close()
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(main())
@@ -1,10 +1,20 @@
-from main_bot import notify_user
-from bot.models import TelegramUser
-from bot.dao import TelegramUsersDAO
+import json
+import time
 
+from core.redis import Redis
+from core.settings import settings
+
+
+NOTIFICATIONS_KEY = f'{settings.CHAT.CHANNEL_PREFIX}:notifications'
+
+
+async def enqueue_telegram_notification(user_id: int, username: str):
+    """
+    Ставит уведомление о новом сообщении в очередь диспетчера Telegram-уведомлений.
+
+    :param user_id: ID пользователя, которому нужно отправить уведомление.
+    :param username: Имя отправителя сообщения.
+    """
+    notification = {'user_id': user_id, 'username': username, 'ts': time.time()}
+    await Redis().rpush(NOTIFICATIONS_KEY, json.dumps(notification))
 
-async def send_telegram_notification(user_id: int, username: str):
-    telegram_user: TelegramUser = await TelegramUsersDAO.find_one_or_none(user_id=user_id)
-    if not telegram_user:
-        return
-    await notify_user(telegram_user.telegram_id, username)
\ No newline at end of file
@@ -0,0 +1,54 @@
+"""
+Заглушка Bot API для тестов диспетчера уведомлений.
+
+    python -m services.telegram_stub --port 8081
+
+и API_URL=http://localhost:8081 в .env/.env.bot. Принимает sendMessage,
+отвечает как Telegram и запоминает вызовы, которые можно посмотреть на GET /calls.
+С `--retry-after` каждый N-й вызов отвечает 429, как при превышении лимита.
+"""
+import argparse
+import time
+
+from aiohttp import web
+
+
+def create_app(retry_every: int = 0, retry_after: int = 1) -> web.Application:
+    calls = []
+
+    async def send_message(request: web.Request) -> web.Response:
+        data = await request.post()
+        calls.append({'token': request.match_info['token'], 'time': time.time(), **data})
+        if retry_every and len(calls) % retry_every == 0:
+            return web.json_response({
+                'ok': False,
+                'error_code': 429,
+                'description': f'Too Many Requests: retry after {retry_after}',
+                'parameters': {'retry_after': retry_after},
+            }, status=429)
+        return web.json_response({
+            'ok': True,
+            'result': {
+                'message_id': len(calls),
+                'date': int(time.time()),
+                'chat': {'id': int(data['chat_id']), 'type': 'private'},
+                'text': data.get('text', ''),
+            },
+        })
+
+    async def get_calls(request: web.Request) -> web.Response:
+        return web.json_response(calls)
+
+    app = web.Application()
+    app.router.add_post('/bot{token}/sendMessage', send_message)
+    app.router.add_get('/calls', get_calls)
+    return app
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--port', type=int, default=8081)
+    parser.add_argument('--retry-every', type=int, default=0, help='Отвечать 429 на каждый N-й вызов')
+    parser.add_argument('--retry-after', type=int, default=1)
+    args = parser.parse_args()
+    web.run_app(create_app(args.retry_every, args.retry_after), port=args.port)
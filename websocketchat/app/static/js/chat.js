@@ -9,42 +9,137 @@ function addUserClickListeners() {
     });
 }
 
-async function fetchUsers() {
-    try {
-        const response = await fetch('/auth/users');
-        const users = await response.json();
-        const userList = document.getElementById('userList');
+const directory = new Map();
+const onlineUsers = new Set();
+const unreadCounts = new Map();
+let directoryVersion = parseInt(document.getElementById('userList').dataset.version, 10) || 0;
+
+document.querySelectorAll('#userList .user-item').forEach(item => {
+    const userId = parseInt(item.getAttribute('data-user-id'), 10);
+    if (userId !== currentUserId) directory.set(userId, item.textContent.trim());
+});
 
-        userList.innerHTML = '';
+function renderUsers() {
+    const userList = document.getElementById('userList');
 
-        const favoriteElement = document.createElement('div');
-        favoriteElement.classList.add('user-item');
-        favoriteElement.setAttribute('data-user-id', currentUserId);
-        favoriteElement.textContent = 'Избранное';
+    userList.innerHTML = '';
 
-        userList.appendChild(favoriteElement);
+    const favoriteElement = document.createElement('div');
+    favoriteElement.classList.add('user-item');
+    favoriteElement.setAttribute('data-user-id', currentUserId);
+    favoriteElement.textContent = 'Избранное';
 
-        users.forEach(user => {
-            if (user.id !== currentUserId) {
-                const userElement = document.createElement('div');
-                userElement.classList.add('user-item');
-                userElement.setAttribute('data-user-id', user.id);
-                userElement.textContent = user.username;
-                userList.appendChild(userElement);
-            }
+    userList.appendChild(favoriteElement);
+
+    directory.forEach((username, userId) => {
+        const userElement = document.createElement('div');
+        userElement.classList.add('user-item');
+        userElement.setAttribute('data-user-id', userId);
+        userElement.textContent = username;
+        if (onlineUsers.has(userId)) userElement.classList.add('online');
+        userList.appendChild(userElement);
+    });
+
+    userList.querySelectorAll('.user-item').forEach(item => {
+        if (item.getAttribute('data-user-id') === String(selectedUserId)) item.classList.add('active');
+    });
+    addUserClickListeners();
+    renderUnread();
+}
+
+function renderUnread() {
+    document.querySelectorAll('#userList .user-item').forEach(item => {
+        const count = unreadCounts.get(parseInt(item.getAttribute('data-user-id'), 10)) || 0;
+        if (count) item.dataset.unread = count > 99 ? '99+' : count;
+        else delete item.dataset.unread;
+    });
+}
+
+function setUnread(userId, count) {
+    if (count) unreadCounts.set(userId, count);
+    else unreadCounts.delete(userId);
+    renderUnread();
+}
+
+async function fetchConversations() {
+    try {
+        const response = await fetch('/chat/conversations');
+        if (!response.ok) return;
+        const conversations = await response.json();
+        unreadCounts.clear();
+        conversations.forEach(conversation => {
+            if (conversation.unread_count) unreadCounts.set(conversation.user_id, conversation.unread_count);
         });
+        renderUnread();
+    } catch (error) {
+        console.error('Ошибка при загрузке переписок:', error);
+    }
+}
+
+// client_id сообщений, отправленных из этой вкладки: их эхо по websocket уже показано.
+const sentClientIds = new Set();
 
-        addUserClickListeners();
+// Отметка передает ID последнего показанного сообщения: сервер выдает ID при отправке,
+// поэтому сообщения, еще не записанные в базу, тоже учитываются.
+function markRead(userId, messageId) {
+    setUnread(parseInt(userId, 10), 0);
+    if (messageId == null) return;
+    if (socket && socket.readyState === WebSocket.OPEN) {
+        socket.send(JSON.stringify({type: 'read', user_id: parseInt(userId, 10), message_id: messageId}));
+    }
+}
+
+function applyUsers(users, version) {
+    users.forEach(user => {
+        if (user.id !== currentUserId) directory.set(user.id, user.username);
+    });
+    directoryVersion = Math.max(directoryVersion, version);
+    if (users.length) renderUsers();
+}
+
+async function fetchUsers() {
+    try {
+        const response = await fetch(`/auth/users?since_version=${directoryVersion}`);
+        if (!response.ok) return;
+        const users = await response.json();
+        applyUsers(users, parseInt(response.headers.get('X-Directory-Version'), 10) || 0);
     } catch (error) {
         console.error('Ошибка при загрузке списка пользователей:', error);
     }
 }
 
-document.addEventListener('DOMContentLoaded', fetchUsers);
-setInterval(fetchUsers, 10000); 
+function applyPresence(online, offline) {
+    online.forEach(userId => onlineUsers.add(userId));
+    offline.forEach(userId => onlineUsers.delete(userId));
+    document.querySelectorAll('#userList .user-item').forEach(item => {
+        const userId = parseInt(item.getAttribute('data-user-id'), 10);
+        item.classList.toggle('online', onlineUsers.has(userId));
+    });
+}
+
+async function fetchPresence() {
+    const userIds = Array.from(directory.keys());
+    try {
+        for (let i = 0; i < userIds.length; i += 500) {
+            const query = userIds.slice(i, i + 500).map(userId => `user_id=${userId}`).join('&');
+            const response = await fetch(`/chat/presence?${query}`);
+            if (!response.ok) return;
+            const statuses = await response.json();
+            applyPresence(
+                statuses.filter(status => status.online).map(status => status.user_id),
+                statuses.filter(status => !status.online).map(status => status.user_id),
+            );
+        }
+    } catch (error) {
+        console.error('Ошибка при загрузке статусов пользователей:', error);
+    }
+}
 
 let selectedUserId = null;  
 let socket = null;          
+let oldestMessage = null;
+let lastMessageId = null;
+let isLoadingOlder = false;
 
 async function logout() {
     try {
@@ -80,7 +175,7 @@ async function selectUser(userId, userName, event) {
     document.getElementById('logoutButton').onclick = logout;  
 
     await loadMessages(userId);  
-    connectWebSocket();
+    markRead(userId, lastMessageId);
 }
 
 async function loadMessages(userId) {
@@ -92,37 +187,106 @@ async function loadMessages(userId) {
         messagesContainer.innerHTML = messages.map(message =>
             createMessageElement(message.content, message.recipient_id)  
         ).join('');  
+        oldestMessage = messages.length ? messages[0] : null;
+        lastMessageId = messages.length ? messages[messages.length - 1].id : null;
+        messagesContainer.scrollTop = messagesContainer.scrollHeight;
     } catch (error) {
         console.error('Ошибка загрузки сообщений:', error);  
     }
 }
 
-function connectWebSocket() {
-    if (socket) socket.close(); 
+async function loadOlderMessages() {
+    if (!selectedUserId || !oldestMessage || isLoadingOlder) return;
+    isLoadingOlder = true;
+    const userId = selectedUserId;
+    try {
+        const params = new URLSearchParams({before_id: oldestMessage.id, before_created_at: oldestMessage.created_at});
+        const response = await fetch(`/chat/messages/${userId}?${params}`);
+        const messages = await response.json();
+        if (userId !== selectedUserId) return;
 
-    socket = new WebSocket(`ws://${window.location.host}/chat/ws/${selectedUserId}`);  
+        const messagesContainer = document.getElementById('messages');
+        const previousHeight = messagesContainer.scrollHeight;
+        messagesContainer.insertAdjacentHTML('afterbegin', messages.map(message =>
+            createMessageElement(message.content, message.recipient_id)
+        ).join(''));
+        messagesContainer.scrollTop = messagesContainer.scrollHeight - previousHeight;
+        oldestMessage = messages.length ? messages[0] : null;
+    } catch (error) {
+        console.error('Ошибка загрузки сообщений:', error);
+    } finally {
+        isLoadingOlder = false;
+    }
+}
 
-    socket.onopen = () => console.log('WebSocket соединение установлено');  
-    console.log('My ID is ', currentUserId)
-    console.log('Selected User ID is ', selectedUserId)
+document.getElementById('messages').addEventListener('scroll', (event) => {
+    if (event.target.scrollTop === 0) loadOlderMessages();
+});
+
+function connectWebSocket() {
+    socket = new WebSocket(`ws://${window.location.host}/chat/ws/${currentUserId}`);  
+
+    socket.onopen = () => {
+        console.log('WebSocket соединение установлено');
+        // Догружаем изменения списка пользователей, пропущенные без соединения.
+        fetchUsers().then(fetchPresence);
+        fetchConversations();
+    };
 
     socket.onmessage = (event) => {
         const incomingMessage = JSON.parse(event.data);  
-        if (incomingMessage.recipient_id === currentUserId) {  
-            console.log('Incoming message: ', incomingMessage.content, incomingMessage.recipient_id)
+        if (incomingMessage.type === 'ping') {
+            socket.send(JSON.stringify({type: 'pong'}));
+            return;
+        }
+        if (incomingMessage.type === 'presence') {
+            applyPresence(incomingMessage.online, incomingMessage.offline);
+            return;
+        }
+        if (incomingMessage.type === 'users') {
+            applyUsers(incomingMessage.users, incomingMessage.version);
+            return;
+        }
+        if (incomingMessage.type === 'unread') {
+            if (incomingMessage.user_id !== parseInt(selectedUserId, 10)) {
+                setUnread(incomingMessage.user_id, incomingMessage.count);
+            }
+            return;
+        }
+        if (incomingMessage.sender_id === currentUserId) {
+            // Свое сообщение из другой вкладки или устройства.
+            if (sentClientIds.delete(incomingMessage.client_id)) return;
+            if (incomingMessage.recipient_id === parseInt(selectedUserId, 10)) {
+                addMessage(incomingMessage.content, incomingMessage.recipient_id);
+            }
+            return;
+        }
+        const fromSelectedUser = incomingMessage.sender_id === parseInt(selectedUserId, 10);
+        if (fromSelectedUser) {  
             addMessage(incomingMessage.content, incomingMessage.recipient_id);  
+            lastMessageId = Math.max(lastMessageId || 0, incomingMessage.id);
+            markRead(selectedUserId, lastMessageId);
+        } else {
+            setUnread(incomingMessage.sender_id, (unreadCounts.get(incomingMessage.sender_id) || 0) + 1);
         }
     };
 
-    socket.onclose = () => console.log('WebSocket соединение закрыто');  
+    socket.onclose = () => {
+        console.log('WebSocket соединение закрыто');  
+        setTimeout(connectWebSocket, 1000);
+    };
 }
 
+document.addEventListener('DOMContentLoaded', connectWebSocket);
+
 async function sendMessage() {
     const messageInput = document.getElementById('messageInput');
     const message = messageInput.value.trim();  
 
     if (message && selectedUserId) {  
-        const payload = {recipient_id: selectedUserId, content: message}; 
+        const clientId = `${Date.now().toString(36)}-${Math.random().toString(36).slice(2)}`;
+        const payload = {recipient_id: selectedUserId, content: message, client_id: clientId}; 
+        sentClientIds.add(clientId);
 
         try {
             await fetch('/chat/messages', {
@@ -131,10 +295,10 @@ async function sendMessage() {
                 body: JSON.stringify(payload)  
             });
 
-            socket.send(JSON.stringify(payload));  
             addMessage(message, selectedUserId);  
             messageInput.value = '';  
         } catch (error) {
+            sentClientIds.delete(clientId);
             console.error('Ошибка при отправке сообщения:', error); 
         }
     }
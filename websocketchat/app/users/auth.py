@@ -4,7 +4,7 @@ from pydantic import EmailStr
 
 from .models import User
 from .dao import UsersDAO
-from .utils import verify_password
+from .passwords import password_hasher
 
 
 async def authenticate_user(email: EmailStr, password: str) -> Union[User, None]:
@@ -16,6 +16,6 @@ async def authenticate_user(email: EmailStr, password: str) -> Union[User, None]
     :return: Объект пользователя, если аутентификация успешна; иначе None.
     """
     user: Union[User, None] = await UsersDAO.find_one_or_none(email=email)
-    if not user or verify_password(plain_password=password, hashed_password=user.password) is False:
+    if not user or await password_hasher.verify(plain_password=password, hashed_password=user.password) is False:
         return None
     return user
\ No newline at end of file
@@ -1,6 +1,31 @@
+from datetime import datetime
+from typing import Optional, Sequence
+
+from sqlalchemy import select
+from sqlalchemy.engine import Row
+from sqlalchemy.ext.asyncio import AsyncSession
+
 from dao.base import BaseDAO
+from dao.cache import caches
+from db.sessions import connection
 from .models import User
 
 
 class UsersDAO(BaseDAO):
-    model = User
\ No newline at end of file
+    model = User
+    cache = caches.register(User, private=('password',))
+
+    @classmethod
+    @connection
+    async def find_updated_since(cls, since: Optional[datetime] = None, *, session: AsyncSession) -> Sequence[Row]:
+        """
+        Возвращает публичные поля пользователей, измененных после `since`.
+
+        :param since: Момент, после которого ищутся изменения; None - все пользователи.
+        :return: Строки с полями id, username и updated_at.
+        """
+        query = select(User.id, User.username, User.updated_at)
+        if since is not None:
+            query = query.where(User.updated_at > since)
+        result = await session.execute(query.order_by(User.updated_at))
+        return result.all()
@@ -1,9 +1,9 @@
 from fastapi import Request, HTTPException, status, Depends
 
 from core.settings import settings
-from .exceptions import TokenNotFoundException, CredentialsException
+from .exceptions import TokenNotFoundException
 from .dao import UsersDAO
-from .utils import verify_access_token
+from .tokens import token_verifier
 
 
 ACCESS_TOKEN_COOKIE = 'Access_Token'
@@ -25,16 +25,17 @@ async def get_current_user(token: str = Depends(get_token)):
     """
     Получает текущего пользователя, проверяя токен доступа.
 
+    Уже проверенные токены и пользователи берутся из кешей, поэтому обычный
+    запрос не декодирует JWT и не обращается к базе данных.
+
     :param token: Токен доступа, полученный из куки.
     :raises CredentialsException: Если токен недействителен.
     :raises HTTPException: Если пользователь не найден.
     :return: Объект пользователя.
     """
-    user_id = verify_access_token(token)
-    if not user_id:
-        raise CredentialsException()
+    user_id = await token_verifier.verify(token)
 
-    user = await UsersDAO.find_one_or_none(id=int(user_id))
+    user = await UsersDAO.find_one_or_none(id=user_id)
     if not user:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail='User not found')
     return user
\ No newline at end of file
@@ -0,0 +1,111 @@
+import asyncio
+import logging
+from datetime import datetime
+from typing import Dict, List, Optional
+
+import orjson
+
+from chat.connections import manager
+from .dao import UsersDAO
+
+
+logger = logging.getLogger(__name__)
+
+
+class UserDirectory:
+    """
+    Снимок списка пользователей в памяти воркера.
+
+    Версия пользователя - его `updated_at` в микросекундах, версия снимка -
+    наибольшая из них, поэтому на всех воркерах версии совпадают. Снимок
+    обновляется инкрементально: при каждом изменении таблицы пользователей
+    (сигнал приходит от кеша `UsersDAO`, в том числе с других воркеров) и раз
+    в `refresh_interval` секунд. Изменения рассылаются в открытые websocket-соединения.
+
+    Транзакция может зафиксироваться позже, чем ее `updated_at`, поэтому выборки
+    изменений захватывают `overlap` секунд до запрошенной версии.
+    """
+
+    def __init__(self, refresh_interval: float = 60.0, overlap: float = 5.0):
+        self.refresh_interval = refresh_interval
+        self.overlap = overlap
+        self.users: Dict[int, dict] = {}
+        self.versions: Dict[int, int] = {}
+        self.version = 0
+        self.body = b'[]'
+        self._event: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def etag(self) -> str:
+        return f'"{self.version}"'
+
+    async def start(self) -> None:
+        await self.refresh()
+        self._event = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+        if UsersDAO.cache is not None:
+            UsersDAO.cache.on_invalidate(self.schedule_refresh)
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        self._event = None
+
+    def schedule_refresh(self) -> None:
+        if self._event is not None:
+            self._event.set()
+
+    def changes_since(self, version: int) -> List[dict]:
+        """
+        Возвращает пользователей, добавленных или измененных после версии `version`.
+
+        :param version: Версия, которая уже есть у клиента.
+        :return: Публичные данные пользователей.
+        """
+        threshold = version - int(self.overlap * 1_000_000)
+        return [self.users[user_id] for user_id, user_version in self.versions.items() if user_version > threshold]
+
+    async def refresh(self) -> List[dict]:
+        """
+        Догружает изменения из базы данных.
+
+        :return: Пользователи, видимые данные которых изменились.
+        """
+        since = None
+        if self.version:
+            since = datetime.fromtimestamp(self.version / 1_000_000 - self.overlap)
+        rows = await UsersDAO.find_updated_since(since)
+
+        changed = []
+        for row in rows:
+            user = {'id': row.id, 'username': row.username}
+            if self.users.get(row.id) != user:
+                self.users[row.id] = user
+                changed.append(user)
+            self.versions[row.id] = int(row.updated_at.timestamp() * 1_000_000)
+        if rows:
+            self.version = max(self.version, max(self.versions[row.id] for row in rows))
+        if changed:
+            self.body = orjson.dumps(list(self.users.values()))
+        return changed
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._event.wait(), timeout=self.refresh_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._event.clear()
+            try:
+                changed = await self.refresh()
+                if changed:
+                    frame = {'type': 'users', 'version': self.version, 'users': changed}
+                    await manager.broadcast(list(manager.connections), frame)
+            except Exception:
+                logger.exception('Ошибка обновления списка пользователей')
+
+
+user_directory = UserDirectory()
@@ -42,4 +42,11 @@ class PasswordMismatchException(HTTPException):
     def __init__(self, status_code: int = status.HTTP_409_CONFLICT, detail: Any = None, headers: Dict[str, str] | None = None) -> None:
         detail = detail or 'Password does not match.'
         headers = {'WWW-Authenticate': 'Bearer'} if headers is None else headers
+        super().__init__(status_code, detail, headers)
+
+class PasswordHasherBusyException(HTTPException):
+    ''' Raises when too many password hashing requests are already waiting '''
+    def __init__(self, status_code: int = status.HTTP_503_SERVICE_UNAVAILABLE, detail: Any = None, headers: Dict[str, str] | None = None) -> None:
+        detail = detail or 'Too many login attempts, try again later.'
+        headers = {'Retry-After': '1'} if headers is None else headers
         super().__init__(status_code, detail, headers)
\ No newline at end of file
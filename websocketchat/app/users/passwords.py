@@ -0,0 +1,118 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Optional, TypeVar
+
+from core.metrics import registry, stats_gauges
+from core.settings import settings
+from .exceptions import PasswordHasherBusyException
+from .utils import pwd_context
+
+
+T = TypeVar('T')
+
+
+class PasswordHasher:
+    """
+    Асинхронное хеширование и проверка паролей bcrypt.
+
+    bcrypt занимает процессор на сотни миллисекунд и отпускает GIL, поэтому
+    вычисления выполняются в отдельном пуле потоков, а цикл событий в это время
+    продолжает обслуживать остальные запросы и websocket-соединения.
+    Одновременно выполняется не больше `workers` вычислений, остальные ждут
+    в очереди; если в очереди уже `queue_size` запросов, новые отклоняются.
+    """
+
+    def __init__(self, workers: int, queue_size: int):
+        self.workers = workers
+        self.queue_size = queue_size
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self.running = 0
+        self.waiting = 0
+        self.max_waiting = 0
+        self.completed = 0
+        self.rejected = 0
+        self.wait_time = 0.0
+        self.hash_time = 0.0
+
+    @property
+    def executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='password-hasher')
+        return self._executor
+
+    async def hash(self, password: str) -> str:
+        """
+        Хеширует пароль с использованием bcrypt.
+
+        :param password: Пароль, который нужно захешировать.
+        :return: Захешированный пароль.
+        :raises PasswordHasherBusyException: Если очередь на хеширование переполнена.
+        """
+        return await self._run(pwd_context.hash, password)
+
+    async def verify(self, plain_password: str, hashed_password: str) -> bool:
+        """
+        Проверяет, соответствует ли открытый пароль захешированному.
+
+        :param plain_password: Открытый пароль.
+        :param hashed_password: Захешированный пароль.
+        :return: True, если пароли совпадают, иначе False.
+        :raises PasswordHasherBusyException: Если очередь на хеширование переполнена.
+        """
+        return await self._run(pwd_context.verify, plain_password, hashed_password)
+
+    def metrics(self) -> dict:
+        return {
+            'workers': self.workers,
+            'running': self.running,
+            'waiting': self.waiting,
+            'max_waiting': self.max_waiting,
+            'completed': self.completed,
+            'rejected': self.rejected,
+            'avg_wait_ms': self.wait_time / self.completed * 1000 if self.completed else 0.0,
+            'avg_hash_ms': self.hash_time / self.completed * 1000 if self.completed else 0.0,
+        }
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    async def _run(self, func: Callable[..., T], *args) -> T:
+        if self.waiting >= self.queue_size:
+            self.rejected += 1
+            raise PasswordHasherBusyException()
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.workers)
+
+        queued_at = time.perf_counter()
+        self.waiting += 1
+        self.max_waiting = max(self.max_waiting, self.waiting)
+        try:
+            await self._semaphore.acquire()
+        finally:
+            self.waiting -= 1
+
+        started_at = time.perf_counter()
+        self.running += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self.executor, func, *args)
+        finally:
+            self.running -= 1
+            self._semaphore.release()
+            self.completed += 1
+            self.wait_time += started_at - queued_at
+            self.hash_time += time.perf_counter() - started_at
+
+
+password_hasher = PasswordHasher(
+    workers=settings.AUTH.HASH_WORKERS,
+    queue_size=settings.AUTH.HASH_QUEUE_SIZE,
+)
+
+
+@registry.collector
+async def _collect_password_hasher() -> list:
+    return stats_gauges('password_hasher', 'Пул хеширования паролей', {'bcrypt': password_hasher.metrics()}, 'scheme')
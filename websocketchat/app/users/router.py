@@ -1,16 +1,20 @@
-from typing import List
+from typing import List, Optional
 
-from fastapi import APIRouter, Response, Request, HTTPException, status
+import orjson
+from fastapi import APIRouter, Depends, Response, Request, HTTPException, Query, status
 from fastapi.responses import RedirectResponse
 from fastapi.responses import HTMLResponse
 
 from core.jinja2 import templates
 from core.email import verify_confirmation_token
-from services.tasks import send_email_with_verification_link_task
-from services.email import send_email_with_verification_link
+from services.tasks import enqueue_email_with_verification_link
 from .auth import authenticate_user
-from .utils import get_password_hash, create_access_token
+from .utils import create_access_token
+from .passwords import password_hasher
+from .tokens import token_verifier
+from .directory import user_directory
 from .dao import UsersDAO
+from .dependencies import get_current_user
 from .models import User
 from .schemas import UserRegister as SUserRegister
 from .schemas import UserAuth as SUserAuth
@@ -39,18 +43,35 @@ async def register(user_data: SUserRegister, request: Request) -> dict:
     if user_data.password != user_data.password_check:
         raise PasswordMismatchException()
     
-    user_data.password = get_password_hash(user_data.password)
+    user_data.password = await password_hasher.hash(user_data.password)
     await UsersDAO.add(**user_data.model_dump(exclude={'password_check'}))
 
     abs_url = str(request.url_for('confirm'))
-    send_email_with_verification_link_task.delay(abs_url, user_data.email)
+    await enqueue_email_with_verification_link(abs_url, user_data.email)
 
     return {'message': 'Пользователь успешно зарегестрирован!'}
 
 @router.get('/users', response_model=List[SUserRead])
-async def get_users():
-    users: List[User] = await UsersDAO.find_all()
-    return [{'id': user.id, 'username': user.username} for user in users]
+async def get_users(request: Request, since_version: Optional[int] = Query(None, ge=0)):
+    """
+    Список пользователей из снимка в памяти.
+
+    Версия снимка отдается в ETag и X-Directory-Version: при совпадающем
+    If-None-Match возвращается 304, а с `since_version` - только пользователи,
+    добавленные или измененные после этой версии.
+    """
+    headers = {
+        'ETag': user_directory.etag,
+        'X-Directory-Version': str(user_directory.version),
+        'Cache-Control': 'no-cache',
+    }
+    if request.headers.get('if-none-match') == user_directory.etag:
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    if since_version is not None:
+        content = orjson.dumps(user_directory.changes_since(since_version))
+    else:
+        content = user_directory.body
+    return Response(content=content, media_type='application/json', headers=headers)
 
 @router.get('/confirm/')
 async def confirm(token: str, request: Request):
@@ -71,6 +92,15 @@ async def login(response: Response, user_data: SUserAuth) -> dict:
     return {ACCESS_TOKEN_COOKIE: access_token, 'Refresh_Token': None, 'Token_Type': 'Bearer'}
 
 @router.post('/logout/')
-async def logout(response: Response):
+async def logout(request: Request, response: Response):
+    token = request.cookies.get(ACCESS_TOKEN_COOKIE)
+    if token:
+        await token_verifier.revoke(token)
     response.delete_cookie(ACCESS_TOKEN_COOKIE)
     return {'message': 'Пользователь успешно вышел из системы'}
+
+@router.post('/logout_all/')
+async def logout_all(response: Response, user: User = Depends(get_current_user)):
+    await token_verifier.revoke_user(user.id)
+    response.delete_cookie(ACCESS_TOKEN_COOKIE)
+    return {'message': 'Пользователь вышел из системы на всех устройствах'}
@@ -0,0 +1,181 @@
+import asyncio
+import hashlib
+import logging
+import time
+from collections import OrderedDict
+from typing import Dict, Optional
+
+from core.redis import Redis
+from core.settings import settings
+from .exceptions import CredentialsException, TokenExpiredException
+from .utils import decode_access_token
+
+
+logger = logging.getLogger(__name__)
+
+
+class TokenVerifier:
+    """
+    Проверка токенов доступа с кешем уже проверенных токенов.
+
+    Токен, подпись которого однажды проверена, запоминается в ограниченном
+    LRU-кеше по его SHA-256 вместе с ID пользователя, временем выпуска и
+    временем истечения, поэтому повторные запросы с тем же токеном не
+    декодируют JWT.
+
+    Отзыв токенов хранится в Redis: отозванные токены в sorted set с временем
+    истечения в качестве score и время `revoked_before` для пользователя, до
+    которого отозваны все его токены (например, после смены пароля). Запущенный
+    верификатор держит их копию в памяти и обновляет ее через pub/sub, так что
+    проверка отзыва не требует обращений к Redis. Без запуска проверка идет
+    напрямую в Redis.
+    """
+
+    def __init__(self, max_size: int, prefix: str):
+        self.max_size = max_size
+        self.prefix = prefix
+        self.channel = f'{prefix}:revocations'
+        self.tokens: OrderedDict[bytes, tuple[int, float, float]] = OrderedDict()
+        self.revoked: Dict[bytes, float] = {}
+        self.revoked_before: Dict[int, float] = {}
+        self.running = False
+        self.redis = None
+        self.pubsub = None
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def revoked_key(self) -> str:
+        return f'{self.prefix}:revoked'
+
+    @property
+    def revoked_before_key(self) -> str:
+        return f'{self.prefix}:revoked_before'
+
+    async def start(self) -> None:
+        self.redis = Redis()
+        await self.redis.zremrangebyscore(self.revoked_key, '-inf', time.time())
+        revoked = await self.redis.zrange(self.revoked_key, 0, -1, withscores=True)
+        self.revoked = {bytes.fromhex(digest.decode()): exp for digest, exp in revoked}
+        revoked_before = await self.redis.hgetall(self.revoked_before_key)
+        self.revoked_before = {int(user_id): float(ts) for user_id, ts in revoked_before.items()}
+        self.pubsub = self.redis.pubsub(ignore_subscribe_messages=True)
+        await self.pubsub.subscribe(self.channel)
+        self._task = asyncio.create_task(self._listen())
+        self.running = True
+
+    async def stop(self) -> None:
+        self.running = False
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        if self.pubsub is not None:
+            await self.pubsub.aclose()
+            self.pubsub = None
+        self.tokens.clear()
+        self.redis = None
+
+    async def verify(self, token: str) -> int:
+        """
+        Проверяет токен доступа и возвращает ID пользователя.
+
+        :param token: JWT из куки.
+        :return: ID пользователя.
+        :raises TokenExpiredException: Если токен истек.
+        :raises CredentialsException: Если токен недействителен или отозван.
+        """
+        digest = hashlib.sha256(token.encode()).digest()
+        now = time.time()
+        entry = self.tokens.get(digest)
+        if entry is not None:
+            user_id, exp, iat = entry
+            if exp <= now:
+                del self.tokens[digest]
+                raise TokenExpiredException()
+            self.tokens.move_to_end(digest)
+        else:
+            payload = decode_access_token(token)
+            try:
+                user_id = int(payload['sub'])
+            except ValueError:
+                raise CredentialsException()
+            exp, iat = float(payload['exp']), float(payload.get('iat', 0))
+            self.tokens[digest] = (user_id, exp, iat)
+            if len(self.tokens) > self.max_size:
+                self.tokens.popitem(last=False)
+
+        if await self._is_revoked(digest, user_id, iat):
+            raise CredentialsException()
+        return user_id
+
+    async def revoke(self, token: str) -> None:
+        """
+        Отзывает один токен (выход из системы). Отзыв хранится до истечения токена.
+
+        :param token: JWT из куки.
+        """
+        digest = hashlib.sha256(token.encode()).digest()
+        try:
+            exp = float(decode_access_token(token)['exp'])
+        except (TokenExpiredException, CredentialsException):
+            return
+        redis = self.redis or Redis()
+        async with redis.pipeline(transaction=False) as pipe:
+            pipe.zadd(self.revoked_key, {digest.hex(): exp})
+            pipe.zremrangebyscore(self.revoked_key, '-inf', time.time())
+            pipe.publish(self.channel, f'token:{digest.hex()}:{exp}')
+            await pipe.execute()
+        self.revoked[digest] = exp
+
+    async def revoke_user(self, user_id: int) -> None:
+        """
+        Отзывает все токены пользователя, выпущенные до текущего момента
+        (смена пароля, выход на всех устройствах).
+
+        :param user_id: ID пользователя.
+        """
+        now = time.time()
+        redis = self.redis or Redis()
+        async with redis.pipeline(transaction=False) as pipe:
+            pipe.hset(self.revoked_before_key, str(user_id), now)
+            pipe.publish(self.channel, f'user:{user_id}:{now}')
+            await pipe.execute()
+        self.revoked_before[user_id] = now
+
+    async def _is_revoked(self, digest: bytes, user_id: int, iat: float) -> bool:
+        if self.running:
+            return digest in self.revoked or iat < self.revoked_before.get(user_id, 0)
+        redis = self.redis or Redis()
+        async with redis.pipeline(transaction=False) as pipe:
+            pipe.zscore(self.revoked_key, digest.hex())
+            pipe.hget(self.revoked_before_key, str(user_id))
+            revoked, revoked_before = await pipe.execute()
+        return revoked is not None or iat < float(revoked_before or 0)
+
+    async def _listen(self) -> None:
+        last_pruned = time.monotonic()
+        while True:
+            try:
+                message = await self.pubsub.get_message(ignore_subscribe_messages=True, timeout=1.0)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception('Ошибка чтения канала отзыва токенов')
+                await asyncio.sleep(1)
+                continue
+            if message is not None and message['type'] == 'message':
+                kind, key, ts = message['data'].decode().split(':')
+                if kind == 'token':
+                    self.revoked[bytes.fromhex(key)] = float(ts)
+                elif kind == 'user':
+                    self.revoked_before[int(key)] = max(float(ts), self.revoked_before.get(int(key), 0))
+            if time.monotonic() - last_pruned > 60:
+                last_pruned = time.monotonic()
+                now = time.time()
+                self.revoked = {digest: exp for digest, exp in self.revoked.items() if exp > now}
+
+
+token_verifier = TokenVerifier(
+    max_size=settings.AUTH.TOKEN_CACHE_SIZE,
+    prefix=settings.AUTH.REVOCATION_PREFIX,
+)
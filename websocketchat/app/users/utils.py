@@ -35,34 +35,45 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
 
 def create_access_token(data: dict) -> str:
     """
-    Создает JWT с заданными данными и временем истечения.
+    Создает JWT с заданными данными, временем выпуска и временем истечения.
 
     :param data: Данные, которые нужно закодировать в токен (например, ID пользователя).
     :return: Закодированный JWT.
     """
     to_encode = data.copy()
-    expire = datetime.now(timezone.utc) + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES) 
-    to_encode.update({'exp': expire})  
+    now = datetime.now(timezone.utc)
+    expire = now + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES) 
+    to_encode.update({'exp': expire, 'iat': now.timestamp()})  
     encode_jwt = jwt.encode(to_encode, key=SECRET_KEY, algorithm=ALGORITHM)  
     return encode_jwt
 
-def verify_access_token(token: str) -> str:
+def decode_access_token(token: str) -> dict:
     """
-    Проверяет и декодирует JWT, возвращает ID пользователя.
+    Проверяет подпись и срок действия JWT и возвращает его содержимое.
 
     :param token: JWT, который нужно проверить.
-    :return: ID пользователя из токена.
+    :return: Содержимое токена, в котором есть ID пользователя (`sub`).
     :raises TokenExpiredException: Если токен истек.
     :raises CredentialsException: Если токен недействителен или не содержит ID пользователя.
     """
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        user_id: str = payload.get('sub')  
-        if not user_id:
+        if not payload.get('sub'):
             raise CredentialsException()  
-        return user_id  
+        return payload
     except ExpiredSignatureError:
         raise TokenExpiredException()  
     except JWTError as e:
         print(e) 
-        raise CredentialsException()
\ No newline at end of file
+        raise CredentialsException()
+
+def verify_access_token(token: str) -> str:
+    """
+    Проверяет и декодирует JWT, возвращает ID пользователя.
+
+    :param token: JWT, который нужно проверить.
+    :return: ID пользователя из токена.
+    :raises TokenExpiredException: Если токен истек.
+    :raises CredentialsException: Если токен недействителен или не содержит ID пользователя.
+    """
+    return decode_access_token(token)['sub']
\ No newline at end of file